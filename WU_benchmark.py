@@ -0,0 +1,246 @@
+# Microbenchmarks for the per-packet code: CRC, decoders, decodeRawData(), wind averaging, dew point,
+# wind chill and building the upload URL.  The Pi Zero stations don't have much CPU to spare, so run
+# this before and after a change and compare.
+#
+# For each benchmark it reports
+#   ns/op     nanoseconds per call, median of REPEAT runs
+#   peak B    most memory (bytes) allocated during one call, from tracemalloc
+#   kept B/op memory still allocated per call after many calls, should be 0 unless something is growing
+#
+# Usage: python3 WU_benchmark.py [name filter] [--save results.json] [--compare baseline.json] [--threshold percent]
+# --compare prints the change from a saved run and exits with 1 if anything got slower than threshold (default 25%).
+# Run to run noise on a Pi is often 10% or more, so keep the threshold well above that
+
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import WU_replay # for simClock, and a stand in WU_credentials if the real one is missing
+import WU_decodeWirelessData as decode
+import WU_stationCore
+import WU_upload
+import weatherData_cls
+
+MIN_TIME  = 0.2  # seconds each timing run should take at least
+REPEAT    = 7    # timing runs, the median is reported
+THRESHOLD = 25   # percent slower than baseline that counts as a regression
+
+BENCHMARKS = []  # [name, function that sets up and returns the function to time]
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS.append([name, setup])
+        return(setup)
+    return(register)
+
+
+# Returns packet with a valid CRC and station ID 1
+def makePacket(header, windSpeed, windDir, b3, b4, b5=0):
+    return(decode.addCRC([header, windSpeed, windDir, b3, b4, b5, 0, 0]))
+
+
+# One packet of each type the ISS sends
+PACKETS = {
+    'capVolts':    makePacket(0x20, 5, 100, 0x54, 0x49),
+    'uvIndex':     makePacket(0x40, 5, 100, 0x0A, 0x45),
+    'rainSeconds': makePacket(0x50, 5, 100, 0x82, 0x09),
+    'solar':       makePacket(0x60, 5, 100, 0x2B, 0x05),
+    'temperature': makePacket(0x80, 5, 100, 0x02, 0x89),
+    'windGust':    makePacket(0x90, 8, 100, 0x0C, 0x05),
+    'humidity':    makePacket(0xA0, 5, 100, 0x38, 0x25),
+    'rainCounter': makePacket(0xE0, 5, 100, 0x12, 0x01),
+}
+
+
+# Returns a station with a simulated clock and fresh data for every field uploads use
+def makeStation():
+    clock = WU_replay.simClock(1000.0)
+    station = weatherData_cls.weatherStation(1, clock=clock)
+    for name, packet in PACKETS.items():
+        decoded = WU_stationCore.decodeRawData(station, packet)
+        assert decoded[0], "{} packet doesn't decode: {}".format(name, decoded[1])
+    for windDir in range(0, 360 * 10, 12):
+        station.avgWindDir(windDir % 360)
+    station.pressure = 30.01
+    station.rainToday = 0.12
+    return(station)
+
+
+#---------------------------------------------------------------------
+# Benchmarks
+#---------------------------------------------------------------------
+@benchmark("crc16_ccitt")
+def _crcBitwise():
+    packet = PACKETS['temperature']
+    return(lambda: decode.crc16_ccitt(packet))
+
+@benchmark("crc16_ccitt_table")
+def _crcTable():
+    packet = PACKETS['temperature']
+    return(lambda: decode.crc16_ccitt_table(packet))
+
+@benchmark("parsePacket")
+def _parsePacket():
+    packet = PACKETS['temperature']
+    return(lambda: decode.parsePacket(packet))
+
+# Scalar decoders in WU_decodeWirelessData.py, each given a packet of its type
+for _decoderName, _packetName in [('stationID', 'temperature'), ('batteryStatus', 'temperature'), ('windSpeed', 'temperature'),
+                                  ('windDirection', 'temperature'), ('rainRate', 'rainSeconds'), ('rainCounter', 'rainCounter'),
+                                  ('windGusts', 'windGust'), ('temperature', 'temperature'), ('humidity', 'humidity'),
+                                  ('solarRadiation', 'solar'), ('uvIndex', 'uvIndex'), ('capVoltage', 'capVolts')]:
+    def _decoder(decoder=getattr(decode, _decoderName), packet=PACKETS[_packetName]):
+        return(lambda: decoder(packet))
+    benchmark("decode." + _decoderName)(_decoder)
+
+@benchmark("decodeRawData")
+def _decodeRawData():
+    station = makeStation()
+    packets = list(PACKETS.values()) * 4  # 32, so the loop below can use & 31
+    count = [0]
+    def run():
+        count[0] += 1
+        WU_stationCore.decodeRawData(station, packets[count[0] & 31])
+    return(run)
+
+@benchmark("avgWindDir")
+def _avgWindDir():
+    station = makeStation()
+    return(lambda: station.avgWindDir(123))
+
+@benchmark("avgWindDirRaw")
+def _avgWindDirRaw():
+    station = makeStation()
+    return(lambda: station.avgWindDirRaw(87))
+
+@benchmark("calcDewPoint")
+def _calcDewPoint():
+    station = makeStation()
+    return(station.calcDewPoint)
+
+@benchmark("calcWindChill")
+def _calcWindChill():
+    station = makeStation()
+    return(station.calcWindChill)
+
+@benchmark("upload2WU")
+def _upload2WU():
+    station = makeStation()
+    def run():
+        sendToWU = WU_upload.sendToWU
+        WU_upload.sendToWU = lambda url: [True, "No Errors", False]  # no HTTP, only the URL is built
+        try:
+            WU_upload.upload2WU(station, "BENCH")
+        finally:
+            WU_upload.sendToWU = sendToWU
+    return(run)
+
+
+#---------------------------------------------------------------------
+# Timing and memory
+#---------------------------------------------------------------------
+
+# Returns nanoseconds per call of func, median of REPEAT runs
+def timeFunc(func):
+    loops = 1
+    while True:  # find loop count that takes at least MIN_TIME
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= MIN_TIME * 1e9:
+            break
+        loops *= 10 if elapsed < MIN_TIME * 1e8 else 2
+
+    runs = [elapsed]
+    for _ in range(REPEAT - 1):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        runs.append(time.perf_counter_ns() - start)
+    return(statistics.median(runs) / loops)
+
+
+# Returns [peak bytes during one call, bytes kept per call]
+def memoryFunc(func, loops=1000):
+    func()  # warm up caches so they aren't counted
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(loops):
+            func()
+        kept = (tracemalloc.get_traced_memory()[0] - before) / loops
+    finally:
+        tracemalloc.stop()
+    return([peak, kept])
+
+
+# Runs benchmarks whose name contains nameFilter.  Returns {name: {'nsPerOp', 'peakBytes', 'keptBytes'}}
+def runBenchmarks(nameFilter=""):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if nameFilter not in name:
+            continue
+        nsPerOp = timeFunc(setup())
+        peak, kept = memoryFunc(setup())
+        results[name] = {'nsPerOp': round(nsPerOp, 1), 'peakBytes': peak, 'keptBytes': round(kept, 1)}
+    return(results)
+
+
+def printResults(results, baseline=None, threshold=THRESHOLD):
+    print("{:24}{:>12}{:>10}{:>12}{}".format("benchmark", "ns/op", "peak B", "kept B/op", "    vs baseline" if baseline else ""))
+    regressions = []
+    for name, r in results.items():
+        line = "{:24}{:>12.1f}{:>10}{:>12.1f}".format(name, r['nsPerOp'], r['peakBytes'], r['keptBytes'])
+        if baseline and name in baseline:
+            change = (r['nsPerOp'] / baseline[name]['nsPerOp'] - 1) * 100
+            line += "    {:+.1f}%".format(change)
+            if change > threshold:
+                line += "  SLOWER"
+                regressions.append(name)
+        print(line)
+    return(regressions)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    nameFilter = ""
+    savePath = None
+    comparePath = None
+    threshold = THRESHOLD
+    while args:
+        arg = args.pop(0)
+        if arg == "--save":
+            savePath = args.pop(0)
+        elif arg == "--compare":
+            comparePath = args.pop(0)
+        elif arg == "--threshold":
+            threshold = float(args.pop(0))
+        else:
+            nameFilter = arg
+
+    baseline = None
+    if comparePath:
+        with open(comparePath) as f:
+            baseline = json.load(f)['results']
+
+    print("Python {} on {}".format(platform.python_version(), platform.machine()))
+    results = runBenchmarks(nameFilter)
+    regressions = printResults(results, baseline, threshold)
+
+    if savePath:
+        with open(savePath, "w") as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'time': time.strftime("%Y-%m-%d %H:%M:%S"), 'results': results}, f, indent=1)
+        print("Saved results to {}".format(savePath))
+    if regressions:
+        print("Slower than baseline by more than {:.0f}%: {}".format(threshold, ", ".join(regressions)))
+        sys.exit(1)
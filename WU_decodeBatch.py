@@ -0,0 +1,102 @@
+# Vectorized decoder for arrays of captured Davis ISS packets
+# Used to reprocess months of raw packets when recalibrating.  Decodes every packet in one pass with
+# NumPy masks instead of calling the scalar functions in WU_decodeWirelessData.py for each row.
+#
+# Input is an (N, 8) uint8 array, one raw packet per row.  Output is a structured array with one
+# record per packet, see BATCH_DTYPE below.  Values that don't apply to the packet type, or are out
+# of range, are NaN.  Requires NumPy: "sudo pip3 install numpy"
+
+import numpy as np
+import WU_decodeWirelessData as decode
+
+BATCH_DTYPE = np.dtype([
+    ('crcOK',       np.bool_),
+    ('stationID',   np.uint8),
+    ('battery',     np.uint8),
+    ('packetType',  np.uint8),
+    ('windSpeed',   np.float64),
+    ('windDir',     np.float64),
+    ('temperature', np.float64),
+    ('humidity',    np.float64),
+    ('rainCounter', np.float64),
+    ('rainSeconds', np.float64),
+    ('uvIndex',     np.float64),
+    ('solar',       np.float64),
+    ('capVolts',    np.float64),
+])
+
+_CRC16_TABLE = np.array(decode.CRC16_TABLE, dtype=np.uint16)
+
+
+# Returns array of True/False, one for each packet.  Same result as crc16_ccitt_table()
+def crcValid(packets):
+    crc = np.zeros(len(packets), dtype=np.uint16)
+    for col in range(6):
+        crc = (crc << 8) ^ _CRC16_TABLE[(crc >> 8) ^ packets[:, col]]
+    crcSent = (packets[:, 6].astype(np.uint16) << 8) | packets[:, 7]
+    return((crc == crcSent) & (crc != 0))
+
+
+# Puts values into column where the packet type matches and the value is in range, leaves the rest NaN
+def _fill(out, field, typeMask, values, minValue, maxValue):
+    good = typeMask & (values >= minValue) & (values <= maxValue)
+    out[field][good] = values[good]
+
+
+# packets is an (N, 8) uint8 array.  Returns structured array of BATCH_DTYPE
+def decodeBatch(packets):
+    packets = np.asarray(packets, dtype=np.uint8)
+    if (packets.ndim != 2 or packets.shape[1] != decode.PACKET_LENGTH):
+        raise ValueError("Expected (N, {}) array of packets, got shape {}".format(decode.PACKET_LENGTH, packets.shape))
+
+    out = np.empty(len(packets), dtype=BATCH_DTYPE)
+    for field in BATCH_DTYPE.names[4:]:
+        out[field] = np.nan
+
+    header = packets[:, 0]
+    b3 = packets[:, 3].astype(np.int32)
+    b4 = packets[:, 4].astype(np.int32)
+    packetType = header >> 4
+
+    out['crcOK'] = crcValid(packets)
+    out['stationID'] = (header & 0x7) + 1
+    out['battery'] = (header & 8) >> 3
+    out['packetType'] = packetType
+
+    speed = packets[:, 1]
+    good = speed <= 240
+    out['windSpeed'][good] = speed[good]
+
+    direction = packets[:, 2].astype(np.float64)
+    out['windDir'] = np.where(direction == 0, 0.0, direction * 1.40625 + 0.3)
+
+    # Temperature, 2's complement in 1/10 degrees. Viewing bytes 3-4 as int16 handles the sign
+    temp = (((b3 << 8) | b4).astype(np.uint16).view(np.int16) >> 4) / 10.0
+    _fill(out, 'temperature', packetType == decode.ISS_OUT_TEMP, temp, -100, 130)
+
+    rh = ((b4 >> 4) * 256 + b3) / 10.0
+    _fill(out, 'humidity', packetType == decode.ISS_HUMIDITY, rh, 0, 100)
+
+    _fill(out, 'rainCounter', packetType == decode.ISS_RAIN_COUNT, b3 & 0x7F, 0, 127)
+
+    lightRain = (b4 & 0x40) == 0
+    rainSeconds = np.where(lightRain, (b3 >> 4) + b4 - 1, b3 + ((b4 >> 4) - 4) * 256)
+    _fill(out, 'rainSeconds', packetType == decode.ISS_RAIN_SECONDS, rainSeconds, 0, 3600)
+
+    # UV and solar sensors send 0xFF in byte 3 when they are offline, scalar decoders return 0 for that
+    offline = b3 == decode.SENSOR_OFFLINE
+    raw34 = ((b3 * 256 + b4) >> 4) - 4
+    _fill(out, 'uvIndex', packetType == decode.ISS_UV_INDEX, np.where(offline, 0.0, raw34 / 200.0), 0, 16)
+    _fill(out, 'solar', packetType == decode.ISS_SOLAR_RAD, np.where(offline, 0.0, raw34 / 2.27 - 0.2488), 0, 2000)
+
+    volts = ((b3 * 4) + ((b4 & 0xC0) / 64.0)) / 100.0
+    _fill(out, 'capVolts', packetType == decode.ISS_CAP_VOLTS, volts, 0, 10)
+
+    return(out)
+
+
+# Decodes packets stored back to back in a bytes, bytearray or memoryview buffer
+def decodeBuffer(buf):
+    packets = np.frombuffer(buf, dtype=np.uint8)
+    usable = len(packets) - len(packets) % decode.PACKET_LENGTH
+    return(decodeBatch(packets[:usable].reshape(-1, decode.PACKET_LENGTH)))
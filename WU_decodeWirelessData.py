@@ -1,5 +1,9 @@
 # Decode Davis Weather Station data from wireless ISS weather station
 
+import math
+import struct # used by parsePacket() to unpack the 8 byte packet in one call
+from collections import namedtuple
+
 # MSB in first byte that dictates what data is sent in bytes 3-4
 ISS_CAP_VOLTS    = 0x2
 ISS_UV_INDEX     = 0x4
@@ -16,6 +20,8 @@ SENSOR_OFFLINE   = 0xFF
 ERR_WRONG_PACKET = -100
 ERR_OUT_OF_RANGE = -101
 ERR_INVALID_DATA = -102
+ERR_SENSOR_OFFLINE = -104
+ERR_NONE         = 0
 
 
 # ---------------------------------------------------------------------------------------------
@@ -122,6 +128,15 @@ def windDirection(rawData):
     return (windDir)
 
 
+# ---------------------------------------------------------------------------------------------
+# Lookup tables for wind direction.  Byte 2 only has 256 possible values so the degrees and the
+# unit vector used by the wind direction average (weatherData_cls.py) are calculated once here.
+# Index is the raw byte 2 value.  Same formula as windDirection()
+WIND_DIR_DEGREES     = tuple(0 if raw == 0 else (raw * 1.40625) + 0.3 for raw in range(256))
+WIND_DIR_NORTH_SOUTH = tuple(math.cos(math.radians(deg)) for deg in WIND_DIR_DEGREES)  # cos
+WIND_DIR_EAST_WEST   = tuple(math.sin(math.radians(deg)) for deg in WIND_DIR_DEGREES)  # sin
+
+
 # ---------------------------------------------------------------------------------------------
 # Wind speed in MPH is always byte 1
 def windSpeed(rawData):
@@ -292,3 +307,155 @@ def crc16_ccitt(rawData):
 
 
 
+# ---------------------------------------------------------------------------------------------
+# Single pass packet parser
+# parsePacket() unpacks the 8 byte packet once and returns an issPacket record instead of calling
+# stationID(), windSpeed(), windDirection() and a type specific function that each re-check the header.
+# The record fields are:
+#   stationID  - Davis station ID, 1-8
+#   battery    - battery status bit
+#   packetType - 4 MSB of header, ISS_... constants above
+#   windSpeed  - MPH, or ERR_OUT_OF_RANGE
+#   windDir    - degrees
+#   value      - type specific value from bytes 3-4 (temperature, humidity, etc.), None if packet type has no decoder
+#   error      - ERR_NONE if windSpeed and value are good, otherwise the ERR_... code
+# CRC isn't checked here, use crc16_ccitt_table() first.
+issPacket = namedtuple('issPacket', ['stationID', 'battery', 'packetType', 'windSpeed', 'windDir', 'value', 'error'])
+
+_PACKET_STRUCT = struct.Struct('>6BH') # header, wind speed, wind dir, byte 3, byte 4, byte 5, crc
+
+
+# Type specific decoders for bytes 3-4, same formulas as the functions above without the header check
+def _rainSecondsValue(b3, b4):
+    if ( b4 & 0x40 == 0 ):
+        return((b3 >> 4) + b4 - 1)             # Light rain
+    return(b3 + ((b4 >> 4) - 4) * 256)        # Heavy rain
+
+def _rainCounterValue(b3, b4):
+    return(b3 & 0x7F)
+
+def _windGustValue(b3, b4):
+    return(b3)
+
+def _temperatureValue(b3, b4):
+    t = (b3 << 8) + b4
+    if (b3 >= 128):
+        t = t | ~0xFFFF # negative, 2's complement
+    return((t >> 4) / 10.0)
+
+def _humidityValue(b3, b4):
+    return(((b4 >> 4) * 256 + b3) / 10.0)
+
+def _solarValue(b3, b4):
+    if ( b3 == SENSOR_OFFLINE ):
+        return(0)
+    return((((b3 * 256 + b4) >> 4) - 4) / 2.27 - 0.2488)
+
+def _uvValue(b3, b4):
+    if ( b3 == SENSOR_OFFLINE ):
+        return(0)
+    return((((b3 * 256 + b4) >> 4) - 4) / 200.0)
+
+def _capVoltsValue(b3, b4):
+    return(((b3 * 4) + ((b4 & 0xC0) / 64.0)) / 100.0)
+
+# Packet type: [decoder, min valid value, max valid value]
+VALUE_DECODERS = {
+    ISS_CAP_VOLTS:    [_capVoltsValue,     0,   10],
+    ISS_UV_INDEX:     [_uvValue,           0,   16],
+    ISS_RAIN_SECONDS: [_rainSecondsValue,  0, 3600],
+    ISS_SOLAR_RAD:    [_solarValue,        0, 2000],
+    ISS_OUT_TEMP:     [_temperatureValue, -100, 130],
+    ISS_WIND_GUST:    [_windGustValue,     0,  240],
+    ISS_HUMIDITY:     [_humidityValue,     0,  100],
+    ISS_RAIN_COUNT:   [_rainCounterValue,  0,  127],
+}
+
+
+def parsePacket(buf):
+    try:
+        header, speed, direction, b3, b4, b5, crcSent = _PACKET_STRUCT.unpack_from(buf)
+    except TypeError:
+        header, speed, direction, b3, b4, b5, crcSent = _PACKET_STRUCT.unpack_from(bytes(buf)) # list from read_i2c_block_data()
+
+    packetType = header >> 4
+    error = ERR_NONE
+
+    if (speed > 240): # check for valid range
+        speed = ERR_OUT_OF_RANGE
+        error = ERR_OUT_OF_RANGE
+
+    windDir = WIND_DIR_DEGREES[direction]
+
+    decoder = VALUE_DECODERS.get(packetType)
+    if decoder is None:
+        value = None
+    else:
+        value = decoder[0](b3, b4)
+        if (value < decoder[1] or value > decoder[2]): # check for valid range
+            value = ERR_OUT_OF_RANGE
+            error = ERR_OUT_OF_RANGE
+        elif ( b3 == SENSOR_OFFLINE and (packetType == ISS_UV_INDEX or packetType == ISS_SOLAR_RAD) ):
+            error = ERR_SENSOR_OFFLINE
+
+    return(issPacket((header & 0x7) + 1, (header & 8) >> 3, packetType, speed, windDir, value, error))
+
+
+# ---------------------------------------------------------------------------------------------
+# Table driven CRC-16/CCITT (XMODEM), same result as crc16_ccitt() but does one table lookup
+# per byte instead of 8 shift/xor steps.  crc16_ccitt() is kept as the reference implementation.
+PACKET_LENGTH = 8 # bytes in a Davis ISS packet, data in first 6 bytes, crc in last 2
+
+def _makeCrcTable():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for k in range(8):
+            if (crc & 0x8000):
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return(tuple(table))
+
+CRC16_TABLE = _makeCrcTable()  # 256 entries, built once when module is imported
+
+
+# Returns the CRC of the first 6 bytes of the packet as an integer
+def crc16Value(rawData):
+    table = CRC16_TABLE
+    crc = 0
+    for byteData in rawData[0:6]:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byteData]
+    return(crc)
+
+
+# Puts the CRC of the first 6 bytes in bytes 6-7 so the packet passes the CRC check.  Returns packet
+# Used to make packets for tests and benchmarks
+def addCRC(packet):
+    crc = crc16Value(packet)
+    packet[6] = crc >> 8
+    packet[7] = crc & 0xFF
+    return(packet)
+
+
+# CRC check using lookup table, returns True if CRC matches, False if not
+def crc16_ccitt_table(rawData):
+    crc = crc16Value(rawData)
+    crcSent = (rawData[6] << 8) | rawData[7]
+    return(crc == crcSent and crc != 0)
+
+
+# Validates many 8 byte packets stored back to back in one bytes, bytearray or memoryview buffer
+# Returns a list of True/False, one for each packet.  Incomplete packet at the end of the buffer is ignored
+def crc16_ccitt_batch(buf):
+    table = CRC16_TABLE
+    view = memoryview(buf).cast('B')
+    results = []
+    for start in range(0, len(view) - PACKET_LENGTH + 1, PACKET_LENGTH):
+        crc = 0
+        for byteData in view[start:start + 6]:
+            crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byteData]
+        crcSent = (view[start + 6] << 8) | view[start + 7]
+        results.append(crc == crcSent and crc != 0)
+    return(results)
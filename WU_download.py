@@ -7,14 +7,26 @@
 #
 
 WU_STATIONS = ["KVTDOVER19", "KVTWESTD4", "KVTDOVER25"]  # nearby weather station IDs to get pressure data
+MAX_PRESSURE_AGE   = 60 * 60  # seconds, ignore pressure from a station that hasn't reported in an hour
+PRESSURE_CACHE_TTL = 15 * 60  # seconds, reuse pressure until the observation is this old
+PRESSURE_DEADLINE  = 20       # seconds to wait for all nearby stations
 
-import requests        # Allows you to send HTTP/1.1 requests
+import WU_http         # Shared HTTP sessions, keeps connection to api.weather.com open between calls
 import WU_credentials  # Weather underground password, station IDs and API key
+import WU_metrics      # pressure download time
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError # not the same as built in TimeoutError before Python 3.11
 
 ERR_INVALID_DATA = -102
 ERR_FAILED_GET   = -103
 
+_pressureCache = None  # last good result from getPressureObservation()
+_pressureLock  = threading.Lock()
+
+PRESSURE_FETCH_SECONDS = WU_metrics.REGISTRY.histogram("weather_pressure_fetch_seconds", "Time to get pressure from nearby stations (not cached)")
+
 
 # Get daily rain data from Suntec station.  Need this on reboot of RPi
 # Returns inches of rain since midnight
@@ -23,7 +35,7 @@ def getDailyRain():
     errMsg = "No Error"
     
     try:
-        response = requests.get(getUrl, timeout=10).json()
+        response = WU_http.get(getUrl).json()
 
         if len(response['observations'][0]) >= 16:  # should return 16, not sure what it will return if there's an error
             if isNumber(response['observations'][0]['imperial']['precipTotal']):
@@ -43,39 +55,75 @@ def getDailyRain():
         errMsg = "Failed get() request"
         return([ERR_FAILED_GET, errMsg])
         
+# Gets pressure from one nearby station.  Returns a list
+#  0: pressure in inHg, or ERR_INVALID_DATA / ERR_FAILED_GET
+#  1: observation time (epoch seconds), 0 if error
+#  2: station ID
+def getStationPressure(stationID):
+    getUrl = "https://api.weather.com/v2/pws/observations/current?stationId={}&format=json&units=e&apiKey={}".format(stationID, WU_credentials.WU_API_KEY)
+
+    try:
+        response = WU_http.get(getUrl).json()
+        if len(response['observations'][0]) >= 16: # should return 16, not sure what it will return if there's an error
+            if isNumber(response['observations'][0]['imperial']['pressure']):
+                nearby_pressure = float(response['observations'][0]['imperial']['pressure'])
+                nearby_last_update_time = int(response['observations'][0]['epoch'])
+                if (nearby_pressure) > 25: # a pressure less than 25 inHg isn't valid
+                    return([nearby_pressure, nearby_last_update_time, stationID])
+
+        # Didn't get a valid pressure
+        print("Couldn't get pressure data from {}".format(stationID))
+        return([ERR_INVALID_DATA, 0, stationID])
+
+    except Exception:
+        print("Error in getPressure(), failed get() request for station {}".format(stationID))
+        return([ERR_FAILED_GET, 0, stationID])
+
+
+# Gets pressure from the stations in WU_STATIONS.  All stations are asked at the same time and the first
+# valid reading that isn't older than MAX_PRESSURE_AGE wins.  Requests that haven't started yet are cancelled;
+# ones already waiting on the network finish in the background (within WU_http timeouts) and are ignored.
+# The result is cached until its observation time is PRESSURE_CACHE_TTL old, so calling this again
+# soon after doesn't use up API calls.
+# Returns same list as getStationPressure()
+def getPressureObservation():
+    global _pressureCache
+
+    with _pressureLock:
+        if _pressureCache is not None and (time.time() - _pressureCache[1]) < PRESSURE_CACHE_TTL:
+            return(_pressureCache)
+
+    startTime = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=len(WU_STATIONS), thread_name_prefix="getPressure")
+    futures = [pool.submit(getStationPressure, stationID) for stationID in WU_STATIONS]
+    result = [ERR_FAILED_GET, 0, None]
+    try:
+        for future in as_completed(futures, timeout=PRESSURE_DEADLINE):
+            stationResult = future.result()
+            if stationResult[0] > 0:
+                if (time.time() - stationResult[1]) <= MAX_PRESSURE_AGE:
+                    result = stationResult
+                    break
+                print("Pressure from {} is {:.0f} minutes old".format(stationResult[2], (time.time() - stationResult[1])/60))
+                result = [ERR_INVALID_DATA, 0, stationResult[2]]
+            elif stationResult[0] == ERR_INVALID_DATA:
+                result = stationResult
+    except FuturesTimeoutError:
+        print("getPressure() timed out waiting for nearby stations")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    PRESSURE_FETCH_SECONDS.observe(time.perf_counter() - startTime)
+
+    if result[0] > 0:
+        with _pressureLock:
+            _pressureCache = result
+    return(result)
+
+
+# Returns pressure in inHg from nearby station, or an error code ERR_INVALID_DATA or ERR_FAILED_GET
 def getPressure():
-    i = 0
-    while i < len(WU_STATIONS):  # loops through stations in WU_STATIONS list
-
-        # Get pressure from nearby station
-        getUrl = "https://api.weather.com/v2/pws/observations/current?stationId={}&format=json&units=e&apiKey={}".format(WU_STATIONS[i], WU_credentials.WU_API_KEY)
-            
-        try:
-            response = requests.get(getUrl, timeout=10).json()
-            if len(response['observations'][0]) >= 16: # should return 16, not sure what it will return if there's an error
-                if isNumber(response['observations'][0]['imperial']['pressure']):
-                    nearby_pressure = float(response['observations'][0]['imperial']['pressure'])
-                    nearby_last_update_time = int(response['observations'][0]['epoch'])
-                    if (nearby_pressure) > 25: # a pressure less than 25 inHg isn't valid
-                        return(nearby_pressure)
-
-            # Didn't get a valid pressure. Try the next station in WU_STATIONS tuple
-            print("Couldn't get pressure data from {}".format(WU_STATIONS[i]))
-            nearby_pressure = ERR_INVALID_DATA
-            nearby_last_update_time = 0
-            i = i + 1
-            time.sleep(10)
-
-        except Exception:
-            print("Error in getPressure(), failed get() request for station {}".format(WU_STATIONS[i]))
-            i = i + 1
-            if (i >= len(WU_STATIONS)):
-                return(ERR_FAILED_GET)
+    return(getPressureObservation()[0])
 
-        
-    # Couldn't get pressure, return an error
-    return(ERR_INVALID_DATA)
-        
 
 # Checks to see if a string is numeric
 def isNumber(str):
@@ -0,0 +1,50 @@
+# Shared HTTP client for WU_upload.py and WU_download.py
+# Keeps one requests.Session per host so the TCP and TLS connection to rtupdate.wunderground.com and
+# api.weather.com stay open between calls (keep-alive), instead of doing a new DNS lookup, TCP
+# handshake and TLS handshake for every upload and download.
+#
+# Sessions are safe to use from the worker threads asyncio.to_thread() uses in Weather_Station.py,
+# the connection pool hands each thread its own connection.
+
+import threading
+from urllib.parse import urlsplit
+
+CONNECT_TIMEOUT = 5   # seconds to connect to server
+READ_TIMEOUT    = 10  # seconds to wait for server to respond
+POOL_SIZE       = 4   # connections kept open per host
+
+_sessions = {}                  # host: requests.Session
+_sessionsLock = threading.Lock()
+
+
+# Returns session for host, creates it the first time
+# requests is imported here the first time it's needed, it takes a while to load on a Pi Zero
+def getSession(host):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _sessionsLock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return(session)
+
+
+# Same as requests.get() but reuses the pooled connection for the host in url
+# timeout can be one number or (connect, read) like requests.  Default is (CONNECT_TIMEOUT, READ_TIMEOUT)
+def get(url, timeout=None):
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return(getSession(urlsplit(url).netloc).get(url, timeout=timeout))
+
+
+# Closes all sessions, used when program exits
+def closeAll():
+    with _sessionsLock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,227 @@
+# Counters, gauges and latency histograms for the weather station, served as Prometheus text
+# Metrics are made once, usually at the top of the module that updates them, and are registered in
+# REGISTRY.  startServer() serves REGISTRY on http://<RPi>:port/metrics from a background thread, so
+# Prometheus (or curl) can read them while the station runs.
+#
+#   counter   only goes up, ie packets decoded.  Prometheus works out rates from it
+#   gauge     a value that goes up and down, ie upload queue depth.  It can be given a function that's
+#             called each time metrics are read instead of being set
+#   histogram counts observations (ie seconds an upload took) in fixed buckets, so p50/p99 can be worked out
+#
+# Metrics are updated from the reader thread, the asyncio loop and worker threads, so each has a lock.
+
+import bisect
+import http.server
+import math
+import threading
+import time
+
+# Default histogram buckets, seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _formatValue(value):
+    if value == math.inf:
+        return("+Inf")
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return(str(int(value)))
+    return(repr(value))
+
+
+class counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name  = name
+        self.help  = help
+        self.lock  = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        return(["{} {}".format(self.name, _formatValue(self.value))])
+
+
+class gauge:
+    kind = "gauge"
+
+    # function is called each time the value is read, if given
+    def __init__(self, name, help, function=None):
+        self.name     = name
+        self.help     = help
+        self.lock     = threading.Lock()
+        self.value    = 0
+        self.function = function
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        if self.function is not None:
+            return(self.function())
+        return(self.value)
+
+    def render(self):
+        try:
+            value = self.get()
+        except Exception as err: # a broken gauge function shouldn't stop the other metrics from being served
+            return(["# {} error: {}".format(self.name, err)])
+        return(["{} {}".format(self.name, _formatValue(value))])
+
+
+class histogram:
+    kind = "histogram"
+
+    # buckets are the upper bounds, in increasing order.  +Inf is added
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.lock    = threading.Lock()
+        self.bounds  = tuple(buckets) + (math.inf,)
+        self.counts  = [0] * len(self.bounds)  # not cumulative
+        self.sum     = 0.0
+        self.count   = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    # Context manager that observes the seconds the with block took
+    #   with UPLOAD_SECONDS.time():
+    #       sendToWU(url)
+    def time(self):
+        return(_histogramTimer(self))
+
+    # Estimates quantile q (0.5 = median) from the buckets, same way Prometheus histogram_quantile() does.
+    # Returns NaN if nothing has been observed
+    def quantile(self, q):
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+        if count == 0:
+            return(math.nan)
+        rank = q * count
+        cumulative = 0
+        for i, n in enumerate(counts):
+            if cumulative + n >= rank and n > 0:
+                if self.bounds[i] == math.inf:
+                    return(self.bounds[i - 1] if i > 0 else math.nan)  # can't interpolate into +Inf bucket
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                return(lower + (self.bounds[i] - lower) * (rank - cumulative) / n)
+            cumulative += n
+        return(self.bounds[-2])
+
+    def render(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.bounds, counts):
+            cumulative += n
+            lines.append('{}_bucket{{le="{}"}} {}'.format(self.name, _formatValue(float(bound)), cumulative))
+        lines.append("{}_sum {}".format(self.name, _formatValue(total)))
+        lines.append("{}_count {}".format(self.name, count))
+        return(lines)
+
+
+class _histogramTimer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return(self)
+
+    def __exit__(self, excType, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return(False)
+
+
+class registry:
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.metrics = {}  # name: metric, in the order they were made
+
+    def _add(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError("Metric already registered: {}".format(metric.name))
+            self.metrics[metric.name] = metric
+        return(metric)
+
+    def counter(self, name, help):
+        return(self._add(counter(name, help)))
+
+    def gauge(self, name, help, function=None):
+        return(self._add(gauge(name, help, function)))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return(self._add(histogram(name, help, buckets)))
+
+    def get(self, name):
+        return(self.metrics[name])
+
+    # Returns all metrics in Prometheus text format
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric.render())
+        return("\n".join(lines) + "\n")
+
+    # Returns {name: value} of the counters, used for the hourly stats and the warm restart checkpoint
+    def counterValues(self):
+        with self.lock:
+            return({m.name: m.value for m in self.metrics.values() if m.kind == "counter"})
+
+
+REGISTRY = registry()  # metrics for the whole program
+
+
+#---------------------------------------------------------------------
+# HTTP server for /metrics
+#---------------------------------------------------------------------
+class _metricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # don't print a line for every scrape
+
+
+# Serves metrics on port in a daemon thread.  Returns the server, call shutdown() on it to stop
+# There's no login, so the default host only takes connections from the same machine.  "" serves every interface
+def startServer(port, host="127.0.0.1", metricsRegistry=REGISTRY):
+    handler = type("metricsHandler", (_metricsHandler,), {'registry': metricsRegistry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metricsServer", daemon=True).start()
+    return(server)
@@ -0,0 +1,210 @@
+# Packet type handlers for Davis ISS packets
+# The 4 MSB of the header byte tell what data is in bytes 3-4.  PACKET_HANDLERS has an entry for all 16
+# possible header values.  Each entry is a handler object that takes the issPacket record from
+# WU_decodeWirelessData.parsePacket() and updates the weatherStation object (weatherData_cls.py).
+#
+# To add a new packet type, subclass packetHandler and call registerHandler() with the header value.
+# handle() returns a list, same as WU_stationCore.decodeRawData()
+#  0: True/False if successful
+#  1: message
+
+import WU_decodeWirelessData as decode
+
+
+class packetHandler:
+    name = "Unknown"
+
+    def __init__(self, name=None):
+        if name is not None:
+            self.name = name
+
+    def handle(self, station, pkt, packet):
+        return[False, "No handler for packet type: {:#x}".format(pkt.packetType)]
+
+
+# Packet types the ISS sends that we don't use
+class ignoredPacketHandler(packetHandler):
+    def handle(self, station, pkt, packet):
+        return[True, self.name]
+
+
+# Returns rain bucket tip counter.  1 count = 0.01".  Counter rolls over at 127
+class rainCountHandler(packetHandler):
+    name = "Rain Counter"
+
+    def __init__(self):
+        self.rainCounterOld = 0  # Previous value of rain counter
+        self.rainCntDataPts = 0  # Counts the times RPi has received rain counter data, this is not the actual rain counter
+
+    def handle(self, station, pkt, packet):
+        rainCounterNew = pkt.value
+        if (rainCounterNew < 0 or rainCounterNew > 127):
+            errmsg = 'Invalid rain counter value:{} from {}'.format(rainCounterNew, packet)
+            return[False, errmsg] # Invalid rain counter value
+
+        # Don't calculate rain counts until program has received 2nd data point.  First data point will be the
+        # starting value, then 2nd data point will be the accumulation, if any.  For example, if first time
+        # data arrives its 50, we don't want to take 50-0 = 50 (ie 0.5") and add that to the daily rain accumulation.
+        # Wait until the next data point comes in, which will probably be 50 (in this example), so 50-50 = 0.  No rain accumulated.
+        # If it's raining at the time of reboot, you might get 51, so 51 - 50 = 1 or 0.01" added.
+        if (self.rainCntDataPts == 1):
+            self.rainCounterOld = rainCounterNew
+
+        if ( (self.rainCntDataPts >= 2) and (self.rainCounterOld != rainCounterNew) ):
+
+            # See how many bucket tips counter went up.  Should be only one unless it's
+            # raining really hard or there is a long transmission delay from ISS
+            if (rainCounterNew < self.rainCounterOld):
+                newRain = (128 - self.rainCounterOld) + rainCounterNew # Rain counter has rolled over (counts from 0 - 127)
+            else:
+                newRain = rainCounterNew - self.rainCounterOld
+
+            station.rainToday += newRain/100.0;  # Increment daily rain counter
+            self.rainCounterOld = rainCounterNew
+
+        self.rainCntDataPts += 1 # Increment number times RPi received rain count data
+
+        return[True, "rain count"]
+
+    # Rain counter baseline, saved so a restart doesn't have to wait for two rain counter packets
+    def getState(self):
+        return({'rainCounterOld': self.rainCounterOld, 'rainCntDataPts': self.rainCntDataPts})
+
+    def setState(self, state):
+        self.rainCounterOld = state['rainCounterOld']
+        self.rainCntDataPts = state['rainCntDataPts']
+
+
+# Rain rate in inches per hour
+class rainRateHandler(packetHandler):
+    name = "Rain Seconds"
+
+    def handle(self, station, pkt, packet):
+        rainSeconds = pkt.value # seconds between bucket tips, 0.01" per tip
+        fifteenMin = 60 * 15 # seconds in 15 minutes
+        if (rainSeconds > 10): # If no error
+            if (rainSeconds < fifteenMin):
+                station.rainRate = (0.01 * 3600.0) / rainSeconds
+            else:
+                station.rainRate = 0.0 # More then 15 minutes since last bucket tip, can't calculate rain rate until next bucket tip
+            return[True, "rain rate"]
+        errmsg = 'Invalid rain seconds. Got {} from {}'.format(rainSeconds, packet)
+        return[False, errmsg]
+
+
+# Temperature F
+class temperatureHandler(packetHandler):
+    name = "Temperature"
+
+    def handle(self, station, pkt, packet):
+        newTemp = pkt.value
+        if (newTemp > -100): #If no error
+            station.outsideTemp = newTemp
+            station.calcWindChill() # calculate windchill
+            # If we have R/H too, then calculate dew point
+            if (station.gotHumidityData() == True):
+                newDewPoint = station.calcDewPoint() # Calculate dew point
+                if (newDewPoint <= -100):
+                    errmsg = 'Invalid dewpoint: {} from temp={} and humidity={}'.format(newDewPoint, station.outsideTemp, station.humidity)
+                    print(errmsg)
+            return[True, "Temperature"]
+        errmsg = 'Invalid temperature. Got {} from {}'.format(newTemp, packet)
+        return[False, errmsg]
+
+
+# Wind gusts in MPH
+class windGustHandler(packetHandler):
+    name = "Gusts"
+
+    def handle(self, station, pkt, packet):
+        newWindGust = pkt.value
+        if newWindGust >= 0:
+            station.windGust = newWindGust
+            return[True, "Wind Gust"]
+        errmsg = 'Invalid wind gust. Got {} from {}'.format(newWindGust, packet)
+        return[False, errmsg]
+
+
+# Relative humidity
+class humidityHandler(packetHandler):
+    name = "Humidity"
+
+    def handle(self, station, pkt, packet):
+        newHumidity = pkt.value
+        if (newHumidity > 0):
+            station.humidity = newHumidity
+            # If we have outside temperature too, then calculate dew point
+            if (station.gotTemperatureData() == True):
+                newDewPoint = station.calcDewPoint() # Calculate dew point
+                if (newDewPoint <= -100):
+                    errmsg = 'Invalid dewpoint: {} from temp={} and humidity={}'.format(newDewPoint, station.outsideTemp, station.humidity)
+                    print(errmsg)
+
+            return[True, "Humidity"]
+        errmsg = 'Invalid humidity. Got {} from {}'.format(newHumidity, packet)
+        return[False, errmsg]
+
+
+# Capacitor voltage
+class capVoltsHandler(packetHandler):
+    name = "Super Cap"
+
+    def handle(self, station, pkt, packet):
+        newCapVolts = pkt.value
+        if (newCapVolts >= 0):
+            station.capacitorVolts = newCapVolts
+            return[True, "Cap volts"]
+        errmsg = 'Invalid cap volts.  Got {} from {}'.format(newCapVolts, packet)
+        station.capacitorVolts = -1
+        return[False, errmsg]
+
+
+# UV Index
+# If the ISS doesn't have a UV sensor it sends 0xFF, leave uvIndex alone so it isn't uploaded
+class uvIndexHandler(packetHandler):
+    name = "UV Index"
+
+    def handle(self, station, pkt, packet):
+        if (pkt.error == decode.ERR_SENSOR_OFFLINE):
+            return[True, "UV Index sensor offline"]
+        if (pkt.value >= 0):
+            station.uvIndex = pkt.value
+            return[True, "UV Index"]
+        errmsg = 'Invalid UV Index.  Got {} from {}'.format(pkt.value, packet)
+        return[False, errmsg]
+
+
+# Solar radiation in Watts/Meter^2
+# If the ISS doesn't have a solar sensor it sends 0xFF, leave solar alone so it isn't uploaded
+class solarRadiationHandler(packetHandler):
+    name = "Solar Radiation"
+
+    def handle(self, station, pkt, packet):
+        if (pkt.error == decode.ERR_SENSOR_OFFLINE):
+            return[True, "Solar Radiation sensor offline"]
+        if (pkt.value >= 0):
+            station.solar = pkt.value
+            return[True, "Solar Radiation"]
+        errmsg = 'Invalid solar radiation.  Got {} from {}'.format(pkt.value, packet)
+        return[False, errmsg]
+
+
+# Handler for each of the 16 possible header values.  Index is the 4 MSB of header byte 0
+PACKET_HANDLERS = [packetHandler("{:#x}".format(packetType)) for packetType in range(16)]
+
+
+def registerHandler(packetType, handler):
+    if (packetType < 0 or packetType > 15):
+        raise ValueError("Packet type must be 0-15, got {}".format(packetType))
+    PACKET_HANDLERS[packetType] = handler
+
+
+registerHandler(decode.ISS_CAP_VOLTS,    capVoltsHandler())
+registerHandler(decode.ISS_UV_INDEX,     uvIndexHandler())
+registerHandler(decode.ISS_RAIN_SECONDS, rainRateHandler())
+registerHandler(decode.ISS_SOLAR_RAD,    solarRadiationHandler())
+registerHandler(0x7,                     ignoredPacketHandler("Solar Cell Volts"))
+registerHandler(decode.ISS_OUT_TEMP,     temperatureHandler())
+registerHandler(decode.ISS_WIND_GUST,    windGustHandler())
+registerHandler(decode.ISS_HUMIDITY,     humidityHandler())
+registerHandler(decode.ISS_RAIN_COUNT,   rainCountHandler())
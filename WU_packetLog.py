@@ -0,0 +1,136 @@
+# Binary log of every packet the station receives, including repeats of the same packet
+# Each record is 16 bytes: time.monotonic_ns() when the packet was read (uint64, little endian) and the
+# 8 packet bytes.  A new file is started every day, packets_YYYYMMDD.bin, so a year of packets (about
+# 12 million) is 365 files and under 200 MB.
+#
+# packetLog is the writer, used by the reader thread in Weather_Station.py.  It only needs the standard
+# library.  loadLog() is the reader, it maps a file into memory as a NumPy structured array (see
+# LOG_DTYPE) without copying it, so logs[...]['packet'] can go straight to WU_decodeBatch.decodeBatch().
+#
+# Note monotonic time starts over when the RPi reboots, so timestamps are only good for the time between
+# packets, not the time of day.  The file name has the date.
+#
+# Run this file with a log file or directory to print a summary:  python3 WU_packetLog.py packet_log/
+
+import glob
+import os
+import struct
+import sys
+import threading
+import time
+
+RECORD = struct.Struct('<Q8s')  # monotonic ns, packet
+RECORD_SIZE = RECORD.size       # 16 bytes
+FLUSH_INTERVAL = 10             # seconds between writes to disk, a power cut loses at most this much
+
+
+class packetLog:
+
+    def __init__(self, directory, prefix="packets_"):
+        self.directory = directory
+        self.prefix    = prefix
+        self.lock      = threading.Lock()
+        self.file      = None
+        self.day       = None  # "YYYYMMDD" of open file
+        self.lastFlush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+    # Path of log file for day, "YYYYMMDD"
+    def path(self, day):
+        return(os.path.join(self.directory, "{}{}.bin".format(self.prefix, day)))
+
+    # Adds packet to log.  timestamp is time.monotonic_ns() when packet was read, default is now
+    def append(self, packet, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        record = RECORD.pack(timestamp, bytes(packet))
+        day = time.strftime("%Y%m%d")
+        with self.lock:
+            try:
+                if day != self.day:
+                    self._rotate(day)
+                self.file.write(record)
+                if time.monotonic() - self.lastFlush >= FLUSH_INTERVAL:
+                    self.file.flush()
+                    self.lastFlush = time.monotonic()
+            except OSError as err:
+                print("Error writing packet log: {}".format(err))
+                self.file = None
+                self.day = None
+
+    # Closes file for the old day and opens file for the new one.  Caller must hold lock
+    def _rotate(self, day):
+        if self.file is not None:
+            self.file.close()
+        path = self.path(day)
+        self.file = open(path, "ab")
+        self.file.truncate(os.path.getsize(path) // RECORD_SIZE * RECORD_SIZE)  # drop a partial record from a power cut
+        self.day = day
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = None
+            self.day = None
+
+
+#---------------------------------------------------------------------
+# Reader, needs NumPy
+#---------------------------------------------------------------------
+_logDtype = None
+
+# Returns NumPy dtype of a log record, fields 't' (monotonic ns) and 'packet' (8 bytes)
+def logDtype():
+    global _logDtype
+    if _logDtype is None:
+        import numpy as np
+        _logDtype = np.dtype([('t', '<u8'), ('packet', 'u1', (8,))])
+    return(_logDtype)
+
+
+# Maps log file into memory.  Returns read-only structured array with one record per packet, nothing is
+# copied until the data is used.  A partial record at the end of the file is left out
+def loadLog(path):
+    import numpy as np
+    numRecords = os.path.getsize(path) // RECORD_SIZE
+    if numRecords == 0:
+        return(np.zeros(0, dtype=logDtype()))
+    return(np.memmap(path, dtype=logDtype(), mode='r', shape=(numRecords,)))
+
+
+# Returns log files in directory, oldest first
+def logFiles(directory, prefix="packets_"):
+    return(sorted(glob.glob(os.path.join(directory, prefix + "*.bin"))))
+
+
+# Prints number of packets, time span, CRC errors and packet types for a log file
+def printSummary(path):
+    import numpy as np
+    import WU_decodeBatch
+    import WU_packetHandlers
+    log = loadLog(path)
+    if len(log) == 0:
+        print("{}: empty".format(path))
+        return
+    packets = log['packet']
+    crcOK = WU_decodeBatch.crcValid(packets)
+    counts = np.bincount(packets[:, 0] >> 4, minlength=16)
+    print("{}: {} packets over {:.1f} hours, {} CRC errors".format(path, len(log), (int(log['t'][-1]) - int(log['t'][0])) / 3.6e12,
+                                                                   len(log) - int(crcOK.sum())))
+    for packetType in np.nonzero(counts)[0]:
+        print("   {:#x} {:20} {}".format(packetType, WU_packetHandlers.PACKET_HANDLERS[packetType].name, counts[packetType]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 WU_packetLog.py logFile|logDirectory ...")
+        sys.exit(1)
+    for arg in sys.argv[1:]:
+        for path in (logFiles(arg) if os.path.isdir(arg) else [arg]):
+            printSummary(path)
@@ -0,0 +1,160 @@
+# Stage profiler for the station's hot path.  When the station starts missing packets in the field, this
+# shows which part of the work is eating time, without a debugger on the Pi.
+#
+# The work is split into named stages (STAGES).  Code wraps a stage in
+#   with PROFILER.stage("decode"):
+#       decodeRawData(packet)
+# or wraps a function that runs in a worker thread with PROFILER.wrap("upload", func).
+#
+# Only 1 in every 1/sampleRate calls is timed, the rest go through a do-nothing context manager, so the
+# cost when a call isn't sampled is a counter increment and a clock read.  Stages that run once a minute
+# or less (day rollover, hourly stats) would hardly ever get a sample that way, so a call is also timed
+# if the stage hasn't had a sample in MIN_SAMPLE_INTERVAL seconds.  Each sample is weighted by the calls
+# since the last one, for the busy estimate.  Sampled calls record wall time (perf_counter) and CPU time
+# of the thread (thread_time).  A stage must start and end in the same thread.
+# Time spent waiting for a packet (the ready pin wait) isn't a stage, it's idle time.
+#
+# The summary covers the last WINDOW seconds.  installSignal() prints it when the program gets SIGUSR1:
+#   kill -USR1 $(pgrep -f Weather_Station.py)
+
+import collections
+import signal
+import threading
+import time
+
+# upload is the loop side (queueing the observation), uploadSend is sending the queue in a worker thread
+STAGES = ("readyPin", "heartbeat", "i2cRead", "decode", "dayRollover", "pressure", "upload", "uploadSend", "housekeeping")
+SAMPLE_RATE = 0.1   # fraction of calls that are timed
+MIN_SAMPLE_INTERVAL = 5 * 60  # seconds, a stage with no sample for this long has its next call timed
+WINDOW = 10 * 60    # seconds covered by the summary
+MAX_SAMPLES = 2000  # samples kept per stage, oldest are dropped first
+
+
+class _nullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, excType, exc, tb):
+        return(False)
+
+_NULL_TIMER = _nullTimer()
+
+
+class _stageTimer:
+    __slots__ = ('stats', 'weight', 'wallStart', 'cpuStart')
+
+    def __init__(self, stats, weight):
+        self.stats = stats
+        self.weight = weight
+
+    def __enter__(self):
+        self.cpuStart = time.thread_time()
+        self.wallStart = time.perf_counter()
+        return(self)
+
+    def __exit__(self, excType, exc, tb):
+        wall = time.perf_counter() - self.wallStart
+        cpu = time.thread_time() - self.cpuStart
+        self.stats.record(wall, cpu, self.weight)
+        return(False)
+
+
+class _stageStats:
+
+    def __init__(self, name, clock):
+        self.name    = name
+        self.clock   = clock
+        self.lock    = threading.Lock()
+        self.calls   = 0  # all calls, sampled or not
+        self.sampledCalls = 0     # calls when the last sample was taken
+        self.lastSample = None    # clock() when the last sample was taken
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)  # (clock(), wall seconds, cpu seconds, calls it stands for)
+
+    def record(self, wall, cpu, weight=1):
+        with self.lock:
+            self.samples.append((self.clock(), wall, cpu, weight))
+
+    # Returns samples taken in the last window seconds
+    def recent(self, window):
+        cutoff = self.clock() - window
+        with self.lock:
+            return([s for s in self.samples if s[0] >= cutoff])
+
+
+class profiler:
+
+    # sampleRate 0 turns timing off, 1 times every call.  clock is only used to age out samples
+    def __init__(self, sampleRate=SAMPLE_RATE, clock=time.monotonic):
+        self.clock = clock
+        self.startTime = clock()
+        self.stages = {name: _stageStats(name, clock) for name in STAGES}
+        self.setSampleRate(sampleRate)
+
+    def setSampleRate(self, sampleRate):
+        self.sampleRate = sampleRate
+        self.sampleEvery = round(1 / sampleRate) if sampleRate > 0 else 0
+
+    # Returns context manager that times the with block, if this call is sampled
+    def stage(self, name):
+        stats = self.stages[name]
+        stats.calls += 1  # not locked, a lost count only moves which call is sampled
+        if not self.sampleEvery:
+            return(_NULL_TIMER)
+        now = self.clock()
+        if stats.calls % self.sampleEvery == 0 or stats.lastSample is None or now - stats.lastSample >= MIN_SAMPLE_INTERVAL:
+            weight = stats.calls - stats.sampledCalls
+            stats.sampledCalls = stats.calls
+            stats.lastSample = now
+            return(_stageTimer(stats, weight))
+        return(_NULL_TIMER)
+
+    # Returns function that runs func inside stage name.  For asyncio.to_thread() and callbacks
+    def wrap(self, name, func):
+        def staged(*args, **kwargs):
+            with self.stage(name):
+                return(func(*args, **kwargs))
+        return(staged)
+
+    # Returns {stage: {...}} for the last window seconds.  busy is the estimated fraction of wall time
+    # the stage took, each sample's time times the calls it stands for
+    def summary(self, window=WINDOW):
+        span = min(window, max(self.clock() - self.startTime, 1e-9))
+        result = {}
+        for name, stats in self.stages.items():
+            samples = stats.recent(window)
+            walls = sorted(s[1] for s in samples)
+            cpus = [s[2] for s in samples]
+            n = len(walls)
+            result[name] = {'calls':   stats.calls,
+                            'samples': n,
+                            'wallAvg': sum(walls) / n if n else 0.0,
+                            'wallP50': walls[n // 2] if n else 0.0,
+                            'wallP99': walls[min(n - 1, int(n * 0.99))] if n else 0.0,
+                            'wallMax': walls[-1] if n else 0.0,
+                            'cpuAvg':  sum(cpus) / n if n else 0.0,
+                            'busy':    sum(s[1] * s[3] for s in samples) / span}
+        return(result)
+
+    # Returns summary as a table, times in milliseconds
+    def formatSummary(self, window=WINDOW):
+        lines = ["Stage profile, last {:.0f} seconds, 1 in {} calls timed and at least one every {} seconds   {}".format(
+                 min(window, self.clock() - self.startTime), self.sampleEvery, MIN_SAMPLE_INTERVAL, time.strftime("%m/%d/%Y %I:%M:%S %p")),
+                 "{:14}{:>10}{:>9}{:>10}{:>10}{:>10}{:>10}{:>10}{:>8}".format(
+                 "stage", "calls", "samples", "avg ms", "p50 ms", "p99 ms", "max ms", "cpu ms", "busy")]
+        for name, s in self.summary(window).items():
+            lines.append("{:14}{:>10}{:>9}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}{:>7.2f}%".format(
+                         name, s['calls'], s['samples'], s['wallAvg'] * 1e3, s['wallP50'] * 1e3, s['wallP99'] * 1e3,
+                         s['wallMax'] * 1e3, s['cpuAvg'] * 1e3, s['busy'] * 100))
+        return("\n".join(lines))
+
+    # Prints summary when the program gets signum.  Must be called from the main thread
+    def installSignal(self, signum=signal.SIGUSR1, out=print):
+        def handler(signum, frame):
+            # Print from another thread, the signal may have interrupted the main thread while it holds a stage lock
+            threading.Thread(target=lambda: out(self.formatSummary()), name="profileSummary", daemon=True).start()
+        signal.signal(signum, handler)
+
+
+PROFILER = profiler(sampleRate=0)  # profiler for the whole program, off until Weather_Station.py sets the sample rate
@@ -0,0 +1,256 @@
+# Replays recorded packets through the station's decoding, with a simulated clock and no hardware
+# Packets go through the same path as on the RPi: the I2C transport (WU_transport.i2cTransport) reading
+# a fake Moteino, the duplicate packet check, WU_stationCore.decodeRawData(), the packet handlers and the
+# weatherStation derivations (dew point, wind chill, wind direction average, rain).  Every upload period
+# the W/U upload parameters (WU_upload.uploadParams()) are printed, one line per upload, so two runs can
+# be compared with diff to find a change in rain accounting or wind averaging.
+#
+# The station's clock is simulated from the packet timestamps, so freshness checks and time windows work
+# the same as they did when the packets were recorded, even at full speed.
+#   realtime mode: packets are sent at the recorded rate (times speed), to reproduce a field problem
+#   fast mode:     packets are sent as fast as they can be decoded, to measure throughput
+#
+# Recordings are WU_packetLog.py binary files (.bin) or hex text files, one packet per line (see
+# WU_transport.py).  Text files don't have timestamps, so packets are TEXT_PACKET_INTERVAL seconds apart.
+# Each recording is one day (packet logs start a new file every day), so daily rain starts over at the
+# start of each file, the same as newDay() in Weather_Station.py does at midnight.
+#
+# Usage: python3 WU_replay.py recording [recording ...] [--realtime [speed]] [--every-packet] [--upload-freq seconds]
+# Observations go to stdout, the summary (packets per second etc) goes to stderr
+
+import sys
+import threading
+import time
+import types
+
+TEXT_PACKET_INTERVAL = 2.5  # seconds between packets in a text recording, about how often the ISS transmits
+UPLOAD_FREQ = 60            # seconds between observations, same as g_uploadFreqWU in Weather_Station.py
+ISS_STATION_ID = 1
+I2C_ADDRESS = 0x04
+
+
+# WU_upload.py imports WU_credentials.py, which isn't in the Git repo.  The replay doesn't send
+# anything, so if it's missing use a stand in
+try:
+    import WU_credentials
+except ImportError:
+    sys.modules['WU_credentials'] = types.SimpleNamespace(WU_PASSWORD="replay", WU_STATION_ID_SUNTEC="REPLAY",
+                                                          WU_STATION_ID_TEST="REPLAY", WU_API_KEY="replay")
+
+import WU_packetHandlers
+import WU_stationCore
+import WU_transport
+import WU_upload
+import WU_decodeWirelessData
+import weatherData_cls
+
+
+#---------------------------------------------------------------------
+# Simulated clock.  The station and the fake Moteino use it instead of time.monotonic()
+#---------------------------------------------------------------------
+class simClock:
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return(self.now)
+
+
+#---------------------------------------------------------------------
+# Fake Moteino.  It's the ready pin (isReady()/wait(), same as moteinoReady_cls.moteinoReadySignal) and
+# the smbus object (read_i2c_block_data()) for WU_transport.i2cTransport.  The pin goes high when the
+# next recorded packet is due.  Reading the packet sets the simulated clock to the packet's time and day
+# to the day it was recorded.  records are (seconds, packet, day) from readRecordings().
+# speed = None sends packets as fast as they're read, otherwise the recording is played at speed times
+# real time
+#---------------------------------------------------------------------
+class fakeMoteino:
+
+    def __init__(self, records, clock, speed=None):
+        self.records = iter(records)  # (seconds, packet, day)
+        self.clock   = clock
+        self.speed   = speed
+        self.day     = None  # day of the last packet read
+        self.next    = next(self.records, None)
+        self.eof     = self.next is None
+        self.wallStart = None
+        self.simStart  = None if self.eof else self.next[0]
+
+    # Ready pin
+    def isReady(self):
+        return(not self.eof and self._due() <= 0)
+
+    def wait(self, timeout):
+        if self.eof:
+            return(False)
+        wait = self._due()
+        if wait > timeout:
+            time.sleep(timeout)
+            return(False)
+        if wait > 0:
+            time.sleep(wait)
+        return(True)
+
+    # Wall clock seconds until the next packet is due, always 0 in fast mode
+    def _due(self):
+        if self.speed is None:
+            return(0)
+        if self.wallStart is None:
+            self.wallStart = time.monotonic()
+        return(self.wallStart + (self.next[0] - self.simStart) / self.speed - time.monotonic())
+
+    # smbus
+    def read_i2c_block_data(self, address, offset, length):
+        if self.eof:
+            raise OSError(5, "Input/output error")  # same as a Moteino that's not answering
+        seconds, packet, self.day = self.next
+        self.clock.now = seconds
+        self.next = next(self.records, None)
+        self.eof = self.next is None
+        return(list(packet))
+
+
+# Returns (seconds, packet) for each packet in a recording.  Binary log times are made relative to
+# the first packet in the file, then offset by start.  The log has monotonic times, which start over
+# when the RPi reboots, so if the time goes backwards the packets carry on from the previous time
+def readRecording(path, start=0.0):
+    if path.endswith(".bin"):
+        import WU_packetLog
+        log = WU_packetLog.loadLog(path)
+        if len(log) == 0:
+            return
+        t0 = int(log['t'][0])
+        offset = start
+        previous = start
+        for t, packet in zip(log['t'].tolist(), log['packet'].tolist()):
+            seconds = offset + (t - t0) / 1e9
+            if seconds < previous:  # rebooted
+                offset += previous - seconds
+                seconds = previous
+            previous = seconds
+            yield((seconds, packet))
+    else:
+        seconds = start
+        with open(path) as f:
+            for line in f:
+                packet = WU_transport.parsePacketText(line)
+                if packet is not None:
+                    yield((seconds, packet))
+                    seconds += TEXT_PACKET_INTERVAL
+
+
+# Chains recordings one after the other, each file starts TEXT_PACKET_INTERVAL after the last one ended
+# Returns (seconds, packet, day), day is which recording the packet is from, 0 for the first one
+def readRecordings(paths):
+    start = 0.0
+    for day, path in enumerate(paths):
+        seconds = None
+        for seconds, packet in readRecording(path, start):
+            yield((seconds, packet, day))
+        if seconds is not None:
+            start = seconds + TEXT_PACKET_INTERVAL
+
+
+#---------------------------------------------------------------------
+# Replays records through the station.  out is a function that gets each observation line
+# Returns a dictionary of stats
+#---------------------------------------------------------------------
+def replay(records, speed=None, uploadFreq=UPLOAD_FREQ, everyPacket=False, out=print):
+    clock = simClock()
+    station = weatherData_cls.weatherStation(ISS_STATION_ID, clock=clock)
+    station.windGust = 0.0   # same startup values as Weather_Station.py
+    station.rainToday = 0.0
+    WU_packetHandlers.PACKET_HANDLERS[WU_decodeWirelessData.ISS_RAIN_COUNT].setState({'rainCounterOld': 0, 'rainCntDataPts': 0})
+
+    moteino = fakeMoteino(records, clock, speed)
+    transport = WU_transport.i2cTransport(moteino, I2C_ADDRESS, moteino, threading.Lock(), minInterval=0)
+    stats = {'packets': 0, 'duplicates': 0, 'errors': 0, 'observations': 0, 'days': 0}
+    nextUpload = None
+    rawDataOld = None
+    day = None
+    wallStart = time.perf_counter()
+
+    while not moteino.eof:
+        try:
+            packet = transport.read(1.0)
+        except OSError:
+            break
+        if packet is None:
+            continue
+        if packet == rawDataOld:  # same duplicate check as the reader thread
+            stats['duplicates'] += 1
+            continue
+        rawDataOld = packet
+        stats['packets'] += 1
+
+        # Uploads that were due before this packet arrived
+        if nextUpload is None:
+            nextUpload = clock.now + uploadFreq
+        while not everyPacket and clock.now >= nextUpload:
+            _observe(station, nextUpload, out, stats)
+            nextUpload += uploadFreq
+
+        if moteino.day != day:  # new recording, same as newDay() at midnight
+            day = moteino.day
+            station.rainToday = 0.0
+            stats['days'] += 1
+
+        decodeStatus = WU_stationCore.decodeRawData(station, packet)
+        if decodeStatus[0] == False:
+            stats['errors'] += 1
+            if everyPacket:
+                out("{:.3f}\terror\t{}".format(clock.now, decodeStatus[1]))
+        elif everyPacket:
+            _observe(station, clock.now, out, stats)
+
+    # The station would still send the upload that was due after the last packet
+    if not everyPacket and nextUpload is not None:
+        _observe(station, nextUpload, out, stats)
+
+    stats['simSeconds'] = clock.now
+    stats['wallSeconds'] = time.perf_counter() - wallStart
+    return(stats)
+
+
+# Outputs one observation, the same data an upload at simulated time t would send
+def _observe(station, t, out, stats):
+    now = station.clock.now
+    station.clock.now = t   # freshness checks as of the upload time
+    if station.gotDewPointData():
+        out("{:.3f}\t{}".format(t, WU_upload.uploadParams(station)))
+        stats['observations'] += 1
+    station.clock.now = now
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    paths = []
+    speed = None
+    everyPacket = False
+    uploadFreq = UPLOAD_FREQ
+    while args:
+        arg = args.pop(0)
+        if arg == "--realtime":
+            speed = 1.0
+            if args and not args[0].startswith("--"):
+                try:
+                    speed = float(args[0])
+                    args.pop(0)
+                except ValueError:
+                    pass
+        elif arg == "--every-packet":
+            everyPacket = True
+        elif arg == "--upload-freq":
+            uploadFreq = float(args.pop(0))
+        else:
+            paths.append(arg)
+    if not paths:
+        print("Usage: python3 WU_replay.py recording [recording ...] [--realtime [speed]] [--every-packet] [--upload-freq seconds]")
+        sys.exit(1)
+
+    stats = replay(readRecordings(paths), speed, uploadFreq, everyPacket)
+    print("{packets} packets over {days} days, {duplicates} duplicates, {errors} decode errors, {observations} observations".format(**stats),
+          file=sys.stderr)
+    print("{:.0f} simulated seconds in {:.3f} seconds, {:.0f} packets per second".format(stats['simSeconds'], stats['wallSeconds'],
+          stats['packets'] / max(stats['wallSeconds'], 1e-9)), file=sys.stderr)
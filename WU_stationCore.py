@@ -0,0 +1,51 @@
+# Packet decoding for the weather station, without any hardware
+# Weather_Station.py reads packets from the Moteino and calls decodeRawData() with them.  This file
+# only needs the decoder (WU_decodeWirelessData.py), the packet handlers (WU_packetHandlers.py) and a
+# weatherStation object (weatherData_cls.py), so it can be imported by tools and tests that don't have
+# RPi.GPIO, smbus or a network connection.
+
+import WU_decodeWirelessData # Decodes wireless data coming from Davis ISS weather station
+import WU_packetHandlers # Handler for each packet type, updates station with the decoded data
+
+
+#---------------------------------------------------------------------
+# Validate weather data from wireless packet and save it in station (a weatherStation object)
+# Returns a list
+#  0: True/False if successfule
+#  1: error message
+#---------------------------------------------------------------------
+def decodeRawData(station, packet):
+    # check CRC
+    if (WU_decodeWirelessData.crc16_ccitt_table(packet) == False):
+        errmsg = "Invalid CRC {0[6]}, {0[7]}".format(packet)
+        return[False, errmsg] # CRC Failed, stop processing packet
+
+    # Unpack the whole packet once, see parsePacket() in WU_decodeWirelessData.py
+    pkt = WU_decodeWirelessData.parsePacket(packet)
+
+    # Check station ID, don't want to get data from another nearby station
+    if (pkt.stationID != station.stationID):
+        errmsg = 'Wrong station ID.  Expected {} but got{}'.format(station.stationID, pkt.stationID)
+        return[False, errmsg] # wrong station ID, stop processing packet
+
+    # CRC passed and staion ID okay, extract weather data from packet
+
+    # Wind speed is in every packet
+    if (pkt.windSpeed >= 0):
+        station.windSpeed = pkt.windSpeed
+    else:
+        errmsg = 'Error exrtacting wind speed from packet. Got {} from {}'.format(pkt.windSpeed, packet)
+        station.windSpeed  = 0
+        return[False, errmsg] # error extracing wind speed, stop processing packet
+
+    # Wind direction is in every packet
+    if (pkt.windDir >= 0):
+        station.windDir = pkt.windDir
+        station.avgWindDirRaw(packet[2])
+    else:
+        errmsg = 'Error exrtacting wind direction from packet. Got {} from {}'.format(pkt.windDir, packet)
+        return[False, errmsg] # Error extracing wind direction, stop processing packet
+
+    # From header byte 0, determine what data has been sent, then let the handler for that packet type
+    # decode it.  See WU_packetHandlers.py
+    return WU_packetHandlers.PACKET_HANDLERS[pkt.packetType].handle(station, pkt, packet)
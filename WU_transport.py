@@ -0,0 +1,270 @@
+# Where packets come from.  Every transport has the same read(timeout) function, so the reader thread in
+# Weather_Station.py doesn't care if the radio is a Moteino on the I2C bus, a Moteino on a USB serial port,
+# a recording, or another program sending packets over a socket.
+#
+# read(timeout) returns one 8 byte packet as a list of ints, or None if no packet came in within timeout
+# seconds.  It raises OSError if the read failed (I2C error, serial port unplugged, etc.)
+#
+# Text formats (serial, file) are one packet per line, 8 hex bytes like printWirelessData() prints them:
+#   "80 05 64 03 20 09 a1 b2"   spaces are optional, blank lines and lines starting with # are skipped
+# Socket transports (udp, unix) take one packet per datagram, either the 8 raw bytes or a hex text line.
+#
+# openTransport() makes a transport from a string, which is how Weather_Station.py is configured:
+#   i2c                        Moteino on the I2C bus, paced by the ready pin (needs bus, readySignal)
+#   serial:/dev/ttyUSB0:115200 Moteino on a serial port, needs pyserial
+#   file:packets.txt           recorded packets.  file:packets.txt:0.5 sends one every 0.5 seconds
+#   udp:0.0.0.0:5005           listen for UDP datagrams
+#   unix:/tmp/weather.sock     listen on a Unix datagram socket
+#
+# Run this file to send packets to a socket transport, for example to load test a station:
+#   python3 WU_transport.py udp:127.0.0.1:5005 packets.txt 1000      (1000 packets per second, 0 = no limit)
+
+import os
+import socket
+import sys
+import time
+
+from WU_profiler import PROFILER  # readyPin and i2cRead stages
+
+PACKET_LENGTH = 8
+
+
+# Returns packet from a line of hex text, or None if the line isn't a packet
+def parsePacketText(line):
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return(None)
+    try:
+        packet = list(bytes.fromhex(line.split('(')[0]))  # printWeatherDataTable() adds "(packet type)" after the bytes
+    except ValueError:
+        return(None)
+    if len(packet) != PACKET_LENGTH:
+        return(None)
+    return(packet)
+
+
+# Returns hex text line for a packet, the format parsePacketText() reads
+def formatPacketText(packet):
+    return(' '.join(['%02x' % b for b in packet]))
+
+
+# Base class for transports, it isn't used on its own.  Subclasses must implement read(), see top of file.
+# close() only needs to be implemented if there's something to close
+class packetTransport:
+    name = "none"
+
+    def __init__(self):
+        self.ready = False        # True if the last read() found a packet waiting, used by the detail log
+        self.readSeconds = None   # seconds the last read took, not counting waiting for a packet.  None if not measured
+
+    def read(self, timeout):
+        raise NotImplementedError("{} transport doesn't implement read()".format(self.name))
+
+    def close(self):
+        pass
+
+
+#---------------------------------------------------------------------
+# Moteino on the I2C bus.  Moteino sets its ready pin high when it has a packet (see moteinoReady_cls.py)
+# While the pin stays high the Moteino is only read once every minInterval seconds.
+# busLock is shared with anything else on the bus (BME280).  healthCheck is an optional function that
+# returns False if the Moteino shouldn't be read right now (Weather_Station.py checks the heartbeat)
+#---------------------------------------------------------------------
+class i2cTransport(packetTransport):
+    name = "i2c"
+
+    def __init__(self, bus, address, readySignal, busLock, healthCheck=None, minInterval=1.0):
+        packetTransport.__init__(self)
+        self.bus         = bus
+        self.address     = address
+        self.readySignal = readySignal
+        self.busLock     = busLock
+        self.healthCheck = healthCheck
+        self.minInterval = minInterval
+        self.lastRead    = 0.0  # time.monotonic() of last read
+
+    def read(self, timeout):
+        nextReadTime = self.lastRead + self.minInterval
+        with PROFILER.stage("readyPin"):
+            ready = self.readySignal.isReady()
+        if (ready):
+            # Pin is still high. Only query Moteino once every minInterval while it stays high
+            now = time.monotonic()
+            if (now < nextReadTime):
+                time.sleep(nextReadTime - now)
+            self.ready = True
+        else:
+            self.ready = self.readySignal.wait(timeout) # wakes up on rising edge of ready pin
+
+        if (self.ready == False):
+            return(None)
+        if (self.healthCheck is not None and self.healthCheck() == False):
+            # The ready pin can stay high through a Moteino reset, wait so the reader doesn't spin
+            time.sleep(min(timeout, self.minInterval))
+            return(None)
+
+        self.lastRead = time.monotonic()
+        startTime = time.perf_counter()
+        try:
+            with PROFILER.stage("i2cRead"), self.busLock:
+                return(self.bus.read_i2c_block_data(self.address, 0, PACKET_LENGTH))  # 0 byte offset, get 8 bytes
+        finally:
+            self.readSeconds = time.perf_counter() - startTime
+
+
+#---------------------------------------------------------------------
+# Moteino on a USB serial port, sending one hex line per packet
+#---------------------------------------------------------------------
+class serialTransport(packetTransport):
+    name = "serial"
+
+    def __init__(self, port, baudRate=115200):
+        packetTransport.__init__(self)
+        import serial  # pyserial, only needed for this transport.  To install: "sudo pip3 install pyserial"
+        self.port = serial.Serial(port, baudRate, timeout=1.0)
+
+    def read(self, timeout):
+        self.port.timeout = timeout
+        line = self.port.readline()  # SerialException is an OSError
+        packet = parsePacketText(line.decode('ascii', 'replace'))
+        self.ready = packet is not None
+        return(packet)
+
+    def close(self):
+        self.port.close()
+
+
+#---------------------------------------------------------------------
+# Recorded packets in a hex text file.  interval is seconds between packets, 0 sends them as fast as
+# they're read.  When the file runs out read() returns None, and eof is set
+#---------------------------------------------------------------------
+class fileTransport(packetTransport):
+    name = "file"
+
+    def __init__(self, path, interval=0.0):
+        packetTransport.__init__(self)
+        self.file     = open(path)
+        self.interval = interval
+        self.eof      = False
+        self.nextTime = time.monotonic()
+
+    def read(self, timeout):
+        if self.interval > 0:
+            wait = self.nextTime - time.monotonic()
+            if wait > timeout:
+                time.sleep(timeout)
+                return(None)
+            if wait > 0:
+                time.sleep(wait)
+            self.nextTime = max(self.nextTime + self.interval, time.monotonic()) # if reader fell behind, don't try to catch up
+
+        for line in self.file:
+            packet = parsePacketText(line)
+            if packet is not None:
+                self.ready = True
+                return(packet)
+        self.eof = True
+        self.ready = False
+        time.sleep(timeout)  # nothing more to send, don't let the reader spin
+        return(None)
+
+    def close(self):
+        self.file.close()
+
+
+#---------------------------------------------------------------------
+# Packets sent over a datagram socket, one packet per datagram.  address is (host, port) for UDP
+# or a path for a Unix socket
+#---------------------------------------------------------------------
+class socketTransport(packetTransport):
+    name = "socket"
+
+    def __init__(self, family, address):
+        packetTransport.__init__(self)
+        self.address = address
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)  # left over from last run
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.bind(address)
+
+    def read(self, timeout):
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(256)
+        except socket.timeout:
+            self.ready = False
+            return(None)
+        if len(data) == PACKET_LENGTH:
+            packet = list(data)
+        else:
+            packet = parsePacketText(data.decode('ascii', 'replace'))
+        self.ready = packet is not None
+        return(packet)
+
+    def close(self):
+        self.sock.close()
+        if self.sock.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def udpTransport(host, port):
+    return(socketTransport(socket.AF_INET, (host, int(port))))
+
+def unixTransport(path):
+    return(socketTransport(socket.AF_UNIX, path))
+
+
+# Makes transport from a string, see top of file.  i2c needs the bus, address, readySignal and busLock
+# keyword arguments (healthCheck is optional), the other transports ignore them
+def openTransport(spec, **i2cArgs):
+    kind, _, rest = spec.partition(':')
+    if kind == "i2c":
+        return(i2cTransport(**i2cArgs))
+    if kind == "serial":
+        port, _, baudRate = rest.partition(':')
+        return(serialTransport(port, int(baudRate or 115200)))
+    if kind == "file":
+        path, _, interval = rest.partition(':')
+        return(fileTransport(path, float(interval or 0)))
+    if kind == "udp":
+        host, _, port = rest.rpartition(':')
+        return(udpTransport(host or "0.0.0.0", port))
+    if kind == "unix":
+        return(unixTransport(rest))
+    raise ValueError("Unknown packet transport: {}".format(spec))
+
+
+# Sends packets to a udp or unix transport, rate is packets per second (0 = as fast as possible)
+# Returns number of packets sent
+def sendPackets(spec, packets, rate=0):
+    kind, _, rest = spec.partition(':')
+    if kind == "udp":
+        host, _, port = rest.rpartition(':')
+        sock, address = socket.socket(socket.AF_INET, socket.SOCK_DGRAM), (host, int(port))
+    elif kind == "unix":
+        sock, address = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM), rest
+    else:
+        raise ValueError("Can only send to udp or unix transports: {}".format(spec))
+
+    numSent = 0
+    startTime = time.monotonic()
+    with sock:
+        for packet in packets:
+            if rate > 0:
+                wait = startTime + numSent / rate - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            sock.sendto(bytes(packet), address)
+            numSent += 1
+    return(numSent)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python3 WU_transport.py udp:host:port|unix:path packetFile [packets per second]")
+        sys.exit(1)
+    with open(sys.argv[2]) as f:
+        packets = [p for p in (parsePacketText(line) for line in f) if p is not None]
+    startTime = time.monotonic()
+    numSent = sendPackets(sys.argv[1], packets, float(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    print("Sent {} packets in {:.2f} seconds".format(numSent, time.monotonic() - startTime))
@@ -2,87 +2,118 @@
 # https://www.wunderground.com/weather/api/d/docs?d=data/conditions
 
 
-import requests        # Allows you to send HTTP/1.1 requests
+from urllib.parse import quote
+import WU_http         # Shared HTTP sessions, keeps connection to W/U open between uploads
 import WU_credentials  # Weather underground password, station IDs and API key
 import weatherData_cls # class to hold weather data for the Davis ISS station
 
 
-# This function uploads the weather data to Weather Underground
+WU_URL = "https://rtupdate.wunderground.com/weatherstation/updateweatherstation.php?"
+
+
+# Returns the weather data part of the upload URL, ie "&winddir=...&tempf=..."
 # weatherData parameter is an instance of the weatherStation class in weather_Data_cls.py
-# stationID is the Weather Underground station ID
 # Note, if you don't send WU temperature and dewpoint, it will assume zero
-def upload2WU(weatherData, stationID):
-    # create strings to hold various parts of upload URL
-    WU_url = "https://rtupdate.wunderground.com/weatherstation/updateweatherstation.php?"
-    WU_creds = 'ID={}&PASSWORD={}'.format(stationID, WU_credentials.WU_PASSWORD)
-    WU_software = "&softwaretype=RPi-Moteino"
-    WU_action = "&action=updateraw&realtime=1"          # &rtfreq=" + str(UploadFreqSeconds)
-
-    # Assemble URL to send to WU
-    full_URL = WU_url + WU_creds + "&dateutc=now" 
+def uploadParams(weatherData):
+    params = ""
     if weatherData.gotWindDirData():
-        full_URL = full_URL + '&winddir={:.0f}'.format(weatherData.windDir)
+        params = params + '&winddir={:.0f}'.format(weatherData.windDir)
     if weatherData.gotWindSpeedData():
-        full_URL = full_URL + '&windspeedmph={:.1f}'.format(weatherData.windSpeed)
+        params = params + '&windspeedmph={:.1f}'.format(weatherData.windSpeed)
     if weatherData.gotWindGustData():
-        full_URL = full_URL + '&windgustmph={:.1f}'.format(weatherData.windGust)
+        params = params + '&windgustmph={:.1f}'.format(weatherData.windGust)
     if weatherData.gotTemperatureData():
-        full_URL = full_URL + '&tempf={:.1f}'.format(weatherData.outsideTemp)
+        params = params + '&tempf={:.1f}'.format(weatherData.outsideTemp)
     if weatherData.gotRainRateData():
-        full_URL = full_URL + '&rainin={:.2f}'.format(weatherData.rainRate)
+        params = params + '&rainin={:.2f}'.format(weatherData.rainRate)
     if weatherData.gotRainTodayData():
-        full_URL = full_URL + '&dailyrainin={:.2f}'.format(weatherData.rainToday)
+        params = params + '&dailyrainin={:.2f}'.format(weatherData.rainToday)
     if weatherData.gotPressureData():
-        full_URL = full_URL + '&baromin={:.2f}'.format(weatherData.pressure)
+        params = params + '&baromin={:.2f}'.format(weatherData.pressure)
     else:
-        full_URL = full_URL + '&baromin=29.00'  # if pressure is ommitted, WU assumes zero, so just enter 29 as a default
+        params = params + '&baromin=29.00'  # if pressure is ommitted, WU assumes zero, so just enter 29 as a default
     if weatherData.gotDewPointData():
-        full_URL = full_URL + '&dewptf={:.1f}'.format(weatherData.dewPoint)
+        params = params + '&dewptf={:.1f}'.format(weatherData.dewPoint)
     if weatherData.gotHumidityData():
-        full_URL = full_URL + '&humidity={:.1f}'.format(weatherData.humidity)
+        params = params + '&humidity={:.1f}'.format(weatherData.humidity)
     if weatherData.gotWindChillData():
-        full_URL = full_URL + '&windchill_f={:.1f}'.format(weatherData.windChill)
+        params = params + '&windchill_f={:.1f}'.format(weatherData.windChill)
+    if weatherData.gotUvIndexData():
+        params = params + '&UV={:.1f}'.format(weatherData.uvIndex)
+    if weatherData.gotSolarData():
+        params = params + '&solarradiation={:.0f}'.format(weatherData.solar)
+    return(params)
+
+
+# Returns full upload URL
+# params is from uploadParams()
+# stationID is the Weather Underground station ID
+# dateutc is "now" or the UTC time the data was recorded, "YYYY-MM-DD HH:MM:SS"
+def uploadURL(params, stationID, dateutc="now"):
+    # create strings to hold various parts of upload URL
+    WU_creds = 'ID={}&PASSWORD={}'.format(stationID, WU_credentials.WU_PASSWORD)
+    WU_software = "&softwaretype=RPi-Moteino"
+    WU_action = "&action=updateraw&realtime=1"          # &rtfreq=" + str(UploadFreqSeconds)
+
+    # Assemble URL to send to WU
+    return(WU_URL + WU_creds + "&dateutc=" + quote(dateutc) + params + WU_software + WU_action)
+
+
+# This function uploads the weather data to Weather Underground
+# weatherData parameter is an instance of the weatherStation class in weather_Data_cls.py
+# stationID is the Weather Underground station ID
+def upload2WU(weatherData, stationID):
+    return(sendToWU(uploadURL(uploadParams(weatherData), stationID)))
+
 
-    # print(full_URL)  # srg debug
-    
-    full_URL = full_URL + WU_software + WU_action
+# Sends upload URL to Weather Underground.  Returns a list
+#  0: True/False if successful
+#  1: error message
+#  2: True if W/U rejected the data (4xx, or a reply other than "success") so sending it again won't help.
+#     False if the error is temporary (no connection, timeout, 5xx) and it should be sent again later.
+#     Password, station ID and account errors are temporary too.  Every record would get them, so the queue
+#     has to keep the records until they're fixed
+def sendToWU(full_URL):
+    import requests # Allows you to send HTTP/1.1 requests.  Imported on first upload, see WU_http.py
 
     try:
-        r = requests.get(full_URL, timeout=10) # send data to WU
+        r = WU_http.get(full_URL) # send data to WU
 
-        # If uploaded successfully, website will reply with 200
-        if r.status_code == 200:
-            return([True, "No Errors"])
+        # If uploaded successfully, website will reply with 200 and "success"
+        if r.status_code == 200 and r.text.strip().lower().startswith("success"):
+            return([True, "No Errors", False])
         else:
-            uploadErrMsg = "HTTP Response:{},  {}".format(r.status_code, r.text)
-            return([False, uploadErrMsg])
+            uploadErrMsg = "HTTP Response:{},  {}".format(r.status_code, r.text.strip())
+            temporary = r.status_code >= 500 or r.status_code in (408, 429) # server trouble, request timeout, too many requests
+            stationError = r.status_code in (401, 403) or "INVALIDPASSWORDID" in r.text.upper() # wrong credentials or station suspended
+            return([False, uploadErrMsg, not (temporary or stationError)])
         
     # Info on requests errors:
     #  http://docs.python-requests.org/en/master/_modules/requests/exceptions/
     except requests.exceptions.ConnectionError:
         uploadErrMsg = "ConnectionError"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
 
     except requests.exceptions.HTTPError:
         uploadErrMsg = "HTTPError"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
 
     except requests.exceptions.ConnectTimeout:
         uploadErrMsg = "ConnectTimeout"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
 
     except requests.exceptions.ReadTimeout:
         uploadErrMsg = "ReadTimeout"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
 
     except requests.exceptions.RetryError:
         uploadErrMsg = "RetryError"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
 
     except requests.exceptions.Timeout:
         uploadErrMsg = "Timeout"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
 
     except Exception:
         uploadErrMsg = "Other"
-        return([False, uploadErrMsg])
+        return([False, uploadErrMsg, False])
@@ -0,0 +1,119 @@
+# Store-and-forward queue for Weather Underground uploads
+# Every upload-ready weather data snapshot is saved to an SQLite database (WAL mode) before it's sent.
+# drain() sends the oldest records first with their real dateutc, and only removes a record after W/U
+# accepts it.  If the internet is down for a few hours, the records wait on disk (and survive a reboot),
+# then get sent when the connection comes back, so W/U ends up with the whole history instead of a gap.
+# A record W/U rejects (4xx, or a reply other than "success") would be rejected again every time, so it's
+# moved to the rejected table, with the reason, and drain() carries on with the next one.
+#
+# The database is used from the asyncio loop (append) and from worker threads (drain), so the
+# connection is shared with a lock.
+
+import sqlite3
+import threading
+import time
+
+import WU_upload # builds upload URL and sends it
+import WU_metrics # upload round trip time
+
+MAX_RECORD_AGE = 7 * 24 * 3600  # seconds, older records are dropped instead of being sent
+BATCH_SIZE     = 20             # max records sent by one drain() call
+BACKOFF_MIN    = 10             # seconds to wait after first failed send
+BACKOFF_MAX    = 10 * 60        # max seconds between retries when W/U or internet is down
+
+UPLOAD_SECONDS   = WU_metrics.REGISTRY.histogram("weather_upload_seconds", "Round trip time of one W/U upload")
+UPLOADS_REJECTED = WU_metrics.REGISTRY.counter("weather_uploads_rejected_total", "Records W/U rejected, moved to the rejected table")
+
+
+class uploadQueue:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None) # autocommit
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL is durable across program crashes, and easier on the SD card
+        self.db.execute("CREATE TABLE IF NOT EXISTS uploads (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "timestamp REAL NOT NULL, params TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS rejected (id INTEGER PRIMARY KEY, timestamp REAL NOT NULL, "
+                        "params TEXT NOT NULL, reason TEXT, rejectedAt REAL NOT NULL)")
+
+    # Add weather data to queue.  params is from WU_upload.uploadParams(), timestamp is time.time() when data was recorded
+    def append(self, params, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            self.db.execute("INSERT INTO uploads (timestamp, params) VALUES (?, ?)", (timestamp, params))
+
+    # Returns list of (id, timestamp, params) for the oldest records
+    def peek(self, count):
+        with self.lock:
+            return(self.db.execute("SELECT id, timestamp, params FROM uploads ORDER BY id LIMIT ?", (count,)).fetchall())
+
+    def remove(self, recordID):
+        with self.lock:
+            self.db.execute("DELETE FROM uploads WHERE id = ?", (recordID,))
+
+    # Moves record to the rejected table so it isn't sent again
+    def reject(self, recordID, reason):
+        with self.lock:
+            with self.db:  # one transaction, so record is never in both tables or neither
+                self.db.execute("BEGIN")
+                self.db.execute("INSERT INTO rejected (id, timestamp, params, reason, rejectedAt) "
+                                "SELECT id, timestamp, params, ?, ? FROM uploads WHERE id = ?", (reason, time.time(), recordID))
+                self.db.execute("DELETE FROM uploads WHERE id = ?", (recordID,))
+
+    # Returns list of (id, timestamp, params, reason) for records W/U rejected, oldest first
+    def rejected(self):
+        with self.lock:
+            return(self.db.execute("SELECT id, timestamp, params, reason FROM rejected ORDER BY id").fetchall())
+
+    # Number of records waiting to be sent
+    def depth(self):
+        with self.lock:
+            return(self.db.execute("SELECT COUNT(*) FROM uploads").fetchone()[0])
+
+    # Deletes records older than maxAge seconds, and rejected records kept longer than that.  Returns number of waiting records deleted
+    def purge(self, maxAge=MAX_RECORD_AGE):
+        with self.lock:
+            self.db.execute("DELETE FROM rejected WHERE rejectedAt < ?", (time.time() - maxAge,))
+            return(self.db.execute("DELETE FROM uploads WHERE timestamp < ?", (time.time() - maxAge,)).rowcount)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+# Returns dateutc string W/U wants, "YYYY-MM-DD HH:MM:SS" in UTC
+def dateUTC(timestamp):
+    return(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp)))
+
+
+# Sends up to batchSize of the oldest records, oldest first.  Stops at the first temporary failure so records
+# stay in order.  A record W/U rejects is moved to the rejected table and the next one is sent
+# Returns a list
+#  0: number of records sent
+#  1: error message from the failed send, "No Errors" if none failed (rejected records don't count as failures)
+def drain(queue, stationID, batchSize=BATCH_SIZE):
+    queue.purge()
+    numSent = 0
+    for recordID, timestamp, params in queue.peek(batchSize):
+        with UPLOAD_SECONDS.time():
+            uploadStatus = WU_upload.sendToWU(WU_upload.uploadURL(params, stationID, dateUTC(timestamp)))
+        if uploadStatus[0] == False:
+            if uploadStatus[2] == False:
+                return([numSent, uploadStatus[1]])
+            print("W/U rejected upload from {}, moved to rejected table: {}".format(dateUTC(timestamp), uploadStatus[1]))
+            queue.reject(recordID, uploadStatus[1])
+            UPLOADS_REJECTED.inc()
+            continue
+        queue.remove(recordID)
+        numSent += 1
+    return([numSent, "No Errors"])
+
+
+# Seconds to wait before next drain() after failedAttempts failures in a row
+def backoff(failedAttempts):
+    if failedAttempts <= 0:
+        return(0)
+    return(min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (failedAttempts - 1)))
@@ -67,45 +67,99 @@
 # 10/08/22 v1.38 - Fixed bug where sometimes rain rate would be 36, this happened when rain seconds was 1. Don't know why it would ever be this, but sometimes it was.
 #                  now rain seconds has to be > 10 for a valid calculation
 # 03/01/23 v1.39 - Added code to get and print public IP address on startup.
-
-version = "v1.39"
+# 10/18/26 v1.40 - decodeRawData() uses table driven CRC, crc16_ccitt_table(), in WU_decodeWirelessData.py
+# 10/18/26 v1.41 - decodeRawData() unpacks packet once with WU_decodeWirelessData.parsePacket()
+# 10/18/26 v1.42 - Replaced if() chain in decodeRawData() with packet type handlers in WU_packetHandlers.py.
+#                  UV Index and Solar Radiation are now saved and uploaded.  Rain counter globals moved into rainCountHandler
+# 10/18/26 v1.43 - In weatherData_cls.py avgWindDir() uses ring buffer with running sums, windDirAverager.  Window can be
+#                  number of packets or number of seconds
+# 10/18/26 v1.44 - Wind direction degrees, cos and sin come from lookup tables in WU_decodeWirelessData.py
+# 10/18/26 v1.45 - weatherStation class uses __slots__ and stores the time each field was updated.  got...Data() now
+#                  returns False if data is older than MAX_DATA_AGE, so a dead sensor stops being uploaded
+# 10/18/26 v1.46 - Main loop sleeps until rising edge on MOTEINO_READY_PIN or next timer instead of polling pin non-stop.
+#                  CPU was at 100%
+# 10/18/26 v1.47 - Replaced tmr_... timer globals with scheduler_cls.py, a min-heap of jobs using time.monotonic().
+#                  Main loop sleeps until the next job is due.  Upload is a job that retries in 10 seconds if it fails
+# 10/18/26 v1.48 - Main loop is now asyncio.  I2C reads run in moteinoReader() thread.  Decoding, uploads, pressure
+#                  and SMS are separate tasks that pass data through queues, so a slow W/U response doesn't make us lose packets
+# 10/18/26 v1.49 - Added WU_http.py. Uploads and downloads reuse a keep-alive session per host instead of a new connection each time
+# 10/18/26 v1.50 - Uploads are saved in WU_uploadQueue.py SQLite database and sent with their real dateutc.  After an internet
+#                  outage the saved data is sent oldest first, so W/U doesn't have a gap
+# 10/18/26 v1.51 - WU_download.getPressure() asks all nearby stations at once and uses first fresh reading, result is cached
+# 10/18/26 v1.52 - Pressure comes from BME280 every minute, converted to sea level. Nearby stations are only used if BME280
+#                  isn't working or disagrees, see pressure_cls.py.  Fixed getAtmosphericPressure() saving hPa as inHg
+# 10/18/26 v1.53 - BME280 object is made once in bme280_cls.py with 16x oversampling, sampled every 10 seconds and averaged.
+#                  It shares i2cLock with the Moteino reader so they don't use the I2C bus at the same time
+# 10/18/26 v1.54 - State is saved to station_state.json every 5 seconds (checkpoint_cls.py).  If program restarts the same day,
+#                  daily rain, rain counter, wind direction buffer and stats are restored instead of downloading rain from W/U
+# 10/18/26 v1.55 - Startup no longer waits on the network.  Public IP + SMS, daily rain and pressure run at the same time in startup()
+#                  while packets are already being read.  Moteino is only reset if no packet arrives in the first 60 seconds
+# 10/18/26 v1.56 - Packet decoding moved to WU_stationCore.py, which doesn't need any hardware.  Startup code is in main().
+#                  twilio, requests, RPi.GPIO, smbus and adafruit_bme280 are imported when first used instead of at load time
+# 10/18/26 v1.57 - Packets come through WU_transport.py.  PACKET_SOURCE can be the Moteino on I2C (default), a serial port,
+#                  a recorded file, or a UDP/Unix socket for load testing
+# 10/18/26 v1.58 - Every packet read is saved in packet_log/packets_YYYYMMDD.bin, 16 bytes per packet.  See WU_packetLog.py
+# 10/18/26 v1.59 - Replaced perfStats list with counters, gauges and latency histograms in WU_metrics.py, served for
+#                  Prometheus on http://<RPi>:9216/metrics.  Hourly stats are worked out from the counters
+# 10/18/26 v1.60 - Added WU_profiler.py.  Work is split into stages (ready pin, heartbeat, I2C read, decode, day rollover,
+#                  pressure, upload, housekeeping) that are timed on a sample of calls.  "kill -USR1 <pid>" prints the summary
+# 10/18/26 v1.61 - Moteino reset doesn't freeze the program for 12 seconds anymore.  moteinoReset_cls.py steps through the reset
+#                  from a scheduler job, ignores extra requests while one is running, and backs off if resets don't help
+
+version = "v1.61"
 
 import time
-import smbus  # Used by I2C
+import asyncio # runs uploads, pressure downloads and SMS without holding up Moteino reads
+import threading # Moteino reader thread
 import os.path # used to see if a file exist
 import math # Used by humidity calculation
-import adafruit_bme280  # https://github.com/adafruit/Adafruit_BME280_Library, to install: "sudo pip3 install adafruit-circuitpython-bme280"
-import RPi.GPIO as GPIO # reads/writes GPIO pins
+import traceback # prints unexpected errors in the reader thread
 import WU_credentials # Weather underground password, API key and station IDs
 import WU_download  # downloads daily rain on startup, and pressure from other weather staitons
 import WU_upload  # uploads data to Weather Underground
+import WU_http  # HTTP sessions shared by WU_upload and WU_download
+import WU_uploadQueue  # saves uploads to disk until W/U accepts them
 import WU_decodeWirelessData # Decodes wireless data coming from Davis ISS weather station
+import WU_packetHandlers # Handler for each packet type, updates suntec with the decoded data
+import WU_stationCore # decodes packets into suntec, no hardware needed
+import WU_transport # where packets come from: Moteino over I2C, serial, file or socket
+import WU_packetLog # binary log of raw packets
 import weatherData_cls # class to hold weather data for the Davis ISS station
+import pressure_cls # picks pressure from BME280 or nearby stations
+import bme280_cls # BME280 sensor, sampled in the background
+import moteinoReady_cls # wakes main loop when Moteino ready pin goes high
+import moteinoReset_cls # resets Moteino without blocking
+import scheduler_cls # timers for main loop
+import checkpoint_cls # saves state to disk for warm restarts
+import WU_metrics # counters and latency histograms, served on METRICS_PORT
+from WU_profiler import PROFILER # times stages of the work, prints summary on SIGUSR1
 from subprocess import check_output # used to print RPi IP address
-from twilio.rest import Client  # https://pypi.org/project/twilio
-from twilio.base.exceptions import TwilioRestException
-import requests # used to get public IP address   Ref: https://stackoverflow.com/questions/61347442/how-can-i-find-my-ip-address-with-python-not-local-ip
+# RPi.GPIO and smbus are imported in main(), twilio and requests the first time they're used.  That way startup
+# doesn't wait for them, and tools can import this file on a computer that isn't a RPi
 
 
 
 I2C_ADDRESS = 0x04 # I2C address of Moteino
+PACKET_SOURCE = "i2c" # where packets come from, see WU_transport.openTransport().  ie "udp:0.0.0.0:5005" for load testing
 ISS_STATION_ID = 1
 WU_STATION = WU_credentials.WU_STATION_ID_SUNTEC # Main weather station
+BME280_SAMPLE_FREQ = 10 # seconds between BME280 samples
+STATION_ELEVATION = 580 # meters above sea level of BME280 sensor, used to convert to sea level pressure.  Change if station moves
+UPLOAD_QUEUE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_queue.db") # Uploads waiting to be sent
+PACKET_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "packet_log") # raw packets, one file per day
+CHECKPOINT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "station_state.json") # state saved for warm restart
+CHECKPOINT_FREQ = 5 # seconds between checkpoints
+WIND_RESTORE_MAX_AGE = 2 * 60 # seconds, wind direction buffer in an older checkpoint isn't restored
+STARTUP_DEADLINE = 20    # seconds to wait for startup steps before uploading anyway
+STARTUP_PACKET_WAIT = 60 # seconds to wait for first packet before resetting Moteino
+METRICS_PORT = 9216 # port for Prometheus metrics, http://<RPi>:9216/metrics.  None turns it off
+METRICS_HOST = "127.0.0.1" # only this RPi can read the metrics.  "" lets anything on the network read them, there's no login
+PROFILE_SAMPLE_RATE = 0.1 # fraction of calls WU_profiler.py times in each stage.  0 turns it off
 # WU_STATION = WU_credentials.WU_STATION_ID_TEST # Test weather station
 
 # Instantiate suntec object from weatherStation class (weatherData_cls.py)
 suntec = weatherData_cls.weatherStation(ISS_STATION_ID)
 
-# Header byte 0, 4 MSB describe data in bytes 3-4
-ISS_CAP_VOLTS    = 0x2
-ISS_UV_INDEX     = 0x4
-ISS_RAIN_SECONDS = 0x5
-ISS_SOLAR_RAD    = 0x6
-ISS_OUT_TEMP     = 0x8
-ISS_WIND_GUST    = 0x9
-ISS_HUMIDITY     = 0xA
-ISS_RAIN_COUNT   = 0xE
-
 # GPIO pins, these are board # pins, not BCM pin
 MOTEINO_HEARTBEAT_PIN     = 18  # Input pin connected to Moteino heartbeat output. (BCM 24)
 MOTEINO_READY_PIN         = 33  # Input pin connected to Moteino output pin that signals Moteino is ready to send data to RPi.  (BDM 13)
@@ -113,168 +167,13 @@ MOTEINO_RESET_PIN         = 36  # Output pin connected to Moteino Reset pin (BCM
 
 
 #---------------------------------------------------------------------
-# Validate weather data from wireless packet
+# Validate weather data from wireless packet and save it in suntec, see WU_stationCore.py
 # Returns a list
 #  0: True/False if successfule
 #  1: error message
 #---------------------------------------------------------------------
 def decodeRawData(packet):
-    # check CRC
-    if (WU_decodeWirelessData.crc16_ccitt(packet) == False):
-        errmsg = "Invalid CRC {0[6]}, {0[7]}".format(packet) 
-        return[False, errmsg] # CRC Failed, stop processing packet
-
-    # Check station ID, don't want to get data from another nearby station
-    packetStationID = WU_decodeWirelessData.stationID(packet)
-    if (packetStationID != suntec.stationID):
-        errmsg = 'Wrong station ID.  Expected {} but got{}'.format(suntec.stationID, packetStationID) 
-        return[False, errmsg] # wrong station ID, stop processing packet
-    
-    # CRC passed and staion ID okay, extract weather data from packet
-
-    # Wind speed is in every packet
-    newWindSpeed = WU_decodeWirelessData.windSpeed(packet)
-    if (newWindSpeed >= 0):
-        suntec.windSpeed = newWindSpeed
-    else:
-        errmsg = 'Error exrtacting wind speed from packet. Got {} from {}'.format(newWindSpeed, packet) 
-        suntec.windSpeed  = 0
-        return[False, errmsg] # error extracing wind speed, stop processing packet
-    
-    # Wind direction is in every packet
-    newWindDir = WU_decodeWirelessData.windDirection(packet)
-    if (newWindDir >= 0):
-        suntec.windDir = newWindDir
-        suntec.avgWindDir(newWindDir)
-    else:
-        errmsg = 'Error exrtacting wind direction from packet. Got {} from {}'.format(newWindDir, packet) 
-        return[False, errmsg] # Error extracing wind direction, stop processing packet
-     
-    dataSent = packet[0] >> 4 # From header byte 0, determine what data has been sent, then decode appropriate data below
-
-    # Returns rain bucket tip counter.  1 count = 0.01".  Counter rolls over at 127
-    if (dataSent == ISS_RAIN_COUNT):
-        global g_rainCounterOld  # convert from local to global variable
-        global g_rainCntDataPts  # convert from local to global variable
-        
-        rainCounterNew = WU_decodeWirelessData.rainCounter(packet)
-        if (rainCounterNew < 0 or rainCounterNew > 127):
-            errmsg = 'Invalid rain counter value:{} from {}'.format(rainCounterNew, packet) 
-            return[False, errmsg] # Invalid rain counter value
-        
-        # Don't calculate rain counts until program has received 2nd data point.  First data point will be the
-        # starting value, then 2nd data point will be the accumulation, if any.  For example, if first time
-        # data arrives its 50, we don't want to take 50-0 = 50 (ie 0.5") and add that to the daily rain accumulation.
-        # Wait until the next data point comes in, which will probably be 50 (in this example), so 50-50 = 0.  No rain accumulated.
-        # If it's raining at the time of reboot, you might get 51, so 51 - 50 = 1 or 0.01" added.
-        if (g_rainCntDataPts == 1):
-            g_rainCounterOld = rainCounterNew
-            
-        if ( (g_rainCntDataPts >= 2) and (g_rainCounterOld != rainCounterNew) ):
-
-            # See how many bucket tips counter went up.  Should be only one unless it's 
-            # raining really hard or there is a long transmission delay from ISS
-            if (rainCounterNew < g_rainCounterOld):
-                newRain = (128 - g_rainCounterOld) + rainCounterNew # Rain counter has rolled over (counts from 0 - 127)
-            else:
-                newRain = rainCounterNew - g_rainCounterOld
-            
-            suntec.rainToday += newRain/100.0;  # Increment daily rain counter
-            g_rainCounterOld = rainCounterNew
-                
-        g_rainCntDataPts += 1 # Increment number times RPi received rain count data
-
-        return[True, "rain count"]
-        
-    # Returns rain rate in inches per hour
-    if (dataSent == ISS_RAIN_SECONDS):
-        rainSeconds = WU_decodeWirelessData.rainRate(packet) # seconds between bucket tips, 0.01" per tip
-        fifteenMin = 60 * 15 # seconds in 15 minutes
-        if (rainSeconds > 10): # If no error 
-            if (rainSeconds < fifteenMin):
-                suntec.rainRate = (0.01 * 3600.0) / rainSeconds
-            else:
-                suntec.rainRate = 0.0 # More then 15 minutes since last bucket tip, can't calculate rain rate until next bucket tip
-            return[True, "rain rate"]
-        errmsg = 'Invalid rain seconds. Got {} from {}'.format(rainSeconds, packet) 
-        return[False, errmsg]
-    
-    # Returns temperature F
-    if (dataSent == ISS_OUT_TEMP):
-        newTemp = WU_decodeWirelessData.temperature(packet)
-        if (newTemp > -100): #If no error
-            suntec.outsideTemp = newTemp
-            suntec.calcWindChill() # calculate windchill
-            # If we have R/H too, then calculate dew point
-            if (suntec.gotHumidityData() == True):
-                newDewPoint = suntec.calcDewPoint() # Calculate dew point
-                if (newDewPoint <= -100): 
-                    errmsg = 'Invalid dewpoint: {} from temp={} and humidity={}'.format(newDewPoint, suntec.outsideTemp, suntec.humidity) 
-            return[True, "Temperature"]
-        else:
-            errmsg = 'Invalid temperature. Got {} from {}'.format(newTemp, packet) 
-            return[False, errmsg]
-    
-    # Returns wind gusts in MPH
-    if (dataSent == ISS_WIND_GUST):
-        newWindGust = WU_decodeWirelessData.windGusts(packet)
-        if newWindGust >= 0:
-            suntec.windGust = newWindGust
-            return[True, "Wind Gust"]
-        errmsg = 'Invalid wind gust. Got {} from {}'.format(newWindGuest, packet) 
-        return[False, errmsg]
-    
-    # Returns relative humidity
-    if (dataSent == ISS_HUMIDITY):
-        newHumidity = WU_decodeWirelessData.humidity(packet)
-        if (newHumidity > 0):
-            suntec.humidity = newHumidity
-            # If we have outside temperature too, then calculate dew point
-            if (suntec.gotTemperatureData() == True):
-                newDewPoint = suntec.calcDewPoint() # Calculate dew point
-                if (newDewPoint <= -100):
-                    errmsg = 'Invalid dewpoint: {} from temp={} and humidity={}'.format(newDewPoint, suntec.outsideTemp, suntec.humidity) 
-                    print(errmsg)
-
-            return[True, "Humidity"]
-        errmsg = 'Invalid humidity. Got {} from {}'.format(newHumidity, packet) 
-        return[False, errmsg]
-
-    # Returns capicator voltage
-    if (dataSent == ISS_CAP_VOLTS):
-        newCapVolts = WU_decodeWirelessData.capVoltage(packet)
-        if (newCapVolts >= 0):
-            suntec.capacitorVolts = newCapVolts
-            return[True, "Cap volts"]
-        else:
-            errmsg = 'Invalid cap volts.  Got {} from {}'.format(newCapVolts, packet) 
-            suntec.capacitorVolts = -1
-            return[False, errmsg]
-
-    # Returns relative UV Index
-    if (dataSent == ISS_UV_INDEX):
-        return[True, "UV Index"]
-
-    # Returns relative Solar Radiation
-    if (dataSent == ISS_SOLAR_RAD):
-        return[True, "Solar Radiation"]
-
-    # If it makes it here, there's an if() missing for datatype. 
-    return[False, "{}  {}".format("Missing if() statement for byte header:", dataSent)]    
-
-
-#---------------------------------------------------------------------
-# Get Pressure from BME280 sensor
-#---------------------------------------------------------------------
-def getAtmosphericPressure():
-# Create BME280 object
-    
-# Adafruit Github code
-#  https://github.com/adafruit/Adafruit_IO_Python/blob/master/examples/basics/environmental_monitor.py
-    bme280 = adafruit_bme280.Adafruit_BME280_I2C(i2c_bus)
-    bme280.sea_level_pressure = 1013.25
-# Read BME280 pressure
-    suntec.pressure = bme280.pressure
+    return WU_stationCore.decodeRawData(suntec, packet)
 
 
 #---------------------------------------------------------------------
@@ -283,10 +182,7 @@ def getAtmosphericPressure():
 def printWeatherDataTable(printRawData=None):
 
     global g_TableHeaderCntr1
-    dataType = ["0x0", "0x1", "Super Cap", "0x3", "UV Index", "Rain Seconds", "Solar Radiation", "Solar Cell Volts", \
-                "Temperature", "Gusts", "Humidity", "0xB", "0xC", "0xD", "Rain Counter", "0xF"]
-    
-    windDirNow = (g_rawDataNew[2] * 1.40625) + 0.3
+    windDirNow = WU_decodeWirelessData.WIND_DIR_DEGREES[g_rawDataNew[2]]
     
     strHeader =  'temp\tR/H\tpres\twind\tgust\t dir\tavg\trrate\ttoday\t dew\ttime stamp'
     strSummary = '{0.outsideTemp}\t{0.humidity}\t{0.pressure}\t {0.windSpeed}\t {0.windGust}\t {1:03.0f}\t{0.windDir:03.0f}\t{0.rainRate:.2f}\t{0.rainToday:.2f}\t {0.dewPoint:.2f}\t' \
@@ -294,7 +190,7 @@ def printWeatherDataTable(printRawData=None):
 
     if (printRawData == True):
         strHeader = strHeader + '\t\t raw wireless data'
-        strSummary = strSummary + "   " + ''.join(['%02x ' %b for b in g_rawDataNew]) + "("  + dataType[g_rawDataNew[0] >> 4] + ")"
+        strSummary = strSummary + "   " + ''.join(['%02x ' %b for b in g_rawDataNew]) + "("  + WU_packetHandlers.PACKET_HANDLERS[g_rawDataNew[0] >> 4].name + ")"
     
     if (g_TableHeaderCntr1 == 0):
         print(strHeader)
@@ -364,28 +260,26 @@ def logFile(newFile, logType, logData):
 ##  - moteino heartbeat
 ##  - got dewpoint
 ##  - last W/U upload (min)
-##  - Perf Status
+##  - Counts since the hour started
 ##    - WU Uploads
 ##    - HTTP Failes
-##    - Upload timestamp
 ##    - I2C Success
 ##    - I2C Fail
-##    - ISS Fail
 ##    - ISS Success
+##    - ISS Fail
 #---------------------------------------------------------------------
-detailStatTimer = time.time() + 60  # global variable to print logFileDetail every minute if no w/u uploads
 def logFileDetail():
 
-    moteinoTimer = round(time.time() - g_tmr_Moteino, 2)
-    lastUploadMin = round((time.time() - perfStats[STAT_UPLOAD_TIMESTAMP])/20,2)  # minutes since last W/U upload
-    minSinceLastNewISSData = (time.time() - perfStats[STAT_NEW_ISS_TIMESTAMP])/60
+    moteinoTimer = round(time.monotonic() - g_lastMoteinoRead, 2)
+    lastUploadMin = round((time.monotonic() - g_lastUploadTime)/20,2)  # minutes since last W/U upload
+    minSinceLastNewISSData = (time.monotonic() - g_lastNewISSTime)/60
 ##    detailLogData = [g_moteinoReady,
 ##                     moteinoTimer,
 ##                     isHeartbeatOK(),
 ##                     suntec.gotDewPointData(),
 ##                     lastUploadMin,
 ##                     minSinceLastNewISSData,
-##                     perfStats]
+##                     metrics.counterValues()]
 ##    print("{}  {}".format(detailLogData, time.strftime("%m/%d/%Y %I:%M:%S %p")))
 
     detailLogOutput = "{}\t{}\t{}\t{}\t{}\t{:0.1f}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}".format(
@@ -395,12 +289,12 @@ def logFileDetail():
                                    suntec.gotDewPointData(),
                                    lastUploadMin,
                                    minSinceLastNewISSData,
-                                   perfStats[STAT_UPLOADS],
-                                   perfStats[STAT_HTTP_FAIL],
-                                   perfStats[STAT_I2C_SUCCESS],
-                                   perfStats[STAT_I2C_FAIL],
-                                   perfStats[STAT_ISS_SUCCESS],
-                                   perfStats[STAT_ISS_FAIL],
+                                   sinceHour(UPLOADS),
+                                   sinceHour(UPLOAD_FAILS),
+                                   sinceHour(PACKET_READS),
+                                   sinceHour(PACKET_READ_FAILS),
+                                   sinceHour(PACKETS_DECODED),
+                                   sinceHour(DECODE_FAILS),
                                    time.strftime("%m/%d/%Y %I:%M:%S %p"),
                                    g_rawDataNew
                                 )
@@ -428,6 +322,8 @@ def printWirelessData():
 def sendSMS(sms_msg):
 
     print("About to send SMS message: {}".format(sms_msg))
+    from twilio.rest import Client  # https://pypi.org/project/twilio  Slow to import, so it's done on first SMS
+    from twilio.base.exceptions import TwilioRestException
 
     try:
         smsclient = Client(WU_credentials.TWILIO_ACCOUNT_SID, WU_credentials.TWILIO_AUTH_TOKEN)
@@ -447,6 +343,7 @@ def isHeartbeatOK():
     global g_heartbeatNew
     global g_heartbeatOld
     global g_lastHeartbeatTime
+    global g_heartbeatResetTime
     global MOTEINO_HEARTBEAT_PIN
     heartbeat_timeout = 5 * 60 # set timeout to 5 minutes
     
@@ -456,169 +353,260 @@ def isHeartbeatOK():
     if (g_heartbeatNew != g_heartbeatOld):
         # Heartbeat has changed state
         g_heartbeatOld = g_heartbeatNew
-        g_lastHeartbeatTime = time.time()
+        g_lastHeartbeatTime = time.monotonic()
+        g_heartbeatResetTime = None
         return(True)
     else:
         # See how long it's been since the last heartbeat
-        heartbeatAge = time.time() - g_lastHeartbeatTime
+        heartbeatAge = time.monotonic() - g_lastHeartbeatTime
         if heartbeatAge > heartbeat_timeout:
-            errMsg = "No Moteino heartbeat, will reset Moteino"
-            print("{}  {}".format(errMsg,time.strftime("%m/%d/%Y %I:%M:%S %p")))
-            resetMoteino() # Moteino has locked up, need to reset it
+            # Moteino has locked up, need to reset it.  Ask once per timeout, not on every read
+            if g_heartbeatResetTime is None or time.monotonic() - g_heartbeatResetTime > heartbeat_timeout:
+                g_heartbeatResetTime = time.monotonic()
+                g_loop.call_soon_threadsafe(requestMoteinoReset, "No Moteino heartbeat")
             return(False)
         else:
             # Heartbeat hasn't timed out yet
             return(True)
 
+# Moteino can be read if it isn't being reset and its heartbeat is OK
+def isMoteinoOK():
+    return(not g_moteinoReset.isResetting() and isHeartbeatOK())
+
 #---------------------------------------------------------------------
 # Reset Moteino, used when no heartbeat is detected or hasn't received any new data
+# Reset is done by grounding its reset pin momentarily.  g_moteinoReset (moteinoReset_cls.py) steps through
+# it from moteinoResetJob so nothing else has to wait.  Runs on the asyncio loop, the reader thread uses
+# call_soon_threadsafe().  Ignored if a reset is already running or one ran too recently
 #---------------------------------------------------------------------
-def resetMoteino():
+def requestMoteinoReset(reason):
+    if g_moteinoReset.request(reason):
+        print("{}, resetting Moteino  {}".format(reason, time.strftime("%m/%d/%Y %I:%M:%S %p")))
+        MOTEINO_RESETS.inc()
+        rescheduleJob(moteinoResetJob, 0)
 
-    global MOTEINO_RESET_PIN
+def stepMoteinoReset():
+    wait = g_moteinoReset.step()
+    if wait is not None:
+        rescheduleJob(moteinoResetJob, wait)
 
-    # Reset Moteino by by grounding it's reset pin momentarily
-    GPIO.output(MOTEINO_RESET_PIN, 0) # Ground the pin to reset Moteino
-    time.sleep(2)
-    GPIO.output(MOTEINO_RESET_PIN, 1) # Return pin to high state
-    time.sleep(10) # give moteino time to reboot
-    return(True)
+# Resets aren't fixing the Moteino
+def moteinoNotRecovering(failures, reason):
+    runInBackground(sendSMS, "Moteino not recovering after {} resets: {}".format(failures, reason))
 
 
 #---------------------------------------------------------------------
-# Start up 
+# Warm restart, see checkpoint_cls.py
+# Timestamps are saved as ages since the monotonic clock starts over when the RPi reboots
 #---------------------------------------------------------------------
-IP = check_output(['hostname', '-I'])
-IP = IP.rstrip()  # strips off eol characters
-IP = IP.decode('utf-8') # removes b' previx
-print("RPi IP Address: {}".format(IP)) 
-print("Ver: {}    {}".format(version, time.strftime("%m/%d/%Y %I:%M:%S %p")))
-public_IP = requests.get("http://wtfismyip.com/text").text
-print("Suntec public IP: {}".format(public_IP)) 
-
-sendSMS("Weather Station Restarted. \nPublic IP: " + public_IP)
-g_SMS_Sent_Today = False
-
-# Create log files for data and errors, First Param = True means to create a new file, vs append to a file
-logFile(True, "Data",   "")
-logFile(True, "Errors", "")
-
-
-# Set to zero, weatherStation class initially sets these to -100 for No Data yet
-suntec.windGust =  0.0
-suntec.rainToday = 0.0
-
-# Get daily rain data from weather station
-newRainToday = WU_download.getDailyRain()  # getDailyRain returns a list [0] = success/failure, [1] error message
-if newRainToday[0] >= 0:
-    print('Suntec station daily rain={}'.format(newRainToday[0]))
-    suntec.rainToday = newRainToday[0]
-else:
-    errMsg = "getDailyRain() error:"
-    print("{} {}    {}".format(errMsg, newRainToday[1], time.strftime("%m/%d/%Y %I:%M:%S %p")))
-    
-
-i2c_bus = smbus.SMBus(1)  # for I2C
-
-# Get pressure from other nearby weather stations
-newPressure = WU_download.getPressure()
-if newPressure > 25:
-   suntec.pressure = newPressure
-else:
-   errMsg = "Error getting pressure data on startup"
-   print("{}  {}".format(errMsg,time.strftime("%m/%d/%Y %I:%M:%S %p")))
+# Returns state to save in checkpoint.  Runs on the asyncio loop so nothing changes while it's copied
+def stationState():
+    now = time.monotonic()
+    return({'station':        suntec.getState(),
+            'rainCounter':    WU_packetHandlers.PACKET_HANDLERS[WU_decodeWirelessData.ISS_RAIN_COUNT].getState(),
+            'counters':       metrics.counterValues(),
+            'hourStart':      g_hourStartCounts,
+            'lastUploadAge':  now - g_lastUploadTime,
+            'lastNewISSAge':  now - g_lastNewISSTime,
+            'i2cDailyErrors': g_i2cDailyErrors})
+
+# Restores weather data and rain counter baseline.  elapsed is seconds since checkpoint was saved
+def restoreStation(state, elapsed):
+    suntec.setState(state['station'], elapsed, restoreWind=(elapsed <= WIND_RESTORE_MAX_AGE))
+    WU_packetHandlers.PACKET_HANDLERS[WU_decodeWirelessData.ISS_RAIN_COUNT].setState(state['rainCounter'])
+
+# Restores counters, last upload and packet times, and daily I2C error count
+def restoreStats(state, elapsed):
+    global g_i2cDailyErrors, g_hourStartCounts, g_lastUploadTime, g_lastNewISSTime
+    now = time.monotonic()
+    counters = metrics.counterValues()
+    for name, value in state['counters'].items():
+        if name in counters:  # skip a counter that's been removed since checkpoint was saved
+            metrics.get(name).inc(value)
+    g_hourStartCounts = state['hourStart']
+    g_lastUploadTime = now - (state['lastUploadAge'] + elapsed)
+    g_lastNewISSTime = now - (state['lastNewISSAge'] + elapsed)
+    g_i2cDailyErrors = state['i2cDailyErrors']
+
+
+GPIO = None # RPi.GPIO module, main() imports it.  noGPIO if PACKET_SOURCE isn't i2c
 
-
-
-# Setup GPIO using Board numbering (vs BCM numbering)
-GPIO.setmode(GPIO.BOARD)
-
-# Setup pin as input with pull-down resistor
-GPIO.setwarnings(False) 
-GPIO.setup(MOTEINO_HEARTBEAT_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-GPIO.setup(MOTEINO_READY_PIN,     GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-GPIO.setup(MOTEINO_RESET_PIN,     GPIO.OUT)
-GPIO.output(MOTEINO_RESET_PIN, 1) # set pin high. Moteino resets when it's pin is grounded
-
-resetMoteino()
-
-g_heartbeatNew = GPIO.input(MOTEINO_HEARTBEAT_PIN)
-g_heartbeatOld = g_heartbeatNew
-g_lastHeartbeatTime = time.time() 
 g_moteinoReady = False # Monitors GPIO pin to see when Moteino is ready to send data to RPi
-g_NewISSDataTimeStamp = time.time() + (60 * 10) # Timestamp when last NEW ISS data came in. Default to 10 min from startup 
 g_SMS_Sent_Today = False  # flag so SMS is only sent once a day
 g_SMS_Offline_Msg_Sent = False # flag so SMS is offline message is only sent once
-g_rainCounterOld = 0   # Previous value of rain counter, used in def decodeRawData()
-g_rainCntDataPts = 0   # Counts the times RPi has received rain counter data, this is not the actual rain counter, thats g_rainCounterOld and rainCounterNew
 g_rawDataNew = [0.0] * 8 # Initialize rawData list. This is weather data that's sent from Moteino
 g_TableHeaderCntr1 = 0 # Used to print header for weather data summary every so often
 g_i2cDailyErrors = 0 # Daily counter for I2C errors
 g_uploadFreqWU = 60 # Seconds between uploads to Weather Underground
+g_uploadRetryWU = 10 # Seconds before checking again if there's no data to upload
 g_oldDayOfMonth = int(time.strftime("%d"))   # Initialize day of month variable, used to detect when new day starts
-g_tmr_Moteino = time.time()  # Used to request data from moteino every second
-tmr_upload = time.time()     # Initialize timer to trigger when to upload to Weather Underground
-hourTimer = time.time() + 3600
-
+g_lastMoteinoRead = 0.0  # time.monotonic() of last packet read
+g_heartbeatResetTime = None  # time.monotonic() when isHeartbeatOK() last asked for a reset, None after a heartbeat
+g_lastUploadTime = time.monotonic()  # time.monotonic() of last successful W/U upload
+g_lastNewISSTime = time.monotonic()  # time.monotonic() of last time received NEW weather data. This seems to be the main problem when uploads stop - Moteino keeps sending the same packet
+g_packetQueue = None     # asyncio.Queue of packets from reader thread to decodePackets(), made in mainAsync()
 
-# List positions for perfStats[] list
-STAT_UPLOADS = 0           # 0 - W/U Uploads in last hour
-STAT_HTTP_FAIL = 1         # 1 - W/U HTTP failures in last hour
-STAT_UPLOAD_TIMESTAMP = 2  # 2 - Timestamp of last successful W/U upload - does not reset every hour
-STAT_I2C_SUCCESS = 3       # 3 - I2C success in last hour
-STAT_I2C_FAIL = 4          # 4 - I2C failures in last hour
-STAT_ISS_FAIL = 5          # 5 - ISS Packet decode errors in last hour
-STAT_ISS_SUCCESS = 6       # 6 - Average time (seconds) to receive ISS packet in last hour
-STAT_NEW_ISS_TIMESTAMP = 7 # 7 - Timestamp of last time received NEW weather data.  Not reset every hour. This seems to be the main problem when uploads stop - Moteino keeps sending the same packet 
-perfStats = [0,0,time.time(),0,0,0,0,time.time()]  # list to hold performance stats
 
-
-
-# Only use this until you get pressure sensor installed
-tmr_hourly_pressure = time.time() + 3600
+#---------------------------------------------------------------------
+# Metrics, see WU_metrics.py.  Counters keep counting, hourlyStats() works out the last hour from g_hourStartCounts
+#---------------------------------------------------------------------
+metrics = WU_metrics.REGISTRY
+UPLOADS           = metrics.counter("weather_uploads_total", "Observations accepted by W/U")
+UPLOAD_FAILS      = metrics.counter("weather_upload_failures_total", "Failed attempts to send queued observations to W/U")
+PACKET_READS      = metrics.counter("weather_packet_reads_total", "Packets read from Moteino, including repeats")
+PACKET_READ_FAILS = metrics.counter("weather_packet_read_errors_total", "I2C (or other transport) read errors")
+PACKETS_DECODED   = metrics.counter("weather_packets_decoded_total", "New packets decoded")
+READER_ERRORS     = metrics.counter("weather_reader_errors_total", "Unexpected errors in the packet reader thread")
+DECODE_FAILS      = metrics.counter("weather_decode_errors_total", "New packets with a bad CRC or station ID")
+READ_SECONDS      = metrics.histogram("weather_i2c_read_seconds", "Time to read a packet over I2C, once Moteino has one ready")
+DECODE_SECONDS    = metrics.histogram("weather_decode_seconds", "Time to decode a packet",
+                                      buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01))
+PACKET_INTERVAL   = metrics.histogram("weather_packet_interval_seconds", "Seconds between new packets",
+                                      buckets=(1, 2, 2.5, 3, 4, 5, 10, 30, 60, 300, 600))
+metrics.gauge("weather_packet_queue_depth", "Packets waiting to be decoded", function=lambda: g_packetQueue.qsize())
+metrics.gauge("weather_upload_queue_depth", "Observations waiting to be sent to W/U", function=lambda: g_uploadDB.depth())
+metrics.gauge("weather_seconds_since_upload", "Seconds since last successful W/U upload", function=lambda: time.monotonic() - g_lastUploadTime)
+metrics.gauge("weather_seconds_since_new_packet", "Seconds since last new packet", function=lambda: time.monotonic() - g_lastNewISSTime)
+MOTEINO_RESETS    = metrics.counter("weather_moteino_resets_total", "Moteino resets")
+metrics.gauge("weather_moteino_reset_state", "0 ready, 1 asserting reset, 2 releasing reset, 3 booting",
+              function=lambda: moteinoReset_cls.STATES.index(g_moteinoReset.state))
+g_hourStartCounts = metrics.counterValues() # counter values when the hour started
+
+# Returns how much counter has gone up since the hour started
+def sinceHour(counter):
+    return(counter.value - g_hourStartCounts.get(counter.name, 0))
 
 
 #---------------------------------------------------------------------
-# Main loop
+# Packet reader thread
+# Gets packets from the transport (WU_transport.py), normally the Moteino over I2C.  Runs in its own
+# thread so a slow upload or pressure download can't hold up packet reads.  New packets are passed to
+# the asyncio loop through packetQueue.  Everything else runs on the asyncio loop, see mainAsync()
 #---------------------------------------------------------------------
-while True:
+READER_IDLE_WAIT = 1.0 # max seconds reader waits for a packet before checking again
+READER_ERROR_WAIT = 1.0 # seconds reader waits after an unexpected error, so a repeating one doesn't spin
 
-    # Moteino will set output pin high when it wants to send data to RPi
-    if(GPIO.input(MOTEINO_READY_PIN) == 1):
-        g_moteinoReady = True
-    else:
-        g_moteinoReady = False
-        
-    
-    decodeStatus = [False, ""] # Reset status. decodeStatus[1] is an errmsg
-    
-    if (g_moteinoReady and (time.time() > g_tmr_Moteino) and isHeartbeatOK()): 
-        g_tmr_Moteino = time.time() + 1 # add 1 second to Moteino timer, this is used so Moteino is only queried once a second
-        
+def packetReader(loop, packetQueue, transport):
+
+    global g_moteinoReady
+    global g_rawDataNew
+    global g_lastMoteinoRead
+    global g_i2cDailyErrors
+
+    lastNewPacket = None # time.monotonic() of last new packet, for PACKET_INTERVAL
+    while True:
         # Copy previously recieved raw data into separate list so it can be compared to new data coming in to see if it changed
-        rawDataOld = list(g_rawDataNew)
+        rawDataOld = g_rawDataNew
 
         # Get new data from Moteino
         # Exception handler for: OSError: [Errno 5] Input/output error. This occures when Moteino is rebooted
         try:
-            g_rawDataNew = i2c_bus.read_i2c_block_data(I2C_ADDRESS, 0, 8)  # Get data from Moteino, 0 byte offset, get 8 bytes
-            perfStats[STAT_I2C_SUCCESS] += 1 
+            packet = transport.read(READER_IDLE_WAIT) # for I2C, waits for Moteino ready pin
+            g_moteinoReady = transport.ready
+            if (packet is None):
+                continue
+            g_lastMoteinoRead = time.monotonic()
+            g_rawDataNew = packet
+            PACKET_READS.inc()
+            if (transport.readSeconds is not None):
+                READ_SECONDS.observe(transport.readSeconds)
+            g_packetLog.append(g_rawDataNew) # log repeats too, the Moteino sending the same packet over and over is what stops uploads
 
             if (g_rawDataNew != rawDataOld): # See if new data has changed
-                perfStats[STAT_NEW_ISS_TIMESTAMP] = time.time()
-                g_NewISSDataTimeStamp = time.time()
-                decodeStatus = decodeRawData(g_rawDataNew) # Send packet to decodeRawData() for decoding
-                if (decodeStatus[0] == False):
-                    print("{}   {}".format(decodeStatus[1], time.strftime("%m/%d/%Y %I:%M:%S %p")))
-                    perfStats[STAT_ISS_FAIL] += 1
-                else:
-                    perfStats[STAT_ISS_SUCCESS] += 1
+                if (lastNewPacket is not None):
+                    PACKET_INTERVAL.observe(g_lastMoteinoRead - lastNewPacket)
+                lastNewPacket = g_lastMoteinoRead
+                loop.call_soon_threadsafe(packetQueue.put_nowait, (g_rawDataNew, g_lastMoteinoRead)) # Send packet and read time to asyncio loop for decoding
 
         except OSError:  # Got an I2C error
-            perfStats[STAT_I2C_FAIL] += 1
+            g_lastMoteinoRead = time.monotonic()
+            PACKET_READ_FAILS.inc()
             g_i2cDailyErrors += 1
 
-    # If it's a new day, reset daily rain accumulation, I2C Error counter, and SMS flags
+            # Reset Moteino after every 200 I2C errors 
+            if (g_i2cDailyErrors % 200 == 0):
+                loop.call_soon_threadsafe(requestMoteinoReset, "High I2C errors:{}".format(g_i2cDailyErrors))
+
+        except Exception:  # Anything else (packet log, transport bug, etc.) mustn't stop the reader thread while uploads carry on with old data
+            print("Error in packet reader   {}".format(time.strftime("%m/%d/%Y %I:%M:%S %p")))
+            traceback.print_exc()
+            READER_ERRORS.inc()
+            time.sleep(READER_ERROR_WAIT)
+
+
+#---------------------------------------------------------------------
+# Decodes packets from the reader thread
+#---------------------------------------------------------------------
+async def decodePackets(packetQueue):
+    global g_lastNewISSTime
+    while True:
+        packet, readTime = await packetQueue.get()
+        g_lastNewISSTime = time.monotonic()
+        rescheduleJob(issWatchdogJob, 60 * 10) # Got new data, push back Moteino reset
+        with DECODE_SECONDS.time(), PROFILER.stage("decode"):
+            decodeStatus = decodeRawData(packet) # Send packet to decodeRawData() for decoding
+        if (decodeStatus[0] == False):
+            print("{}   {}".format(decodeStatus[1], time.strftime("%m/%d/%Y %I:%M:%S %p")))
+            DECODE_FAILS.inc()
+        else:
+            PACKETS_DECODED.inc()
+            g_moteinoReset.markHealthy(readTime) # last reset, if any, worked if the packet was read after it
+
+
+#---------------------------------------------------------------------
+# Sends queued weather data to Weather Underground, see WU_uploadQueue.py.  uploadWeatherData() adds
+# a record every g_uploadFreqWU seconds and wakes this task.  If a send fails, records stay on disk and
+# this task retries with backoff.  drain() uses requests, which blocks, so it runs in a worker thread
+#---------------------------------------------------------------------
+async def uploader():
+    global g_lastUploadTime
+    failedAttempts = 0
+    while True:
+        if (failedAttempts > 0):
+            await asyncio.sleep(WU_uploadQueue.backoff(failedAttempts)) # W/U or internet is down, wait longer each time
+        elif (g_uploadDB.depth() == 0):
+            g_uploadWake.clear()
+            await g_uploadWake.wait() # wait for uploadWeatherData() to add data
+
+        drainStatus = await asyncio.to_thread(PROFILER.wrap("uploadSend", WU_uploadQueue.drain), g_uploadDB, WU_STATION) # returns [records sent, error message]
+        if drainStatus[0] > 0:
+            g_lastUploadTime = time.monotonic()
+            UPLOADS.inc(drainStatus[0])
+            failedAttempts = 0
+        if drainStatus[1] != "No Errors":
+            failedAttempts += 1
+            errMsg = "Error in upload2WU(), {}, {} uploads waiting, Last successful uplaod: {:.1f} minutes ago   {}". \
+                     format(drainStatus[1], g_uploadDB.depth(), (time.monotonic() - g_lastUploadTime)/60, time.strftime("%m/%d/%Y %I:%M:%S %p"))
+            print(errMsg)
+            UPLOAD_FAILS.inc()
+
+
+# Starts a coroutine without waiting for it, used by scheduled jobs
+def startTask(coro):
+    task = asyncio.ensure_future(coro)
+    g_backgroundTasks.add(task)  # keep a reference so task isn't garbage collected before it finishes
+    task.add_done_callback(g_backgroundTasks.discard)
+    return(task)
+
+# Runs a blocking function in a worker thread without waiting for it, used by scheduled jobs
+# for network calls and Moteino resets so they don't hold up the asyncio loop
+def runInBackground(func, *args):
+    return(startTask(asyncio.to_thread(func, *args)))
+
+
+#---------------------------------------------------------------------
+# Scheduled jobs, see scheduler_cls.py.  These run on the asyncio loop and must not block
+#---------------------------------------------------------------------
+
+# If it's a new day, reset daily rain accumulation, I2C Error counter, and SMS flags
+# Runs at midnight.  Checks again at least once an hour in case the clock was set by NTP after boot
+def newDay():
+
+    global g_oldDayOfMonth
+    global g_i2cDailyErrors
+    global g_SMS_Sent_Today
+    global g_SMS_Offline_Msg_Sent
+
     newDayOfMonth = int(time.strftime("%d"))
     if newDayOfMonth != g_oldDayOfMonth:
         suntec.rainToday = 0.0
@@ -631,80 +619,292 @@ while True:
         logFile(True, "Data",   "")
         logFile(True, "Errors", "")
 
+    rescheduleJob(newDayJob, min(3600, scheduler_cls.secondsUntilMidnight() + 1))
 
-#  get pressure from other W/U stations once an hour, once you get BME280 sensor installed, you can get it more frequently
-    if (time.time() > tmr_hourly_pressure):
-        newPressure = WU_download.getPressure() # Get latest pressure from local weather station
-        tmr_hourly_pressure = time.time() + 3600
-        if (newPressure > 25):
-            suntec.pressure = newPressure
 
+# Save state for warm restart.  State is copied here, file is written in a worker thread
+def saveCheckpoint():
+    runInBackground(PROFILER.wrap("housekeeping", g_checkpoint.save), stationState())
+
+
+# Sample BME280 every BME280_SAMPLE_FREQ seconds, the samples are averaged by bme280.reading()
+def sampleBME280():
+    runInBackground(PROFILER.wrap("pressure", bme280.sample))
+
+# Use BME280 average every minute, get pressure from other W/U stations once an hour.  pressureSource decides which to use
+async def updatePressureAsync(update):
+    await asyncio.to_thread(PROFILER.wrap("pressure", update)) # I2C or network call
+    newPressure = pressureSource.pressure()
+    if newPressure is not None:
+        suntec.pressure = newPressure
+
+def updateLocalPressure():
+    startTask(updatePressureAsync(pressureSource.sampleLocal))
+
+def updateRemotePressure():
+    startTask(updatePressureAsync(pressureSource.updateRemote))
 
-    # If RPi has reecived new valid data from Moteino, and upload timer has passed, and RPi has dewpoint data (note, dewpoint depends on Temp
-    # and R/H) then upload new data to Weather Underground
-    if ( (suntec.gotDewPointData() == True) and (decodeStatus[0] == True) and (time.time() > tmr_upload) ):
-#srg        newPressure = WU_download.getPressure() # get latest pressure from local weather station
-#srg        if (newPressure > 25):
-#srg            suntec.pressure = newPressure  # if a new valid pressure is retrieved, update data. If not, use current value
-        printWeatherDataTable(printRawData=False) # print weather data. printRawData parameter deterrmines if raw ISS hex data is also printed.
-        
-        uploadStatus = WU_upload.upload2WU(suntec, WU_STATION) # upload2WU() returns a list, [0] is succuss/faulure of upload [1] is error message.  see: https://bit.ly/37y0gAU 
-        uploadErrMsg = uploadStatus[1]
-        if uploadStatus[0] == True:
-            perfStats[STAT_UPLOAD_TIMESTAMP] = time.time()
-            tmr_upload = time.time() + g_uploadFreqWU # Set next upload time
-            perfStats[STAT_UPLOADS] += 1
-        else:
-            errMsg = "Error in upload2WU(), {}, Last successful uplaod: {:.1f} minutes ago   {}". \
-                     format(uploadErrMsg, (time.time() - perfStats[STAT_UPLOAD_TIMESTAMP])/60, time.strftime("%m/%d/%Y %I:%M:%S %p"))
-            print(errMsg)
-            perfStats[STAT_HTTP_FAIL] += 1
 
-    # if no upload to W/U for at least 5 min (300 seconds), then print detail data every minute
-    if ( (time.time() > detailStatTimer) and ((time.time() - perfStats[STAT_UPLOAD_TIMESTAMP]) > 300)):
+# If RPi has dewpoint data (note, dewpoint depends on Temp and R/H) then queue data for upload to Weather Underground
+# got...Data() checks make sure data is recent.  Data is saved to disk first so it isn't lost if upload fails
+def uploadWeatherData():
+    if (suntec.gotDewPointData() == False):
+        rescheduleJob(uploadJob, g_uploadRetryWU) # don't wait a whole upload period once data arrives
+        return
+    printWeatherDataTable(printRawData=False) # print weather data. printRawData parameter deterrmines if raw ISS hex data is also printed.
+
+    g_uploadDB.append(WU_upload.uploadParams(suntec))
+    g_uploadWake.set()
+
+
+# if no upload to W/U for at least 5 min (300 seconds), then print detail data every minute
+def detailStats():
+    if ((time.monotonic() - g_lastUploadTime) > 300):
         logFileDetail()
-        detailStatTimer = time.time() + 60 # reset timer
 
-    # if no upload to W/U for at least 30 min send SMS message
-    if ( (time.time() - perfStats[STAT_UPLOAD_TIMESTAMP]) > (60 * 30) and (g_SMS_Sent_Today == False) and (g_SMS_Offline_Msg_Sent == False)):
-        sendSMS("Weather Station is offline")
+
+# if no upload to W/U for at least 30 min send SMS message
+def checkOffline():
+    global g_SMS_Offline_Msg_Sent
+    if ( (time.monotonic() - g_lastUploadTime) > (60 * 30) and (g_SMS_Sent_Today == False) and (g_SMS_Offline_Msg_Sent == False)):
+        runInBackground(sendSMS, "Weather Station is offline")
         g_SMS_Offline_Msg_Sent = True
 
 
-    # Reset Moteino after every 200 I2C errors 
-    if ( (g_i2cDailyErrors % 200 == 0) and (g_i2cDailyErrors > 0) ):
-        print("High I2C errors:{}.  Resetting Moteino  {}".format(g_i2cDailyErrors,time.strftime("%m/%d/%Y %I:%M:%S %p")))
-        g_i2cDailyErrors += 1   #  add 1 to g_i2cDailyErrors so this doesn't run again right away
-        resetMoteino()
+# Reset Moteino if no new ISS data has come in for 10 minutes.  decodePackets() pushes this job back each time new data arrives
+def noNewISSData():
+    print("********************************************************************************")
+    print("No new ISS data in {:0.1f} minutes; resetting Moteino.   {}".format((time.monotonic() - g_lastNewISSTime)/60 ,time.strftime("%m/%d/%Y %I:%M:%S %p")))
+    print("********************************************************************************")
+    rescheduleJob(issWatchdogJob, 60 * 10)   #  check again in 10 minutes, don't want Moteino resetting again too soon
+    requestMoteinoReset("No new ISS data")
+
+
+# Every hour print stats for the last hour for debugging, then start a new hour
+def hourlyStats():
+    global g_hourStartCounts
+    i2cReads = sinceHour(PACKET_READS) + sinceHour(PACKET_READ_FAILS)
+    stats = "   {}\t    {}\t\t  {:.2f}\t\t  {:.1f}%\t\t  {}\t  {:.2f}\t\t{:.1f}\t\t".format(sinceHour(UPLOADS), sinceHour(UPLOAD_FAILS),
+                                                                    (time.monotonic() - g_lastUploadTime)/3600,
+                                                                     sinceHour(PACKET_READS) / max(i2cReads, 1) * 100,
+                                                                     sinceHour(DECODE_FAILS), sinceHour(PACKETS_DECODED)/3600,
+                                                                     (time.monotonic() - g_lastNewISSTime)/60 )
+    logFile(False, "Error", stats)
+    g_hourStartCounts = metrics.counterValues()
+
+
+sched = scheduler_cls.scheduler() # min-heap of timers, uses time.monotonic()
+# Jobs that do their work on the asyncio loop are timed as a WU_profiler.py stage.  The pressure jobs only start
+# worker threads, the work in the thread is timed instead
+newDayJob         = sched.after(min(3600, scheduler_cls.secondsUntilMidnight() + 1), PROFILER.wrap("dayRollover", newDay))
+bme280Job         = sched.every(BME280_SAMPLE_FREQ, sampleBME280)
+localPressureJob  = sched.every(60, updateLocalPressure)
+remotePressureJob = sched.every(3600, updateRemotePressure)
+uploadJob         = sched.every(g_uploadFreqWU, PROFILER.wrap("upload", uploadWeatherData), delay=STARTUP_DEADLINE) # startup() moves this up when it's done
+detailStatJob     = sched.every(60, PROFILER.wrap("housekeeping", detailStats))
+offlineJob        = sched.every(60, PROFILER.wrap("housekeeping", checkOffline))
+issWatchdogJob    = sched.after(STARTUP_PACKET_WAIT, PROFILER.wrap("housekeeping", noNewISSData))
+hourlyStatJob     = sched.every(3600, PROFILER.wrap("housekeeping", hourlyStats))
+checkpointJob     = sched.every(CHECKPOINT_FREQ, PROFILER.wrap("housekeeping", saveCheckpoint))
+moteinoResetJob   = sched.after(0, PROFILER.wrap("housekeeping", stepMoteinoReset)) # requestMoteinoReset() starts it
+sched.cancel(moteinoResetJob)
+
+
+# Reschedule a job and wake up runScheduler() in case the job is now due sooner than it was sleeping for
+def rescheduleJob(job, delay):
+    sched.reschedule(job, delay)
+    g_schedulerWake.set()
+
+
+# Sleeps until the next job is due, then runs it
+async def runScheduler():
+    while True:
+        g_schedulerWake.clear()
+        try:
+            await asyncio.wait_for(g_schedulerWake.wait(), sched.timeUntilNext())
+        except asyncio.TimeoutError:
+            pass
+        sched.runPending()
+
+
+#---------------------------------------------------------------------
+# Startup steps that need the network or the BME280.  They all run at the same time in worker threads
+# while the reader thread is already getting packets.  Uploads start when they're done, or after
+# STARTUP_DEADLINE seconds if some are slow.  A slow step keeps running and fills in its data later.
+#---------------------------------------------------------------------
+def announceRestart():
+    import requests # used to get public IP address   Ref: https://stackoverflow.com/questions/61347442/how-can-i-find-my-ip-address-with-python-not-local-ip
+    try:
+        public_IP = WU_http.get("http://wtfismyip.com/text").text
+    except requests.exceptions.RequestException as err:
+        public_IP = "unknown ({})".format(type(err).__name__)
+    print("Suntec public IP: {}".format(public_IP)) 
+    sendSMS("Weather Station Restarted. \nPublic IP: " + public_IP)
+
+async def loadDailyRain():
+    newRainToday = await asyncio.to_thread(WU_download.getDailyRain)  # getDailyRain returns a list [0] = success/failure, [1] error message
+    if newRainToday[0] >= 0:
+        print('Suntec station daily rain={}'.format(newRainToday[0]))
+        suntec.rainToday += newRainToday[0] # add to any rain counted since program started
+    else:
+        errMsg = "getDailyRain() error:"
+        print("{} {}    {}".format(errMsg, newRainToday[1], time.strftime("%m/%d/%Y %I:%M:%S %p")))
+
+async def loadPressure():
+    await asyncio.to_thread(bme280.sample)
+    await asyncio.gather(updatePressureAsync(pressureSource.sampleLocal), updatePressureAsync(pressureSource.updateRemote))
+    if suntec.gotPressureData() == False:
+        errMsg = "Error getting pressure data on startup"
+        print("{}  {}".format(errMsg,time.strftime("%m/%d/%Y %I:%M:%S %p")))
+
+async def startup():
+    startTime = time.monotonic()
+    steps = [startTask(asyncio.to_thread(announceRestart)), startTask(loadPressure())]
+    if g_savedState is None:
+        steps.append(startTask(loadDailyRain()))
+    done, pending = await asyncio.wait(steps, timeout=STARTUP_DEADLINE)
+    print("Startup took {:.1f} seconds, {} of {} steps still running".format(time.monotonic() - startTime, len(pending), len(steps)))
+    rescheduleJob(uploadJob, 0)
+
+
+#---------------------------------------------------------------------
+# Main
+# Reader thread gets packets from Moteino.  Decoding, uploads, pressure downloads, SMS and the
+# timers run as separate tasks on the asyncio loop and pass data through queues
+#---------------------------------------------------------------------
+async def mainAsync():
 
+    global g_uploadWake
+    global g_schedulerWake
+    global g_packetQueue
+    global g_loop
 
-    # Reset Moteino if no new ISS data has come in for 10 minutes
-    if (time.time() > g_NewISSDataTimeStamp + (60 * 10)):
-        print("********************************************************************************")
-        print("No new ISS data in {:0.1f} minutes; resetting Moteino.   {}".format((time.time() - g_NewISSDataTimeStamp)/60 ,time.strftime("%m/%d/%Y %I:%M:%S %p")))
-        print("********************************************************************************")
-        g_NewISSDataTimeStamp = time.time() + (60 * 10)   #  add 10 minutes to timer, don't want Moteino resetting again too soon
-        resetMoteino()
+    loop = g_loop = asyncio.get_running_loop()
+    packetQueue = g_packetQueue = asyncio.Queue()   # raw packets from reader thread
+    g_uploadWake = asyncio.Event()  # set when there's new data in g_uploadDB
+    g_schedulerWake = asyncio.Event()
 
+    readerThread = threading.Thread(target=packetReader, args=(loop, packetQueue, g_transport), name="packetReader", daemon=True)
+    readerThread.start()
+    startTask(startup())
 
-    # Every hour print and then reset some stats for debugging
-    if (time.time() > hourTimer):
-        stats = "   {}\t    {}\t\t  {:.2f}\t\t  {:.1f}%\t\t  {}\t  {:.2f}\t\t{:.1f}\t\t".format(perfStats[STAT_UPLOADS], perfStats[STAT_HTTP_FAIL], 
-                                                                        (time.time() - perfStats[STAT_UPLOAD_TIMESTAMP])/3600, 
-                                                                         perfStats[STAT_I2C_SUCCESS] / (perfStats[STAT_I2C_FAIL] + perfStats[STAT_I2C_SUCCESS]) * 100, 
-                                                                         perfStats[STAT_ISS_FAIL], perfStats[STAT_ISS_SUCCESS]/3600,
-                                                                         (time.time() - perfStats[STAT_NEW_ISS_TIMESTAMP])/60 )  
-        logFile(False, "Error", stats)
+    await asyncio.gather(decodePackets(packetQueue), uploader(), runScheduler())
 
-        # Reset hourly stats
-        perfStats[STAT_UPLOADS] = 0
-        perfStats[STAT_HTTP_FAIL] = 0
-        perfStats[STAT_I2C_SUCCESS] = 0
-        perfStats[STAT_I2C_FAIL] = 0
-        perfStats[STAT_ISS_FAIL] = 0
-        perfStats[STAT_ISS_SUCCESS] = 0
-        hourTimer = time.time() + 3600
-       
 
-GPIO.cleanup() # Used when exiting a program to reset the pins
+g_backgroundTasks = set() # tasks started by runInBackground()
 
+
+#---------------------------------------------------------------------
+# Start up 
+# Hardware is set up here instead of when the file is imported, so tools can import decodeRawData() etc.
+#---------------------------------------------------------------------
+# Stand ins for RPi.GPIO and the BME280 when PACKET_SOURCE isn't the Moteino on I2C.  The heartbeat never
+# changes, so isHeartbeatOK() isn't used, and resets don't do anything
+class noGPIO:
+    def input(self, pin):
+        return(0)
+
+    def output(self, pin, level):
+        pass
+
+    def cleanup(self):
+        pass
+
+class noBME280:
+    def sample(self):
+        return(None)
+
+    def reading(self):
+        return(None)
+
+
+def main():
+
+    global GPIO, bme280, pressureSource, g_transport, g_packetLog
+    global g_checkpoint, g_savedState, g_uploadDB, g_moteinoReset
+    global g_heartbeatNew, g_heartbeatOld, g_lastHeartbeatTime
+
+    IP = check_output(['hostname', '-I'])
+    IP = IP.rstrip()  # strips off eol characters
+    IP = IP.decode('utf-8') # removes b' previx
+    print("RPi IP Address: {}".format(IP)) 
+    print("Ver: {}    {}".format(version, time.strftime("%m/%d/%Y %I:%M:%S %p")))
+    # Create log files for data and errors, First Param = True means to create a new file, vs append to a file
+    logFile(True, "Data",   "")
+    logFile(True, "Errors", "")
+
+
+    # Set to zero, weatherStation class initially sets these to -100 for No Data yet
+    suntec.windGust =  0.0
+    suntec.rainToday = 0.0
+
+    # If program restarted today, pick up where it left off.  Otherwise startup() gets daily rain from W/U
+    g_checkpoint = checkpoint_cls.checkpoint(CHECKPOINT_FILE)
+    g_savedState = g_checkpoint.load() # [state, seconds since it was saved] or None
+    if g_savedState is not None:
+        restoreStation(g_savedState[0], g_savedState[1])
+        print('Restored state from {:.0f} seconds ago, daily rain={}'.format(g_savedState[1], suntec.rainToday))
+
+    if PACKET_SOURCE.partition(':')[0] == "i2c":
+        import RPi.GPIO as GPIO # reads/writes GPIO pins
+        import smbus  # Used by I2C
+        i2c_bus = smbus.SMBus(1)  # for I2C
+        i2cLock = threading.Lock() # Moteino and BME280 share the I2C bus, only one can use it at a time
+
+        # Setup GPIO using Board numbering (vs BCM numbering)
+        GPIO.setmode(GPIO.BOARD)
+
+        # Setup pin as input with pull-down resistor
+        GPIO.setwarnings(False) 
+        GPIO.setup(MOTEINO_HEARTBEAT_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+        GPIO.setup(MOTEINO_READY_PIN,     GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+        GPIO.setup(MOTEINO_RESET_PIN,     GPIO.OUT)
+        GPIO.output(MOTEINO_RESET_PIN, 1) # set pin high. Moteino resets when it's pin is grounded
+        readySignal = moteinoReady_cls.moteinoReadySignal(GPIO, MOTEINO_READY_PIN) # rising edge on ready pin wakes up main loop
+
+        # BME280 is sampled every BME280_SAMPLE_FREQ seconds, but skips a sample if Moteino has a packet waiting
+        bme280 = bme280_cls.bme280Sensor(i2c_bus, i2cLock, yieldTo=readySignal.isReady)
+
+        # Moteino reads are paced by the ready pin and skipped while it's being reset or if the heartbeat stopped
+        g_transport = WU_transport.openTransport(PACKET_SOURCE, bus=i2c_bus, address=I2C_ADDRESS, readySignal=readySignal,
+                                                 busLock=i2cLock, healthCheck=PROFILER.wrap("heartbeat", isMoteinoOK))
+    else:
+        # Packets from a serial port, file or socket, so the station can run off the RPi for load testing.
+        # There are no Moteino pins to set up and no BME280, pressure comes from nearby stations
+        GPIO = noGPIO()
+        bme280 = noBME280()
+        g_transport = WU_transport.openTransport(PACKET_SOURCE)
+    g_moteinoReset = moteinoReset_cls.moteinoResetter(GPIO, MOTEINO_RESET_PIN, onEscalate=moteinoNotRecovering)
+
+    # Pressure comes from BME280 sensor, or other nearby weather stations if BME280 isn't working. See pressure_cls.py
+    pressureSource = pressure_cls.pressureProvider(bme280.reading, WU_download.getPressureObservation, STATION_ELEVATION)
+
+    if g_savedState is not None:
+        restoreStats(g_savedState[0], g_savedState[1])
+
+    g_heartbeatNew = GPIO.input(MOTEINO_HEARTBEAT_PIN)
+    g_heartbeatOld = g_heartbeatNew
+    g_lastHeartbeatTime = time.monotonic() 
+
+    g_uploadDB = WU_uploadQueue.uploadQueue(UPLOAD_QUEUE_FILE) # data waiting to be uploaded, saved on disk
+    g_packetLog = WU_packetLog.packetLog(PACKET_LOG_DIR)
+    PROFILER.setSampleRate(PROFILE_SAMPLE_RATE)
+    PROFILER.installSignal() # "kill -USR1 <pid>" prints where time is going
+    if METRICS_PORT is not None:
+        try:
+            WU_metrics.startServer(METRICS_PORT, METRICS_HOST)
+        except OSError as err:  # ie port in use, station still runs without it
+            print("Can't serve metrics on {}:{}: {}".format(METRICS_HOST, METRICS_PORT, err))
+    try:
+        asyncio.run(mainAsync())
+    finally:
+        g_transport.close()
+        g_packetLog.close()
+        g_checkpoint.save(stationState())
+        g_uploadDB.close()
+        WU_http.closeAll()
+        GPIO.cleanup() # Used when exiting a program to reset the pins
+
+
+if __name__ == "__main__":
+    main()
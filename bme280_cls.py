@@ -0,0 +1,139 @@
+# BME280 pressure and temperature sensor
+# The sensor object is made once.  Making it reads the calibration registers over I2C, so
+# Weather_Station.py used to pay that on every pressure read.  sample() is called on a timer and
+# keeps the last numSamples readings; reading() returns their average so one noisy reading
+# doesn't move the pressure.
+#
+# The BME280 is on the same I2C bus as the Moteino.  busLock is shared with the Moteino reader
+# thread so only one of them uses the bus at a time.  The sensor runs in normal mode (it measures
+# on its own every STANDBY_MS), so a sample is a short register read and the lock is held for a few ms.
+# yieldTo is an optional function that returns True when the Moteino has a packet waiting; the
+# sample is skipped then so it never delays a packet read.
+#
+# The adafruit driver wants a busio.I2C object, bus is the smbus.SMBus the Moteino uses, so smbusI2C
+# makes it look like one.  If the driver is missing or broken the station runs without the sensor.
+#
+# clock is the function used for sample timestamps, it can be replaced for testing
+
+import collections
+import time
+
+
+# The parts of busio.I2C the adafruit driver uses, done with smbus register reads and writes.
+# The driver writes the register number then reads, so the register is kept until the read.
+# busLock already keeps the Moteino off the bus, so try_lock() always succeeds
+class smbusI2C:
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.register = None  # register written by the last 1 byte writeto()
+
+    def try_lock(self):
+        return(True)
+
+    def unlock(self):
+        pass
+
+    def writeto(self, address, buf, *, start=0, end=None):
+        data = bytes(buf[start:end])
+        if len(data) == 0:    # driver checking the sensor is there
+            self.register = None
+            self.bus.read_byte(address)
+        elif len(data) == 1:  # register to read next
+            self.register = data[0]
+        else:
+            self.register = None
+            self.bus.write_i2c_block_data(address, data[0], list(data[1:]))
+
+    def readfrom_into(self, address, buf, *, start=0, end=None):
+        end = len(buf) if end is None else end
+        if self.register is None:
+            data = [self.bus.read_byte(address) for i in range(end - start)]
+        else:
+            data = self.bus.read_i2c_block_data(address, self.register, end - start)
+        buf[start:end] = bytes(data)
+
+    def writeto_then_readfrom(self, address, bufOut, bufIn, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        self.writeto(address, bufOut, start=out_start, end=out_end)
+        self.readfrom_into(address, bufIn, start=in_start, end=in_end)
+
+
+class bme280Sensor:
+
+    LOCK_TIMEOUT = 0.5       # seconds to wait for the I2C bus before skipping a sample
+    STANDBY_MS   = 500       # ms between measurements in normal mode
+    MAX_AGE      = 5 * 60    # seconds, samples older than this aren't averaged
+    OPEN_RETRY   = 5 * 60    # seconds between attempts to find the sensor if it's missing
+
+    # oversampling is 1, 2, 4, 8 or 16 times, used for pressure and temperature
+    # iirFilter is 0 (off), 2, 4, 8 or 16, the sensor's own smoothing filter
+    def __init__(self, bus, busLock, address=0x77, oversampling=16, iirFilter=4, numSamples=6, yieldTo=None, clock=time.monotonic):
+        self.bus          = bus
+        self.busLock      = busLock
+        self.address      = address
+        self.oversampling = oversampling
+        self.iirFilter    = iirFilter
+        self.yieldTo      = yieldTo
+        self.clock        = clock
+        self.sensor       = None  # adafruit_bme280 object, made by open()
+        self.lastOpen     = None  # clock() time of last open() attempt
+        self.samples      = collections.deque(maxlen=numSamples)  # [pressure hPa, temperature C, clock() time]
+        self.errors       = 0     # I2C errors since program started
+
+    # Makes the sensor object and sets oversampling.  Caller must hold busLock.  Returns True if sensor is ready
+    def _open(self):
+        now = self.clock()
+        if self.lastOpen is not None and now - self.lastOpen < bme280Sensor.OPEN_RETRY:
+            return(False)
+        self.lastOpen = now
+        try:
+            # https://github.com/adafruit/Adafruit_CircuitPython_BME280, to install: "sudo pip3 install adafruit-circuitpython-bme280"
+            from adafruit_bme280 import advanced as adafruit_bme280
+            sensor = adafruit_bme280.Adafruit_BME280_I2C(smbusI2C(self.bus), address=self.address)
+        except Exception as err: # driver missing or broken, sensor missing or I2C error
+            print("Error opening BME280: {}: {}".format(type(err).__name__, err))
+            return(False)
+
+        try:
+            sensor.overscan_pressure    = getattr(adafruit_bme280, "OVERSCAN_X{}".format(self.oversampling))
+            sensor.overscan_temperature = getattr(adafruit_bme280, "OVERSCAN_X{}".format(self.oversampling))
+            if self.iirFilter:
+                sensor.iir_filter = getattr(adafruit_bme280, "IIR_FILTER_X{}".format(self.iirFilter))
+            sensor.standby_period = getattr(adafruit_bme280, "STANDBY_TC_{}".format(bme280Sensor.STANDBY_MS))
+            sensor.mode = adafruit_bme280.MODE_NORMAL
+        except (AttributeError, ValueError) as err: # older or newer library without these settings
+            print("BME280 oversampling not set, using driver defaults: {}".format(err))
+        except OSError as err:
+            print("Error setting BME280 oversampling: {}".format(err))
+        self.sensor = sensor
+        return(True)
+
+    # Reads sensor and adds reading to the rolling average.  Blocks on I2C, call from a worker thread
+    # Returns [pressure hPa, temperature C], or None if the sample was skipped or failed
+    def sample(self):
+        if self.yieldTo is not None and self.yieldTo():
+            return(None)  # Moteino has a packet waiting, try again next time
+        if not self.busLock.acquire(timeout=bme280Sensor.LOCK_TIMEOUT):
+            return(None)
+        try:
+            if self.sensor is None and not self._open():
+                return(None)
+            reading = [self.sensor.pressure, self.sensor.temperature]
+        except Exception as err: # I2C error, or driver failed on a bad reading
+            self.errors += 1
+            print("Error reading BME280: {}: {}".format(type(err).__name__, err))
+            return(None)
+        finally:
+            self.busLock.release()
+
+        self.samples.append(reading + [self.clock()])
+        return(reading)
+
+    # Average of recent samples, [pressure hPa, temperature C], or None if there aren't any
+    # This doesn't use the I2C bus, so it's safe to call from the asyncio loop
+    def reading(self):
+        oldest = self.clock() - bme280Sensor.MAX_AGE
+        recent = [s for s in list(self.samples) if s[2] >= oldest]
+        if not recent:
+            return(None)
+        return([sum(s[0] for s in recent) / len(recent), sum(s[1] for s in recent) / len(recent)])
@@ -0,0 +1,55 @@
+# Saves the station's runtime state to a JSON file every few seconds so a restart can pick up where it
+# left off: today's rain, the rain counter baseline, the wind direction buffer and the stats.  Without it
+# a restart has to download today's rain from W/U and wait for 30 packets before it has a wind direction.
+#
+# The file is written to a temp file and then renamed over the old one (os.replace), so a power cut
+# while saving leaves either the old checkpoint or the new one, never half a file.
+# load() only returns a checkpoint saved today, since daily rain starts over at midnight.
+
+import json
+import os
+import threading
+import time
+
+CHECKPOINT_VERSION = 2  # 2: perfStats replaced by metrics counters
+
+
+class checkpoint:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # save() can be called from worker threads
+
+    # Saves state dictionary.  Returns True if successful
+    def save(self, state):
+        record = {'version': CHECKPOINT_VERSION,
+                  'saved':   time.time(),
+                  'day':     time.strftime("%Y-%m-%d"),
+                  'state':   state}
+        tmpPath = self.path + ".tmp"
+        with self.lock:
+            try:
+                with open(tmpPath, "w") as f:
+                    json.dump(record, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmpPath, self.path)
+            except OSError as err:
+                print("Error saving checkpoint {}: {}".format(self.path, err))
+                return(False)
+        return(True)
+
+    # Returns [state, seconds since it was saved], or None if there's no usable checkpoint from today
+    def load(self):
+        try:
+            with open(self.path) as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return(None)
+        except (OSError, ValueError) as err:
+            print("Error reading checkpoint {}: {}".format(self.path, err))
+            return(None)
+
+        if record.get('version') != CHECKPOINT_VERSION or record.get('day') != time.strftime("%Y-%m-%d"):
+            return(None)
+        return([record['state'], max(0.0, time.time() - record['saved'])])
@@ -0,0 +1,61 @@
+# Moteino sets its ready pin high when it has a new packet for the RPi.
+# This class lets the main loop sleep until that happens instead of polling the pin as fast as it can.
+# It uses RPi.GPIO edge detection, which runs the callback in a GPIO thread when the pin goes high.
+# If edge detection can't be set up it falls back to polling the pin every POLL_INTERVAL seconds.
+#
+# gpio is the RPi.GPIO module, or an object with the same input()/add_event_detect() functions for testing
+
+import threading
+import time
+
+
+class moteinoReadySignal:
+
+    POLL_INTERVAL = 0.05 # seconds between pin reads if edge detection isn't available
+
+    def __init__(self, gpio, pin):
+        self.gpio = gpio
+        self.pin  = pin
+        self.edge = threading.Event()  # set by GPIO callback on rising edge
+        self.edgeDetect = False
+
+        try:
+            gpio.add_event_detect(pin, gpio.RISING, callback=self._risingEdge)
+            self.edgeDetect = True
+        except (RuntimeError, AttributeError) as err:
+            print("Edge detection not available on pin {} ({}), will poll pin instead".format(pin, err))
+
+    def _risingEdge(self, channel):
+        self.edge.set()
+
+    # True if ready pin is high
+    def isReady(self):
+        return (self.gpio.input(self.pin) == 1)
+
+    # Blocks until the ready pin goes high or timeout seconds pass, whichever comes first
+    # Returns True if pin is high.  An edge that happened while the caller was busy
+    # is remembered, so wait() returns right away and no packet is missed.  The pin is checked
+    # after an edge, since the edge may be left over from a packet that was already read through
+    # isReady() and the pin has gone low again
+    def wait(self, timeout):
+        if timeout < 0:
+            timeout = 0
+        deadline = time.monotonic() + timeout
+
+        if self.edgeDetect:
+            while True:
+                gotEdge = self.edge.wait(max(0, deadline - time.monotonic()))
+                self.edge.clear()
+                if self.isReady():
+                    return (True)
+                if not gotEdge or time.monotonic() >= deadline:
+                    return (False)
+
+        # No edge detection, poll the pin
+        while True:
+            if self.isReady():
+                return (True)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return (False)
+            time.sleep(min(moteinoReadySignal.POLL_INTERVAL, remaining))
@@ -0,0 +1,124 @@
+# Resets the Moteino without stopping the program.  The old resetMoteino() held the reset pin low with
+# time.sleep(2), then slept another 10 seconds while the Moteino booted, and everything waited.
+#
+# The reset is a state machine instead.  request() starts a reset, and step() moves it along and returns
+# how many seconds until it needs to be called again, so the asyncio loop can run it from a scheduler job
+# and keep uploading in between.
+#
+#   ready      normal running.  request() starts a reset unless one ran too recently (backoff)
+#   asserting  reset pin held low for the pulse time
+#   releasing  reset pin back high, short wait for the line to settle
+#   booting    Moteino is starting up, don't read it yet
+#
+# Escalation: if no good packet arrives between resets (markHealthy() isn't called), the reset didn't
+# fix anything.  Only packets read after the reset finished count, packets that were waiting to be
+# decoded from before the reset don't show it worked.  Each failed reset doubles the wait before the next one is allowed (BACKOFF_BASE up to
+# BACKOFF_MAX) and after ESCALATE_AFTER failures the pulse and boot times get longer.  onEscalate() is
+# called once when that happens, ie to send an SMS.  Requests while a reset is running or during the
+# backoff are ignored, so several triggers at once only reset the Moteino once.
+#
+# gpio is the RPi.GPIO module, or an object with an output() function for testing.  request() and
+# markHealthy() can be called from any thread.
+
+import threading
+import time
+
+READY     = "ready"
+ASSERTING = "asserting"
+RELEASING = "releasing"
+BOOTING   = "booting"
+STATES    = (READY, ASSERTING, RELEASING, BOOTING)
+
+PULSE_TIME     = 2      # seconds reset pin is held low
+SETTLE_TIME    = 0.5    # seconds after releasing reset pin before Moteino is counted as booting
+BOOT_TIME      = 10     # seconds Moteino takes to boot
+BACKOFF_BASE   = 60     # seconds before a second reset is allowed if the first one didn't help
+BACKOFF_MAX    = 30 * 60
+ESCALATE_AFTER = 3      # failed resets before using the long pulse and boot times
+LONG_PULSE_TIME = 5
+LONG_BOOT_TIME  = 30
+
+
+class moteinoResetter:
+
+    def __init__(self, gpio, resetPin, clock=time.monotonic, onEscalate=None):
+        self.gpio       = gpio
+        self.resetPin   = resetPin
+        self.clock      = clock
+        self.onEscalate = onEscalate
+        self.lock       = threading.Lock()
+        self.state      = READY
+        self.stateEnd   = 0.0    # clock() when current state is over
+        self.reason     = ""     # why the current or last reset was requested
+        self.resets     = 0      # resets started
+        self.failures   = 0      # resets in a row that weren't followed by a good packet
+        self.nextAllowed = 0.0   # clock() when the next reset can start
+        self.readyTime  = 0.0    # clock() when the last reset finished
+        self.healthy    = True   # good packet since last reset
+
+    # Starts a reset.  Returns True if it started, False if one is running or it's too soon after the last one
+    def request(self, reason):
+        with self.lock:
+            now = self.clock()
+            if self.state != READY or now < self.nextAllowed:
+                return(False)
+            if not self.healthy:
+                self.failures += 1
+                if self.failures == ESCALATE_AFTER and self.onEscalate is not None:
+                    self.onEscalate(self.failures, reason)
+            self.healthy = False
+            self.reason = reason
+            self.resets += 1
+            self.gpio.output(self.resetPin, 0) # Ground the pin to reset Moteino
+            self._enter(ASSERTING, now, LONG_PULSE_TIME if self.escalated() else PULSE_TIME)
+            return(True)
+
+    # Moves the reset along.  Returns seconds until step() needs to be called again, None if it's done
+    def step(self):
+        with self.lock:
+            now = self.clock()
+            if self.state == READY:
+                return(None)
+            if now < self.stateEnd:
+                return(self.stateEnd - now)
+
+            if self.state == ASSERTING:
+                self.gpio.output(self.resetPin, 1) # Return pin to high state
+                self._enter(RELEASING, now, SETTLE_TIME)
+            elif self.state == RELEASING:
+                self._enter(BOOTING, now, LONG_BOOT_TIME if self.escalated() else BOOT_TIME)
+            elif self.state == BOOTING:
+                self._enter(READY, now, 0)
+                self.readyTime = now
+                self.nextAllowed = now + self.backoff()
+                return(None)
+            return(self.stateEnd - now)
+
+    def _enter(self, state, now, duration):
+        self.state = state
+        self.stateEnd = now + duration
+
+    # Call when a good packet arrives, readTime is clock() when it was read from the Moteino.  If it was
+    # read after the last reset finished, the reset worked, so the next one starts without backoff
+    def markHealthy(self, readTime):
+        if self.healthy:  # usual case, no lock needed
+            return
+        with self.lock:
+            if self.state != READY or readTime < self.readyTime:
+                return  # read before or during the reset
+            self.healthy = True
+            self.failures = 0
+            self.nextAllowed = 0.0
+
+    # True while a reset is running.  Moteino shouldn't be read
+    def isResetting(self):
+        return(self.state != READY)
+
+    def escalated(self):
+        return(self.failures >= ESCALATE_AFTER)
+
+    # Seconds after a reset finishes before another is allowed, unless markHealthy() is called first
+    def backoff(self):
+        if self.failures == 0:
+            return(BACKOFF_BASE)
+        return(min(BACKOFF_BASE * 2 ** self.failures, BACKOFF_MAX))
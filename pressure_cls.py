@@ -0,0 +1,81 @@
+# Barometric pressure from the local BME280 sensor and from nearby Weather Underground stations
+# The local sensor is read often and converted to sea level pressure.  Nearby stations (WU_download.py)
+# are only used when the local sensor has no recent reading, or when the two disagree by more than
+# DISAGREE_LIMIT; then both are averaged, weighted by how old each observation is.
+#
+# readLocal()  returns [station pressure hPa, temperature C] or None if the sensor can't be read
+# readRemote() returns [sea level pressure inHg, observation epoch, station ID], pressure < 0 is an error
+#              (WU_download.getPressureObservation())
+# clock is the function used for local sample timestamps, it can be replaced for testing
+
+import threading
+import time
+
+HPA_PER_INHG = 33.8639
+
+
+# Converts pressure measured at elevation (meters) to sea level pressure, both in hPa
+# Uses the barometric formula with standard lapse rate, tempC is the air temperature at the sensor
+def seaLevelPressure(stationPressure, elevation, tempC):
+    lapse = 0.0065 * elevation
+    return(stationPressure * (1 - lapse / (tempC + lapse + 273.15)) ** -5.257)
+
+
+class pressureProvider:
+
+    LOCAL_MAX_AGE  = 10 * 60   # seconds, local reading older than this isn't used
+    REMOTE_MAX_AGE = 2 * 3600  # seconds, nearby station reading older than this isn't used
+    DISAGREE_LIMIT = 0.10      # inHg, if local and nearby differ by more than this, blend them
+    AGE_WEIGHT     = 15 * 60   # seconds, a reading this old gets half the weight of a brand new one
+
+    def __init__(self, readLocal, readRemote, elevation, clock=time.monotonic):
+        self.readLocal  = readLocal
+        self.readRemote = readRemote
+        self.elevation  = elevation # meters above sea level of the local sensor
+        self.clock      = clock
+        self.lock       = threading.Lock()
+        self.local      = None  # [sea level pressure inHg, clock() time]
+        self.remote     = None  # [sea level pressure inHg, epoch time]
+
+    # Reads local sensor.  Returns sea level pressure in inHg or None
+    def sampleLocal(self):
+        reading = self.readLocal()
+        if reading is None:
+            return(None)
+        inHg = seaLevelPressure(reading[0], self.elevation, reading[1]) / HPA_PER_INHG
+        if inHg < 25 or inHg > 33: # sensor not working right
+            print("BME280 pressure out of range: {:.2f} inHg".format(inHg))
+            return(None)
+        with self.lock:
+            self.local = [inHg, self.clock()]
+        return(inHg)
+
+    # Gets pressure from nearby stations, this is a network call.  Returns pressure in inHg or None
+    def updateRemote(self):
+        observation = self.readRemote()
+        if observation[0] <= 0:
+            return(None)
+        with self.lock:
+            self.remote = [observation[0], observation[1]]
+        return(observation[0])
+
+    # Returns best pressure in inHg, or None if there is no recent reading
+    def pressure(self):
+        with self.lock:
+            local  = self.local
+            remote = self.remote
+
+        localAge  = None if local  is None else self.clock() - local[1]
+        remoteAge = None if remote is None else time.time() - remote[1]
+        localOK  = localAge  is not None and localAge  <= pressureProvider.LOCAL_MAX_AGE
+        remoteOK = remoteAge is not None and remoteAge <= pressureProvider.REMOTE_MAX_AGE
+
+        if localOK and (not remoteOK or abs(local[0] - remote[0]) <= pressureProvider.DISAGREE_LIMIT):
+            return(local[0])
+        if not localOK:
+            return(remote[0] if remoteOK else None)
+
+        # Both recent but they disagree, weight each by its age
+        localWeight  = 1.0 / (1.0 + max(0.0, localAge)  / pressureProvider.AGE_WEIGHT)
+        remoteWeight = 1.0 / (1.0 + max(0.0, remoteAge) / pressureProvider.AGE_WEIGHT)
+        return((local[0] * localWeight + remote[0] * remoteWeight) / (localWeight + remoteWeight))
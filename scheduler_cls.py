@@ -0,0 +1,94 @@
+# Timer scheduler for the main loop
+# Jobs are kept in a min-heap sorted by when they are due, so the main loop can ask exactly how long
+# it can sleep (timeUntilNext()) and then run whatever is due (runPending()).
+# Uses time.monotonic() so timers don't jump when NTP sets the clock after boot.
+# clock can be replaced with a fake clock for testing, see tests/test_scheduler.py.
+
+import heapq
+import itertools
+import time
+
+
+class scheduledJob:
+
+    __slots__ = ('name', 'func', 'interval', 'due', 'cancelled')
+
+    def __init__(self, name, func, interval, due):
+        self.name      = name
+        self.func      = func
+        self.interval  = interval  # seconds between runs, None for one-shot job
+        self.due       = due       # clock time when job runs next
+        self.cancelled = False
+
+
+class scheduler:
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.heap  = []                 # entries are [due, sequence number, job]
+        self.seq   = itertools.count()  # tie breaker so jobs due at the same time run in order they were added
+
+    def _push(self, job):
+        heapq.heappush(self.heap, [job.due, next(self.seq), job])
+
+    # Run func every interval seconds.  First run is after delay seconds, default is interval
+    def every(self, interval, func, name=None, delay=None):
+        if delay is None:
+            delay = interval
+        job = scheduledJob(name or func.__name__, func, interval, self.clock() + delay)
+        self._push(job)
+        return(job)
+
+    # Run func once after delay seconds
+    def after(self, delay, func, name=None):
+        job = scheduledJob(name or func.__name__, func, None, self.clock() + delay)
+        self._push(job)
+        return(job)
+
+    # Move job so it runs delay seconds from now.  Also re-arms a one-shot job that already ran
+    def reschedule(self, job, delay):
+        job.due = self.clock() + delay
+        job.cancelled = False
+        self._push(job)  # old heap entry is skipped when it comes up because its due time no longer matches
+
+    def cancel(self, job):
+        job.cancelled = True
+
+    # Drops heap entries for cancelled or rescheduled jobs
+    def _skipStale(self):
+        heap = self.heap
+        while heap and (heap[0][2].cancelled or heap[0][0] != heap[0][2].due):
+            heapq.heappop(heap)
+
+    # Seconds until the next job is due, 0 if one is already due, None if there are no jobs
+    def timeUntilNext(self):
+        self._skipStale()
+        if not self.heap:
+            return(None)
+        return(max(0.0, self.heap[0][0] - self.clock()))
+
+    # Runs all jobs that are due.  Returns number of jobs run
+    def runPending(self):
+        numRun = 0
+        now = self.clock()
+        while True:
+            self._skipStale()
+            if not self.heap or self.heap[0][0] > now:
+                return(numRun)
+            due, seq, job = heapq.heappop(self.heap)
+            if job.interval is not None:
+                # Periodic job, keep it on a fixed schedule.  If it fell behind, don't try to catch up
+                job.due = due + job.interval
+                if job.due <= now:
+                    job.due = now + job.interval
+                self._push(job)
+            else:
+                job.cancelled = True # one-shot job is done
+            job.func()
+            numRun += 1
+
+
+# Seconds from now until the next local midnight, uses wall clock time since that's what defines a day
+def secondsUntilMidnight():
+    now = time.localtime()
+    return((24 * 3600) - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec))
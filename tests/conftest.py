@@ -0,0 +1,13 @@
+# The station modules live at the top of the repo and aren't a package, so put the repo on the path
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# WU_credentials.py isn't in the Git repo.  The tests don't send anything, so if it's missing use a stand in
+try:
+    import WU_credentials
+except ImportError:
+    sys.modules['WU_credentials'] = types.SimpleNamespace(WU_PASSWORD="test", WU_STATION_ID_SUNTEC="TEST",
+                                                          WU_STATION_ID_TEST="TEST", WU_API_KEY="test")
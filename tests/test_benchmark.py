@@ -0,0 +1,9 @@
+# Checks the WU_benchmark.py fixtures are packets the station accepts, so the benchmarks time the normal path
+import WU_benchmark
+import WU_decodeWirelessData as decode
+
+
+def test_fixturesDecode():
+    station = WU_benchmark.makeStation()  # asserts every packet decodes
+    assert 0 <= decode.humidity(WU_benchmark.PACKETS['humidity']) <= 100
+    assert station.pressure == 30.01
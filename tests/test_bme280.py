@@ -0,0 +1,86 @@
+# Checks bme280_cls.bme280Sensor against the real adafruit_bme280 driver, with the BME280 registers faked on smbus
+import struct
+import sys
+import threading
+
+import pytest
+
+import bme280_cls
+
+# Calibration and raw readings from the compensation example in the BME280 datasheet: 25.08 C, 1006.53 hPa
+TEMP_CALIB = (27504, 26435, -1000)
+PRESSURE_CALIB = (36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+RAW_TEMPERATURE = 519888
+RAW_PRESSURE = 415148
+
+
+# smbus.SMBus with a BME280 at address
+class fakeBus:
+
+    def __init__(self, address=0x77):
+        self.address = address
+        self.registers = bytearray(256)
+        self.registers[0xD0] = 0x60  # chip ID
+        self.registers[0x88:0x88 + 24] = struct.pack("<HhhHhhhhhhhh", *(TEMP_CALIB + PRESSURE_CALIB))
+        self.registers[0xF7:0xFA] = (RAW_PRESSURE << 4).to_bytes(3, "big")
+        self.registers[0xFA:0xFD] = (RAW_TEMPERATURE << 4).to_bytes(3, "big")
+        self.fail = False
+
+    def _check(self, address):
+        if address != self.address or self.fail:
+            raise OSError(121, "Remote I/O error")
+
+    def read_byte(self, address):
+        self._check(address)
+        return(0)
+
+    def read_i2c_block_data(self, address, register, length):
+        self._check(address)
+        return(list(self.registers[register:register + length]))
+
+    def write_i2c_block_data(self, address, register, data):
+        self._check(address)
+        if register == 0xE0:  # soft reset
+            return
+        self.registers[register:register + len(data)] = bytes(data)
+
+
+def test_readsWithRealDriver():
+    pytest.importorskip("adafruit_bme280.advanced")
+    bus = fakeBus()
+    sensor = bme280_cls.bme280Sensor(bus, threading.Lock(), clock=lambda: 0.0)
+    pressure, temperature = sensor.sample()
+    assert pressure == pytest.approx(1006.53, abs=0.01)
+    assert temperature == pytest.approx(25.08, abs=0.01)
+    assert bus.registers[0xF4] == (5 << 5) | (5 << 2) | 3  # 16x oversampling, normal mode
+    assert sensor.reading() == pytest.approx([pressure, temperature])
+
+
+def test_missingSensorIsRetried():
+    pytest.importorskip("adafruit_bme280.advanced")
+    now = [0.0]
+    sensor = bme280_cls.bme280Sensor(fakeBus(address=0x76), threading.Lock(), clock=lambda: now[0])
+    assert sensor.sample() is None
+    now[0] += bme280_cls.bme280Sensor.OPEN_RETRY
+    sensor.address = 0x76
+    assert sensor.sample() is not None
+
+
+def test_readErrorSkipsSample():
+    pytest.importorskip("adafruit_bme280.advanced")
+    bus = fakeBus()
+    sensor = bme280_cls.bme280Sensor(bus, threading.Lock(), clock=lambda: 0.0)
+    sensor.sample()
+    bus.fail = True
+    assert sensor.sample() is None
+    assert sensor.errors == 1
+
+
+def test_missingDriverIsNoSensor(monkeypatch):
+    monkeypatch.setitem(sys.modules, "adafruit_bme280", None)  # import fails like it isn't installed
+    lock = threading.Lock()
+    sensor = bme280_cls.bme280Sensor(fakeBus(), lock, clock=lambda: 0.0)
+    assert sensor.sample() is None
+    assert sensor.sensor is None
+    assert sensor.reading() is None
+    assert not lock.locked()
@@ -0,0 +1,106 @@
+# Checks checkpoint_cls.py saving and loading, and that Weather_Station.py restores the station from it
+import json
+import math
+import os
+import time
+
+import pytest
+
+import checkpoint_cls
+import Weather_Station
+import WU_decodeWirelessData
+import WU_packetHandlers
+import weatherData_cls
+
+
+@pytest.fixture
+def path(tmp_path):
+    return(str(tmp_path / "station_state.json"))
+
+
+def test_saveWritesTempFileThenReplaces(path, monkeypatch):
+    saver = checkpoint_cls.checkpoint(path)
+    assert saver.save({'n': 1})
+    assert not os.path.exists(path + ".tmp")
+
+    replaced = []
+    def failingReplace(src, dst):
+        replaced.append((src, dst))
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(checkpoint_cls.os, "replace", failingReplace)
+    assert saver.save({'n': 2}) == False
+    assert replaced == [(path + ".tmp", path)]
+    assert saver.load()[0] == {'n': 1}  # old checkpoint still there
+
+
+def test_loadRejectsOtherDayAndVersion(path):
+    saver = checkpoint_cls.checkpoint(path)
+    saver.save({'n': 1})
+    with open(path) as f:
+        record = json.load(f)
+
+    for change in [{'day': "2000-01-01"}, {'version': checkpoint_cls.CHECKPOINT_VERSION - 1}]:
+        with open(path, "w") as f:
+            json.dump(dict(record, **change), f)
+        assert saver.load() is None
+
+    with open(path, "w") as f:
+        f.write('{"version": 2, "sa')  # half written file from before the temp file was used
+    assert saver.load() is None
+
+
+def test_nanSurvivesRoundTrip(path):
+    saver = checkpoint_cls.checkpoint(path)
+    saver.save({'values': [1.5, math.nan]})
+    state, elapsed = saver.load()
+    assert state['values'][0] == 1.5
+    assert math.isnan(state['values'][1])
+    assert 0 <= elapsed < 5
+
+
+def test_stationAgesIncludeElapsed():
+    now = [100.0]
+    station = weatherData_cls.weatherStation(1, clock=lambda: now[0])
+    station.outsideTemp = 72.5
+    now[0] = 160.0
+    state = json.loads(json.dumps(station.getState()))
+
+    later = [5.0]  # RPi rebooted, monotonic clock started over
+    restored = weatherData_cls.weatherStation(1, clock=lambda: later[0])
+    restored.setState(state, elapsed=30.0)
+    assert restored.outsideTemp == 72.5
+    assert restored.age('outsideTemp') == 60.0 + 30.0
+    assert math.isnan(restored.age('humidity'))
+    assert math.isnan(restored.humidity)
+
+
+@pytest.mark.parametrize("elapsed, windRestored", [(60.0, True), (Weather_Station.WIND_RESTORE_MAX_AGE + 1, False)])
+def test_windOnlyRestoredFromRecentCheckpoint(monkeypatch, elapsed, windRestored):
+    now = [1000.0]
+    station = weatherData_cls.weatherStation(1, clock=lambda: now[0])
+    for n in range(weatherData_cls.weatherStation.AVG_WIND_DIR_NUM_DATA_POINTS):
+        station.avgWindDir(90)
+    state = {'station': station.getState(), 'rainCounter': {'rainCounterOld': 12, 'rainCntDataPts': 3}}
+
+    rainHandler = WU_packetHandlers.PACKET_HANDLERS[WU_decodeWirelessData.ISS_RAIN_COUNT]
+    monkeypatch.setattr(rainHandler, "rainCounterOld", rainHandler.rainCounterOld)
+    monkeypatch.setattr(rainHandler, "rainCntDataPts", rainHandler.rainCntDataPts)
+    restored = weatherData_cls.weatherStation(1, clock=lambda: now[0])
+    monkeypatch.setattr(Weather_Station, "suntec", restored)
+    Weather_Station.restoreStation(state, elapsed)
+
+    assert rainHandler.getState() == {'rainCounterOld': 12, 'rainCntDataPts': 3}
+    assert restored.windDir == 90
+    assert restored.windAverager.isReady() == windRestored
+    assert (restored.windAverager.count > 0) == windRestored
+
+
+def test_statsTimesIncludeElapsed(monkeypatch):
+    for name in ("g_lastUploadTime", "g_lastNewISSTime", "g_hourStartCounts", "g_i2cDailyErrors"):
+        monkeypatch.setattr(Weather_Station, name, getattr(Weather_Station, name))
+    Weather_Station.restoreStats({'counters': {}, 'hourStart': {'x': 1}, 'lastUploadAge': 40.0,
+                                  'lastNewISSAge': 10.0, 'i2cDailyErrors': 7}, 20.0)
+    now = time.monotonic()
+    assert now - Weather_Station.g_lastUploadTime == pytest.approx(60.0, abs=1)
+    assert now - Weather_Station.g_lastNewISSTime == pytest.approx(30.0, abs=1)
+    assert Weather_Station.g_i2cDailyErrors == 7
@@ -0,0 +1,29 @@
+# Checks WU_decodeBatch.decodeBatch() against the scalar parsePacket() and crc16_ccitt_table()
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import WU_decodeBatch
+import WU_decodeWirelessData as decode
+
+
+def test_decodeBatchMatchesScalar():
+    rng = np.random.default_rng(216)
+    packets = rng.integers(0, 256, size=(100000, decode.PACKET_LENGTH), dtype=np.uint8)
+    # Give every other packet a valid CRC
+    for row in packets[::2]:
+        row[:] = decode.addCRC(row.tolist())
+
+    fieldForType = { decode.ISS_OUT_TEMP: 'temperature', decode.ISS_HUMIDITY: 'humidity', decode.ISS_RAIN_COUNT: 'rainCounter',
+                     decode.ISS_RAIN_SECONDS: 'rainSeconds', decode.ISS_UV_INDEX: 'uvIndex', decode.ISS_SOLAR_RAD: 'solar',
+                     decode.ISS_CAP_VOLTS: 'capVolts' }
+    out = WU_decodeBatch.decodeBatch(packets)
+    for row, rec in zip(packets.tolist(), out):
+        pkt = decode.parsePacket(row)
+        assert bool(rec['crcOK']) == decode.crc16_ccitt_table(row), row
+        assert (rec['stationID'], rec['battery'], rec['windDir']) == (pkt.stationID, pkt.battery, pkt.windDir), row
+        assert pkt.windSpeed == (decode.ERR_OUT_OF_RANGE if np.isnan(rec['windSpeed']) else rec['windSpeed']), row
+        field = fieldForType.get(pkt.packetType)
+        if field is not None:
+            batchValue = decode.ERR_OUT_OF_RANGE if np.isnan(rec[field]) else rec[field]
+            assert np.isclose(batchValue, pkt.value), (field, row)
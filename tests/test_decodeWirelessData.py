@@ -0,0 +1,47 @@
+# Checks the fast decoders in WU_decodeWirelessData.py against the reference ones
+import math
+import random
+
+import WU_decodeWirelessData as decode
+
+
+# Table driven and batch CRC against reference crc16_ccitt() using random packets.  Half the packets get
+# a correct CRC so both the pass and fail paths are checked
+def test_crcTableMatchesReference():
+    rnd = random.Random(216)
+    batch = bytearray()
+    expected = []
+    for n in range(10000):
+        packet = bytearray(rnd.getrandbits(8) for i in range(decode.PACKET_LENGTH))
+        if (n % 2 == 0):
+            decode.addCRC(packet)
+        reference = decode.crc16_ccitt(packet)
+        assert decode.crc16_ccitt_table(packet) == reference, packet.hex()
+        batch += packet
+        expected.append(reference)
+    assert decode.crc16_ccitt_batch(batch) == expected
+
+
+# parsePacket() against the scalar decoders for every byte 3-4 combination of each packet type
+def test_parsePacketMatchesScalarDecoders():
+    scalarDecoders = { decode.ISS_CAP_VOLTS: decode.capVoltage, decode.ISS_UV_INDEX: decode.uvIndex,
+                       decode.ISS_RAIN_SECONDS: decode.rainRate, decode.ISS_SOLAR_RAD: decode.solarRadiation,
+                       decode.ISS_OUT_TEMP: decode.temperature, decode.ISS_WIND_GUST: decode.windGusts,
+                       decode.ISS_HUMIDITY: decode.humidity, decode.ISS_RAIN_COUNT: decode.rainCounter }
+    for packetType in range(16):
+        for b34 in range(65536):
+            packet = [(packetType << 4) | (b34 & 0xF), b34 & 0xFF, b34 >> 8, b34 >> 8, b34 & 0xFF, 0, 0, 0]
+            pkt = decode.parsePacket(packet)
+            assert (pkt.stationID, pkt.battery, pkt.windSpeed, pkt.windDir) == \
+                   (decode.stationID(packet), decode.batteryStatus(packet), decode.windSpeed(packet), decode.windDirection(packet)), packet
+            if packetType in scalarDecoders:
+                assert pkt.value == scalarDecoders[packetType](packet), packet
+
+
+# Wind direction lookup tables against windDirection() and the math.cos()/math.sin() calls avgWindDir() used to make
+def test_windTables():
+    for raw in range(256):
+        windDir = decode.windDirection([0, 0, raw, 0, 0, 0, 0, 0])
+        assert decode.WIND_DIR_DEGREES[raw] == windDir
+        assert decode.WIND_DIR_NORTH_SOUTH[raw] == math.cos(math.radians(windDir))
+        assert decode.WIND_DIR_EAST_WEST[raw] == math.sin(math.radians(windDir))
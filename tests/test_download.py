@@ -0,0 +1,64 @@
+# Checks WU_download.getPressureObservation() picks the right nearby station, caches it and gives up on time
+import threading
+import time
+
+import pytest
+
+import WU_download
+
+
+# Replaces getStationPressure() with replies[stationID] = (seconds to wait, pressure, observation age)
+# Returns list of station IDs asked, in order
+@pytest.fixture
+def stations(monkeypatch):
+    monkeypatch.setattr(WU_download, "_pressureCache", None)
+    release = threading.Event()
+    asked = []
+    def install(replies):
+        def getStationPressure(stationID):
+            asked.append(stationID)
+            wait, pressure, age = replies[stationID]
+            release.wait(wait)
+            if pressure < 0:
+                return([pressure, 0, stationID])
+            return([pressure, time.time() - age, stationID])
+        monkeypatch.setattr(WU_download, "WU_STATIONS", list(replies))
+        monkeypatch.setattr(WU_download, "getStationPressure", getStationPressure)
+        return(asked)
+    yield install
+    release.set()  # let anything still waiting in the background finish
+
+
+def test_firstFreshReadingWins(stations):
+    stations({'SLOW': (0.3, 30.10, 60), 'FAST': (0.0, 30.02, 60), 'BROKEN': (0.0, WU_download.ERR_INVALID_DATA, 0)})
+    assert WU_download.getPressureObservation()[::2] == [30.02, 'FAST']
+
+
+def test_staleReadingsRejected(stations):
+    tooOld = WU_download.MAX_PRESSURE_AGE + 60
+    stations({'STALE': (0.0, 29.90, tooOld), 'FRESH': (0.1, 30.05, 60)})
+    assert WU_download.getPressureObservation()[::2] == [30.05, 'FRESH']
+
+    WU_download._pressureCache = None
+    stations({'STALE': (0.0, 29.90, tooOld), 'STALE2': (0.0, 29.95, tooOld)})
+    assert WU_download.getPressureObservation()[0] == WU_download.ERR_INVALID_DATA
+
+
+def test_cacheSavesCalls(stations):
+    asked = stations({'A': (0.0, 30.02, 60)})
+    first = WU_download.getPressureObservation()
+    assert WU_download.getPressureObservation() is first
+    assert asked == ['A']
+
+    WU_download._pressureCache = [30.02, time.time() - WU_download.PRESSURE_CACHE_TTL - 1, 'A']  # observation too old to reuse
+    WU_download.getPressureObservation()
+    assert asked == ['A', 'A']
+
+
+def test_deadline(stations, monkeypatch):
+    monkeypatch.setattr(WU_download, "PRESSURE_DEADLINE", 0.1)
+    stations({'A': (5.0, 30.02, 60), 'B': (5.0, 30.03, 60)})
+    startTime = time.monotonic()
+    assert WU_download.getPressureObservation() == [WU_download.ERR_FAILED_GET, 0, None]
+    assert time.monotonic() - startTime < 1.0
+    assert WU_download._pressureCache is None  # failures aren't cached
@@ -0,0 +1,59 @@
+# Checks WU_metrics.py histogram buckets, quantiles and the text format
+import urllib.request
+
+import WU_metrics
+
+
+def makeRegistry():
+    testRegistry = WU_metrics.registry()
+    packets = testRegistry.counter("test_packets_total", "Packets")
+    testRegistry.gauge("test_queue_depth", "Queue depth", function=lambda: 3)
+    latency = testRegistry.histogram("test_seconds", "Latency", buckets=(0.1, 0.2, 0.5))
+    packets.inc()
+    packets.inc(2)
+    for value in (0.05, 0.15, 0.15, 0.3, 0.7):
+        latency.observe(value)
+    return(testRegistry, latency)
+
+
+def test_render():
+    testRegistry, latency = makeRegistry()
+    lines = testRegistry.render().split("\n")
+    for line in ['test_packets_total 3', 'test_queue_depth 3', 'test_seconds_bucket{le="0.1"} 1', 'test_seconds_bucket{le="0.2"} 3',
+                 'test_seconds_bucket{le="0.5"} 4', 'test_seconds_bucket{le="+Inf"} 5', 'test_seconds_count 5']:
+        assert line in lines
+
+
+def test_quantiles():
+    testRegistry, latency = makeRegistry()
+    assert abs(latency.quantile(0.5) - 0.175) < 1e-9
+    assert latency.quantile(0.99) == 0.5
+    assert testRegistry.counterValues() == {"test_packets_total": 3}
+
+
+def test_brokenGaugeDoesntStopRender():
+    testRegistry = WU_metrics.registry()
+    testRegistry.gauge("test_broken", "Broken", function=lambda: 1 / 0)
+    testRegistry.counter("test_ok_total", "OK").inc()
+    assert "test_ok_total 1" in testRegistry.render()
+
+
+def test_server():
+    testRegistry, latency = makeRegistry()
+    server = WU_metrics.startServer(0, "127.0.0.1", testRegistry)
+    try:
+        with urllib.request.urlopen("http://127.0.0.1:{}/metrics".format(server.server_address[1]), timeout=5) as response:
+            assert "test_packets_total 3" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_serverIsLocalByDefault():
+    testRegistry, latency = makeRegistry()
+    server = WU_metrics.startServer(0, metricsRegistry=testRegistry)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,67 @@
+# Checks moteinoReady_cls.moteinoReadySignal and WU_transport.i2cTransport only read the Moteino while its ready pin is high
+import threading
+import time
+
+import WU_transport
+from moteinoReady_cls import moteinoReadySignal
+
+
+# Ready pin with edge detection.  Reading the Moteino takes the packet, so the pin goes low
+class fakeMoteino:
+    RISING = 31
+
+    def __init__(self):
+        self.level = 0
+        self.callback = None
+        self.readLevels = []  # pin level at each I2C read
+
+    def add_event_detect(self, pin, edge, callback):
+        self.callback = callback
+
+    def input(self, pin):
+        return(self.level)
+
+    def newPacket(self):
+        self.level = 1
+        self.callback(pin)
+
+    def read_i2c_block_data(self, address, offset, length):
+        self.readLevels.append(self.level)
+        self.level = 0
+        return([0] * length)
+
+pin = 33
+
+
+def test_waitIgnoresStaleEdge():
+    moteino = fakeMoteino()
+    signal = moteinoReadySignal(moteino, pin)
+    moteino.newPacket()
+    moteino.level = 0                # packet was read through isReady(), edge is still set
+    assert signal.wait(0.05) == False
+    moteino.newPacket()
+    assert signal.wait(0.05) == True
+
+
+def test_transportReadsOnlyWhenReady():
+    moteino = fakeMoteino()
+    signal = moteinoReadySignal(moteino, pin)
+    transport = WU_transport.i2cTransport(moteino, 0x04, signal, threading.Lock(), minInterval=0)
+    moteino.newPacket()
+    assert transport.read(0.05) is not None  # pin already high, read through isReady() path
+    assert transport.read(0.05) is None      # edge from that packet mustn't cause another read
+    assert moteino.readLevels == [1]
+
+
+def test_transportWaitsWhileResetting():
+    moteino = fakeMoteino()
+    signal = moteinoReadySignal(moteino, pin)
+    transport = WU_transport.i2cTransport(moteino, 0x04, signal, threading.Lock(), healthCheck=lambda: False, minInterval=0.05)
+    moteino.newPacket()              # ready pin stays high while the Moteino is being reset
+    reads = 0
+    deadline = time.monotonic() + 0.3
+    while time.monotonic() < deadline:
+        assert transport.read(1.0) is None
+        reads += 1
+    assert reads <= 7                # once every minInterval, not a busy loop
+    assert moteino.readLevels == []
@@ -0,0 +1,86 @@
+# Runs moteinoReset_cls.py resets with a fake clock and GPIO and checks the pin, states, backoff and escalation
+import moteinoReset_cls
+from moteinoReset_cls import moteinoResetter
+
+
+class fakeGPIO:
+    def __init__(self, clock):
+        self.clock = clock
+        self.pin = []  # (time, level)
+
+    def output(self, pin, level):
+        self.pin.append((self.clock(), level))
+
+
+def makeResetter():
+    now = [0.0]
+    clock = lambda: now[0]
+    escalations = []
+    gpio = fakeGPIO(clock)
+    resetter = moteinoResetter(gpio, 36, clock=clock, onEscalate=lambda failures, reason: escalations.append(failures))
+    return(resetter, gpio, now, escalations)
+
+
+# Runs step() until reset is done, returns time it finished
+def runReset(resetter, now):
+    wait = resetter.step()
+    while wait is not None:
+        now[0] += wait
+        wait = resetter.step()
+    return(now[0])
+
+
+def test_resetPulse():
+    resetter, gpio, now, escalations = makeResetter()
+    assert resetter.request("heartbeat")
+    assert not resetter.request("I2C errors")  # already running
+    assert resetter.state == moteinoReset_cls.ASSERTING
+    assert runReset(resetter, now) == moteinoReset_cls.PULSE_TIME + moteinoReset_cls.SETTLE_TIME + moteinoReset_cls.BOOT_TIME
+    assert gpio.pin == [(0.0, 0), (moteinoReset_cls.PULSE_TIME, 1)]
+    assert resetter.state == moteinoReset_cls.READY
+
+
+def test_backoffAndEscalation():
+    resetter, gpio, now, escalations = makeResetter()
+    resetter.request("heartbeat")
+    runReset(resetter, now)
+
+    now[0] += 1
+    assert not resetter.request("no new data")  # too soon after first reset
+    resetter.markHealthy(now[0])                # a good packet, so next reset is allowed right away
+    assert resetter.request("no new data")
+    runReset(resetter, now)
+
+    # Resets that don't help: each waits longer, and the 3rd failure escalates
+    gaps = []
+    for _ in range(moteinoReset_cls.ESCALATE_AFTER):
+        finished = now[0]
+        while not resetter.request("no new data"):
+            now[0] += 1
+        gaps.append(now[0] - finished)
+        runReset(resetter, now)
+    base = moteinoReset_cls.BACKOFF_BASE
+    assert gaps == [base, base * 2, base * 4]
+    assert escalations == [moteinoReset_cls.ESCALATE_AFTER]
+    assert resetter.escalated()
+    assert resetter.resets == 5
+
+
+def test_packetsFromBeforeResetDontCount():
+    resetter, gpio, now, escalations = makeResetter()
+    resetter.request("heartbeat")
+    runReset(resetter, now)
+    for _ in range(moteinoReset_cls.ESCALATE_AFTER):
+        readTime = now[0] - 1                   # packet read before the reset, decoded after
+        while not resetter.request("no new data"):
+            now[0] += 1
+        resetter.step()
+        resetter.markHealthy(now[0])            # read while the reset is running
+        runReset(resetter, now)
+        resetter.markHealthy(readTime)
+    assert escalations == [moteinoReset_cls.ESCALATE_AFTER]
+    assert not resetter.healthy
+
+    resetter.markHealthy(now[0])                # read after the reset finished
+    assert resetter.healthy
+    assert resetter.failures == 0
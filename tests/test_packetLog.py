@@ -0,0 +1,56 @@
+# Checks the WU_packetLog.py writer: records, daily files, a partial record from a power cut, and write errors
+import os
+
+import WU_packetLog
+
+PACKET = [0x80, 0x05, 0x64, 0x02, 0x89, 0x00, 0x12, 0x34]
+
+
+# Returns [(timestamp, packet), ...] from a log file
+def readRecords(path):
+    with open(path, "rb") as f:
+        return([(t, list(packet)) for t, packet in WU_packetLog.RECORD.iter_unpack(f.read())])
+
+
+def setDay(monkeypatch, day):
+    monkeypatch.setattr(WU_packetLog.time, "strftime", lambda fmt: day)
+
+
+def test_newFileEachDay(tmp_path, monkeypatch):
+    log = WU_packetLog.packetLog(str(tmp_path))
+    setDay(monkeypatch, "20261018")
+    log.append(PACKET, timestamp=1)
+    log.append(PACKET, timestamp=2)
+    setDay(monkeypatch, "20261019")
+    log.append(PACKET, timestamp=3)
+    log.close()
+    assert [os.path.basename(p) for p in WU_packetLog.logFiles(str(tmp_path))] == ["packets_20261018.bin", "packets_20261019.bin"]
+    assert readRecords(log.path("20261018")) == [(1, PACKET), (2, PACKET)]
+    assert readRecords(log.path("20261019")) == [(3, PACKET)]
+
+
+def test_partialRecordDroppedOnReopen(tmp_path, monkeypatch):
+    setDay(monkeypatch, "20261018")
+    log = WU_packetLog.packetLog(str(tmp_path))
+    with open(log.path("20261018"), "wb") as f:
+        f.write(WU_packetLog.RECORD.pack(1, bytes(PACKET)) + b"\x07" * 5)  # power cut part way through the 2nd record
+    log.append(PACKET, timestamp=2)
+    log.close()
+    assert os.path.getsize(log.path("20261018")) == 2 * WU_packetLog.RECORD_SIZE
+    assert readRecords(log.path("20261018")) == [(1, PACKET), (2, PACKET)]
+
+
+def test_writeErrorIsReportedAndRetried(tmp_path, monkeypatch, capsys):
+    setDay(monkeypatch, "20261018")
+    log = WU_packetLog.packetLog(str(tmp_path))
+    def diskError(path, mode):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(WU_packetLog, "open", diskError, raising=False)
+    log.append(PACKET, timestamp=1)  # mustn't raise into the reader thread
+    assert "Error writing packet log" in capsys.readouterr().out
+    assert log.file is None
+
+    monkeypatch.delattr(WU_packetLog, "open")
+    log.append(PACKET, timestamp=2)  # opens the file again
+    log.close()
+    assert readRecords(log.path("20261018")) == [(2, PACKET)]
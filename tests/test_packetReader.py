@@ -0,0 +1,101 @@
+# Checks the packet reader thread in Weather_Station.py keeps going after errors
+import threading
+import time
+
+import Weather_Station
+
+
+class fakeTransport:
+    ready = True
+    readSeconds = None
+
+    def __init__(self, packets):
+        self.packets = list(packets)
+
+    def read(self, timeout):
+        if not self.packets:
+            time.sleep(timeout)
+            return(None)
+        return(self.packets.pop(0))
+
+
+class brokenPacketLog:
+    def __init__(self):
+        self.calls = 0
+
+    def append(self, packet):
+        self.calls += 1
+        if self.calls == 1:
+            raise ValueError("disk full")
+
+
+class fakeQueue:
+    def put_nowait(self, packet):
+        pass
+
+
+class fakeLoop:
+    def __init__(self):
+        self.queued = []
+
+    def call_soon_threadsafe(self, func, *args):
+        self.queued.append(args[0])
+
+
+def test_readerSurvivesUnexpectedError(monkeypatch):
+    monkeypatch.setattr(Weather_Station, "READER_ERROR_WAIT", 0)
+    monkeypatch.setattr(Weather_Station, "g_packetLog", brokenPacketLog(), raising=False)
+    errors = Weather_Station.READER_ERRORS.value
+    loop = fakeLoop()
+    packets = [[0x80, 1, 2, 3, 4, 5, 6, 7], [0xA0, 1, 2, 3, 4, 5, 6, 7]]
+    threading.Thread(target=Weather_Station.packetReader, args=(loop, fakeQueue(), fakeTransport(packets)), daemon=True).start()
+
+    deadline = time.monotonic() + 5
+    while not loop.queued and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [packet for packet, readTime in loop.queued] == [packets[1]]  # first packet hit the error, reader carried on with the second
+    assert Weather_Station.READER_ERRORS.value == errors + 1
+
+
+class stuckHeartbeat:
+    def input(self, pin):
+        return(0)
+
+
+def test_heartbeatResetRequestedOnce(monkeypatch):
+    loop = fakeLoop()
+    monkeypatch.setattr(Weather_Station, "GPIO", stuckHeartbeat())
+    monkeypatch.setattr(Weather_Station, "g_loop", loop, raising=False)
+    monkeypatch.setattr(Weather_Station, "g_heartbeatOld", 0, raising=False)
+    monkeypatch.setattr(Weather_Station, "g_lastHeartbeatTime", time.monotonic() - 600, raising=False)
+    monkeypatch.setattr(Weather_Station, "g_heartbeatResetTime", None)
+    for _ in range(1000):            # reader checking the heartbeat while the ready pin is high
+        assert Weather_Station.isHeartbeatOK() == False
+    assert loop.queued == ["No Moteino heartbeat"]
+
+    monkeypatch.setattr(Weather_Station, "g_heartbeatOld", 1)  # heartbeat came back
+    assert Weather_Station.isHeartbeatOK() == True
+    assert Weather_Station.g_heartbeatResetTime is None
+
+
+class recordingPacketLog:
+    def __init__(self):
+        self.packets = []
+
+    def append(self, packet):
+        self.packets.append(packet)
+
+
+def test_repeatedPacketsAreLogged(monkeypatch):
+    packetLog = recordingPacketLog()
+    monkeypatch.setattr(Weather_Station, "g_packetLog", packetLog, raising=False)
+    monkeypatch.setattr(Weather_Station, "g_rawDataNew", [0] * 8)
+    loop = fakeLoop()
+    packet = [0x80, 1, 2, 3, 4, 5, 6, 7]
+    threading.Thread(target=Weather_Station.packetReader, args=(loop, fakeQueue(), fakeTransport([packet] * 3)), daemon=True).start()
+
+    deadline = time.monotonic() + 5
+    while len(packetLog.packets) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert packetLog.packets == [packet] * 3     # Moteino stuck sending the same packet shows up in the log
+    assert [p for p, readTime in loop.queued] == [packet]  # only decoded once
@@ -0,0 +1,30 @@
+# Checks local/remote pressure selection in pressure_cls.py with a fake clock and fake sensors
+import time
+
+import pressure_cls
+from pressure_cls import pressureProvider
+
+
+def test_pressureSelection():
+    fakeTime = [1000.0]
+    localReading  = [[1000.0, 15.0]]
+    remoteReading = [[29.50, time.time(), 'TEST']]
+    provider = pressureProvider(lambda: localReading[0], lambda: remoteReading[0], 0, clock=lambda: fakeTime[0])
+
+    assert provider.pressure() is None
+    provider.updateRemote()
+    assert provider.pressure() == 29.50  # only remote
+    local = provider.sampleLocal()       # 1000 hPa at sea level = 29.53 inHg, agrees with remote
+    assert abs(local - 1000.0 / pressure_cls.HPA_PER_INHG) < 0.001
+    assert provider.pressure() == local
+    remoteReading[0] = [29.00, time.time(), 'TEST']
+    provider.updateRemote()              # disagrees, blend of 29.53 and 29.00
+    assert 29.00 < provider.pressure() < local
+    fakeTime[0] += pressureProvider.LOCAL_MAX_AGE + 1
+    assert provider.pressure() == 29.00  # local is stale
+    localReading[0] = None
+    assert provider.sampleLocal() is None
+
+
+def test_seaLevelPressure():
+    assert abs(pressure_cls.seaLevelPressure(950.0, 500, 15.0) - 1007.7) < 0.5
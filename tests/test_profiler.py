@@ -0,0 +1,51 @@
+# Checks WU_profiler.py sampling, the summary and the busy estimate with a fake clock
+import WU_profiler
+
+
+def test_summary():
+    now = [100.0]
+    testProfiler = WU_profiler.profiler(sampleRate=0.5, clock=lambda: now[0])
+    for _ in range(10):
+        with testProfiler.stage("decode"):
+            pass
+    testProfiler.stages["upload"].record(0.2, 0.01, 2)
+    testProfiler.stages["upload"].record(0.4, 0.03, 2)
+    now[0] += 10
+    summary = testProfiler.summary()
+    assert summary["decode"]['calls'] == 10
+    assert summary["decode"]['samples'] == 6  # first call, then every second call
+    upload = summary["upload"]
+    assert abs(upload['wallAvg'] - 0.3) < 1e-9
+    assert upload['wallMax'] == 0.4
+    assert abs(upload['busy'] - 0.12) < 1e-9  # 0.6 s * 2 / 10 s
+
+    now[0] += WU_profiler.WINDOW + 1
+    assert testProfiler.summary()["upload"]['samples'] == 0  # aged out of window
+
+
+def test_off():
+    assert WU_profiler.profiler(sampleRate=0).stage("decode") is WU_profiler._NULL_TIMER
+
+
+def test_rareStageIsTimed():
+    now = [0.0]
+    testProfiler = WU_profiler.profiler(sampleRate=0.01, clock=lambda: now[0])
+    for hour in range(5):
+        now[0] += 3600
+        with testProfiler.stage("dayRollover"):
+            now[0] += 0.5
+    with testProfiler.stage("dayRollover"):  # less than MIN_SAMPLE_INTERVAL after the last one
+        pass
+    stats = testProfiler.stages["dayRollover"]
+    assert [s[3] for s in stats.samples] == [1, 1, 1, 1, 1]
+    assert testProfiler.summary(window=10**6)["dayRollover"]['samples'] == 5
+
+
+def test_busyCountsUnsampledCalls():
+    now = [0.0]
+    testProfiler = WU_profiler.profiler(sampleRate=0.1, clock=lambda: now[0])
+    for _ in range(100):
+        with testProfiler.stage("decode"):
+            now[0] += 1
+    weights = [s[3] for s in testProfiler.stages["decode"].samples]
+    assert weights[0] == 1 and sum(weights) == 100
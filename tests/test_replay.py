@@ -0,0 +1,54 @@
+# Checks WU_replay.py plays recordings the way the station would have handled them
+import pytest
+
+import WU_decodeWirelessData as decode
+import WU_replay
+
+
+# Packets from station ID 1
+TEMPERATURE = decode.addCRC([0x80, 5, 100, 0x02, 0x89, 0, 0, 0])
+HUMIDITY = decode.addCRC([0xA0, 5, 100, 0x38, 0x25, 0, 0, 0])
+
+def rainCounter(count):
+    return(decode.addCRC([0xE0, 5, 100, count, 0x01, 0, 0, 0]))
+
+
+# Writes a text recording, TEXT_PACKET_INTERVAL seconds between packets
+def writeText(path, packets):
+    path.write_text("".join(" ".join("{:02X}".format(b) for b in p) + "\n" for p in packets))
+    return(str(path))
+
+
+def dailyRain(line):
+    return(float(line.split("&dailyrainin=")[1].split("&")[0]))
+
+
+def test_rainStartsOverEachDay(tmp_path):
+    day1 = writeText(tmp_path / "day1.txt", [rainCounter(10), TEMPERATURE, rainCounter(10), HUMIDITY, rainCounter(10), rainCounter(15)])
+    day2 = writeText(tmp_path / "day2.txt", [rainCounter(15), TEMPERATURE, rainCounter(17), HUMIDITY])
+    lines = []
+    stats = WU_replay.replay(WU_replay.readRecordings([day1, day2]), everyPacket=True, out=lines.append)
+    assert stats['days'] == 2
+    rain = [dailyRain(line) for line in lines if "dailyrainin" in line]
+    assert rain[:3] == [0.0, 0.0, 0.05]
+    assert rain[-1] == 0.02
+
+
+def test_lastUploadIsSent(tmp_path):
+    recording = writeText(tmp_path / "day.txt", [TEMPERATURE, HUMIDITY] * 5)  # 25 seconds
+    lines = []
+    stats = WU_replay.replay(WU_replay.readRecordings([recording]), uploadFreq=60, out=lines.append)
+    assert stats['observations'] == 1
+    assert lines[0].startswith("60.000\t")
+
+
+def test_rebootKeepsTimeGoingForward(tmp_path):
+    pytest.importorskip("numpy")
+    import WU_packetLog
+    path = tmp_path / "packets_20261018.bin"
+    times = [100, 102, 104, 5, 7]  # seconds, the RPi rebooted after the third packet
+    with open(path, "wb") as f:
+        for t, packet in zip(times, [TEMPERATURE, HUMIDITY, rainCounter(1), rainCounter(2), rainCounter(3)]):
+            f.write(WU_packetLog.RECORD.pack(t * 10**9, bytes(packet)))
+    seconds = [s for s, packet in WU_replay.readRecording(str(path))]
+    assert seconds == [0.0, 2.0, 4.0, 4.0, 6.0]
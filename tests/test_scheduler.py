@@ -0,0 +1,22 @@
+# Runs scheduler_cls.py jobs with a fake clock and checks they ran at the right times
+from scheduler_cls import scheduler
+
+
+def test_jobsRunOnTime():
+    fakeTime = [0.0]
+    sched = scheduler(clock=lambda: fakeTime[0])
+    ran = []
+    periodic = sched.every(10, lambda: ran.append(('periodic', fakeTime[0])))
+    sched.after(15, lambda: ran.append(('oneShot', fakeTime[0])))
+    watchdog = sched.after(20, lambda: ran.append(('watchdog', fakeTime[0])))
+
+    assert sched.timeUntilNext() == 10
+    while fakeTime[0] < 45:
+        fakeTime[0] += sched.timeUntilNext()
+        sched.runPending()
+        if fakeTime[0] == 10:
+            sched.reschedule(watchdog, 30)  # watchdog fed at 10, should fire at 40
+    sched.cancel(periodic)
+
+    assert ran == [('periodic', 10), ('oneShot', 15), ('periodic', 20), ('periodic', 30), ('watchdog', 40), ('periodic', 40), ('periodic', 50)]
+    assert sched.timeUntilNext() is None
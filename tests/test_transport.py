@@ -0,0 +1,82 @@
+# Checks WU_transport.py: openTransport() specs, file pacing and end of file, and socket datagrams
+import socket
+import threading
+import time
+
+import pytest
+
+import WU_transport
+
+PACKET = [0x80, 0x05, 0x64, 0x02, 0x89, 0x00, 0x12, 0x34]
+HEX = WU_transport.formatPacketText(PACKET)
+
+
+def test_openTransportSpecs(tmp_path):
+    recording = tmp_path / "packets.txt"
+    recording.write_text(HEX + "\n")
+
+    transport = WU_transport.openTransport("file:{}:0.5".format(recording))
+    assert (transport.name, transport.interval) == ("file", 0.5)
+    transport.close()
+    transport = WU_transport.openTransport("file:{}".format(recording))
+    assert transport.interval == 0
+    transport.close()
+
+    transport = WU_transport.openTransport("udp:127.0.0.1:0")
+    assert transport.sock.family == socket.AF_INET and transport.sock.getsockname()[0] == "127.0.0.1"
+    transport.close()
+
+    path = str(tmp_path / "weather.sock")
+    transport = WU_transport.openTransport("unix:" + path)
+    assert transport.sock.family == socket.AF_UNIX and transport.address == path
+    transport.close()
+
+    transport = WU_transport.openTransport("i2c", bus=None, address=0x04, readySignal=None, busLock=threading.Lock())
+    assert (transport.name, transport.address, transport.healthCheck) == ("i2c", 0x04, None)
+
+    with pytest.raises(ValueError):
+        WU_transport.openTransport("spi:0")
+
+
+def test_baseTransportHasNoRead():
+    with pytest.raises(NotImplementedError):
+        WU_transport.packetTransport().read(0)
+
+
+def test_filePacingAndEndOfFile(tmp_path):
+    recording = tmp_path / "packets.txt"
+    recording.write_text("# recorded packets\n\n{}\nnot a packet\n{}  (Temperature)\n{}\n".format(HEX, HEX, HEX))
+    transport = WU_transport.fileTransport(str(recording), interval=0.05)
+
+    startTime = time.monotonic()
+    assert [transport.read(1.0) for i in range(3)] == [PACKET] * 3
+    assert time.monotonic() - startTime >= 0.09     # 2nd and 3rd packets waited for the interval
+    assert transport.read(0.01) is None             # next one isn't due within the timeout
+    assert not transport.eof
+
+    time.sleep(0.05)
+    assert transport.read(0.01) is None             # nothing left
+    assert transport.eof and not transport.ready
+    transport.close()
+
+
+@pytest.mark.parametrize("family", ["udp", "unix"])
+def test_socketRawAndHexDatagrams(tmp_path, family):
+    if family == "udp":
+        transport = WU_transport.udpTransport("127.0.0.1", 0)
+        address = transport.sock.getsockname()
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    else:
+        address = str(tmp_path / "weather.sock")
+        transport = WU_transport.unixTransport(address)
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    with sender:
+        sender.sendto(bytes(PACKET), address)
+        sender.sendto(HEX.encode('ascii'), address)
+        sender.sendto(b"hello", address)
+    assert transport.read(1.0) == PACKET
+    assert transport.read(1.0) == PACKET
+    assert transport.read(1.0) is None and not transport.ready  # not a packet
+    assert transport.read(0.01) is None                         # timed out
+    transport.close()
@@ -0,0 +1,85 @@
+# Checks WU_uploadQueue.drain() keeps temporary failures queued and moves rejected records out of the way
+import time
+import types
+
+import pytest
+
+import WU_upload
+import WU_uploadQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    uploadDB = WU_uploadQueue.uploadQueue(str(tmp_path / "upload_queue.db"))
+    yield uploadDB
+    uploadDB.close()
+
+
+# Replaces sendToWU() with one that returns replies in order, and records the URLs
+def fakeSend(monkeypatch, replies):
+    sent = []
+    def sendToWU(url):
+        sent.append(url)
+        return(replies.pop(0))
+    monkeypatch.setattr(WU_upload, "sendToWU", sendToWU)
+    return(sent)
+
+
+def test_rejectedRecordDoesntBlockQueue(queue, monkeypatch):
+    for n in range(3):
+        queue.append("&tempf={}".format(n), timestamp=time.time() - 100 + n)
+    sent = fakeSend(monkeypatch, [[True, "No Errors", False], [False, "HTTP Response:400,  bad", True], [True, "No Errors", False]])
+    rejected = WU_uploadQueue.UPLOADS_REJECTED.value
+
+    assert WU_uploadQueue.drain(queue, "TEST") == [2, "No Errors"]
+    assert len(sent) == 3
+    assert queue.depth() == 0
+    assert [(r[2], r[3]) for r in queue.rejected()] == [("&tempf=1", "HTTP Response:400,  bad")]
+    assert WU_uploadQueue.UPLOADS_REJECTED.value == rejected + 1
+
+
+def test_temporaryFailureKeepsRecords(queue, monkeypatch):
+    for n in range(3):
+        queue.append("&tempf={}".format(n), timestamp=time.time() - 100 + n)
+    fakeSend(monkeypatch, [[True, "No Errors", False], [False, "ReadTimeout", False]])
+
+    assert WU_uploadQueue.drain(queue, "TEST") == [1, "ReadTimeout"]
+    assert [r[2] for r in queue.peek(10)] == ["&tempf=1", "&tempf=2"]  # still in order, nothing rejected
+    assert queue.rejected() == []
+
+
+def test_credentialErrorKeepsBacklog(queue, monkeypatch):
+    for n in range(3):
+        queue.append("&tempf={}".format(n), timestamp=time.time() - 100 + n)
+    message = "HTTP Response:200,  INVALIDPASSWORDID|Password or key and/or id are incorrect"
+    sent = fakeSend(monkeypatch, [[False, message, False]])
+
+    assert WU_uploadQueue.drain(queue, "TEST") == [0, message]
+    assert len(sent) == 1
+    assert queue.depth() == 3
+    assert queue.rejected() == []
+
+
+@pytest.mark.parametrize("status, text, expected", [
+    (200, "success\n", [True, "No Errors", False]),
+    (200, "INVALIDPASSWORDID|Password or key and/or id are incorrect", [False, "HTTP Response:200,  INVALIDPASSWORDID|Password or key and/or id are incorrect", False]),
+    (401, "unauthorized", [False, "HTTP Response:401,  unauthorized", False]),
+    (403, "forbidden", [False, "HTTP Response:403,  forbidden", False]),
+    (400, "bad request", [False, "HTTP Response:400,  bad request", True]),
+    (503, "unavailable", [False, "HTTP Response:503,  unavailable", False]),
+    (429, "slow down", [False, "HTTP Response:429,  slow down", False]),
+])
+def test_sendToWUClassifiesReplies(monkeypatch, status, text, expected):
+    pytest.importorskip("requests")
+    import WU_http
+    monkeypatch.setattr(WU_http, "get", lambda url: types.SimpleNamespace(status_code=status, text=text))
+    assert WU_upload.sendToWU("https://example.invalid/") == expected
+
+
+def test_sendToWUConnectionErrorIsTemporary(monkeypatch):
+    requests = pytest.importorskip("requests")
+    import WU_http
+    def get(url):
+        raise requests.exceptions.ConnectionError()
+    monkeypatch.setattr(WU_http, "get", get)
+    assert WU_upload.sendToWU("https://example.invalid/") == [False, "ConnectionError", False]
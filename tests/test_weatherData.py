@@ -0,0 +1,110 @@
+# Checks weatherData_cls.py against brute force versions of the same calculations
+import math
+import random
+
+import pytest
+
+from weatherData_cls import weatherStation, windDirAverager
+
+
+# Circular mean of [degrees, ...], the way avgWindDir() did it before the ring buffer
+def bruteForceMean(directions):
+    northSouth = sum(math.cos(math.radians(d)) for d in directions)
+    eastWest = sum(math.sin(math.radians(d)) for d in directions)
+    return(math.degrees(math.atan2(eastWest, northSouth)) % 360)
+
+
+def assertSameDirection(average, expected):
+    assert min(abs(average - expected), 360 - abs(average - expected)) <= 0.5 + 1e-6
+
+
+def test_countWindowMatchesBruteForce():
+    rnd = random.Random(5)
+    averager = windDirAverager(numPoints=30)
+    directions = []
+    for n in range(500):
+        windDir = rnd.uniform(200, 340)  # mostly westerly, so the mean is well defined
+        directions.append(windDir)
+        average = averager.addDegrees(windDir, now=n)
+        if n < 29:
+            assert average == weatherStation.NO_DATA_YET
+        else:
+            assertSameDirection(average, bruteForceMean(directions[-30:]))
+
+
+def test_timeWindowMatchesBruteForce():
+    rnd = random.Random(7)
+    averager = windDirAverager(numPoints=200, windowSeconds=120)
+    points = []  # (time, degrees)
+    now = 0.0
+    for n in range(1000):
+        now += rnd.uniform(0.5, 6.0)  # ISS packets are about 2.5 seconds apart, sometimes some are missed
+        windDir = rnd.uniform(20, 160)
+        points.append((now, windDir))
+        average = averager.addDegrees(windDir, now=now)
+        if now - points[0][0] < 120:  # window not full yet
+            assert average == weatherStation.NO_DATA_YET
+        else:
+            assertSameDirection(average, bruteForceMean([d for t, d in points if t >= now - 120]))
+
+
+def test_runningSumsAreResummed():
+    rnd = random.Random(9)
+    averager = windDirAverager(numPoints=30)
+    for n in range(windDirAverager.RESUM_INTERVAL * 3 + 10):
+        averager.addDegrees(rnd.uniform(0, 360), now=n)
+    assert averager.addsSinceResum == 10
+    sumNorthSouth, sumEastWest = averager.sumNorthSouth, averager.sumEastWest
+    averager.resum()
+    assert averager.sumNorthSouth == pytest.approx(sumNorthSouth, abs=1e-9)
+    assert averager.sumEastWest == pytest.approx(sumEastWest, abs=1e-9)
+
+
+def test_stateRoundTrip():
+    averager = windDirAverager(numPoints=50, windowSeconds=60)
+    for n in range(40):
+        averager.addDegrees(90 if n < 20 else 180, now=100.0 + 2 * n)  # 90 from 100-138, 180 from 140-178
+    state = averager.getState(now=180.0)
+
+    restored = windDirAverager(numPoints=50, windowSeconds=60)
+    restored.setState(state, elapsed=0.0, now=5.0)  # clock started over
+    assert restored.average(now=5.0) == averager.average(now=180.0)
+
+    # 30 seconds later the points from before 150 have expired, so the next point only averages with 180s
+    restored.setState(state, elapsed=30.0, now=5.0)
+    assert restored.addDegrees(180, now=5.0) == 180
+    assert restored.count == 16  # 150-178 plus the new one
+
+
+def test_dataExpires():
+    now = [1000.0]
+    station = weatherStation(1, clock=lambda: now[0])
+    assert math.isnan(station.outsideTemp) and math.isnan(station.age('outsideTemp'))
+    assert not station.gotTemperatureData() and not station.gotRainTodayData()  # never set
+
+    station.outsideTemp = 55.0
+    station.pressure = 30.01
+    station.rainToday = 0.25
+    now[0] += weatherStation.DEFAULT_MAX_DATA_AGE
+    assert station.age('outsideTemp') == weatherStation.DEFAULT_MAX_DATA_AGE
+    assert station.gotTemperatureData()
+    now[0] += 1
+    assert not station.gotTemperatureData()  # 10 minutes old
+    assert station.gotPressureData()          # pressure lasts 2 hours
+
+    now[0] = 1000.0 + 2 * 3600
+    assert station.gotPressureData()
+    now[0] += 1
+    assert not station.gotPressureData()
+    now[0] += 30 * 24 * 3600
+    assert station.gotRainTodayData()         # daily rain doesn't expire
+
+
+def test_maxDataAgeOverride():
+    now = [0.0]
+    station = weatherStation(1, maxDataAge={'outsideTemp': 60, 'humidity': None}, clock=lambda: now[0])
+    station.outsideTemp = 55.0
+    station.humidity = 40.0
+    now[0] = 61
+    assert not station.gotTemperatureData()
+    assert station.gotHumidityData()
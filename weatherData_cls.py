@@ -3,84 +3,173 @@
 # It also has functions to calculate average wind direction and dew point
 
 import math
+import time
+from array import array
+import WU_decodeWirelessData # wind direction lookup tables
+
+#---------------------------------------------------------------------
+# Descriptor for one weather data field in weatherStation.  Reading returns the value,
+# NaN if it has never been set.  Setting stores the value and the time it was set, which
+# the got...Data() functions use to check if the data is fresh.
+#---------------------------------------------------------------------
+class observation:
+
+    __slots__ = ('name', 'index')
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.index = owner.FIELD_INDEX[name]
+
+    def __get__(self, station, owner=None):
+        if station is None:
+            return(self)
+        return(station.values[self.index])
+
+    def __set__(self, station, value):
+        station.values[self.index] = value
+        station.updated[self.index] = station.clock()
+
 
 class weatherStation:
 
     # class variables
-    NO_DATA_YET = -100.0
+    NO_DATA_YET = -100.0  # returned by avgWindDir() and calcDewPoint() when they can't calculate a value yet
     AVG_WIND_DIR_NUM_DATA_POINTS = 30
 
-    def __init__(self, stationID): # This function runs when the instance is created
-
-        self.stationID      = stationID # Davis ISS station ID
-
-        # initialize weather data variables
-        self.outsideTemp    = weatherStation.NO_DATA_YET
-        self.windChill      = weatherStation.NO_DATA_YET
-        self.humidity       = weatherStation.NO_DATA_YET
-        self.pressure       = weatherStation.NO_DATA_YET
-        self.windSpeed      = weatherStation.NO_DATA_YET
-        self.windGust       = weatherStation.NO_DATA_YET
-        self.windDir        = weatherStation.NO_DATA_YET
-        self.rainRate       = weatherStation.NO_DATA_YET
-        self.rainToday      = weatherStation.NO_DATA_YET
-        self.dewPoint       = weatherStation.NO_DATA_YET
-        self.uvIndex        = weatherStation.NO_DATA_YET
-        self.solar          = weatherStation.NO_DATA_YET
-        self.capacitorVolts = weatherStation.NO_DATA_YET
-        self.batteryStatus  = weatherStation.NO_DATA_YET
-
-        # initialize variables for avgWindDir()
-        self.c             = 0    # counter
-        self.sumNorthSouth = 0.0 
-        self.sumEastWest   = 0.0 
-        self.northSouth    = [0] * weatherStation.AVG_WIND_DIR_NUM_DATA_POINTS 
-        self.eastWest      = [0] * weatherStation.AVG_WIND_DIR_NUM_DATA_POINTS
+    # Weather data fields.  Values and update times are stored in arrays in this order
+    FIELDS = ('outsideTemp', 'windChill', 'humidity', 'pressure', 'windSpeed', 'windGust', 'windDir',
+              'rainRate', 'rainToday', 'dewPoint', 'uvIndex', 'solar', 'capacitorVolts', 'batteryStatus')
+    FIELD_INDEX = {field: i for i, field in enumerate(FIELDS)}  # field name -> index in values and updated
 
-        
-        
-    # got...Data() functions return True once good weather data for that variable has been set
+    # Seconds before data is too old to upload.  ISS sends each type of data at least every minute or so,
+    # so if a sensor hasn't reported in 10 minutes it's probably dead.  None means data doesn't expire
+    DEFAULT_MAX_DATA_AGE = 10 * 60
+    MAX_DATA_AGE = {'pressure': 2 * 3600,  # pressure from nearby stations is only updated once an hour
+                    'rainToday': None}     # daily accumulation, reset at midnight
+
+    __slots__ = ('stationID', 'clock', 'values', 'updated', 'maxAge', 'windAverager')
+
+    outsideTemp    = observation()
+    windChill      = observation()
+    humidity       = observation()
+    pressure       = observation()
+    windSpeed      = observation()
+    windGust       = observation()
+    windDir        = observation()
+    rainRate       = observation()
+    rainToday      = observation()
+    dewPoint       = observation()
+    uvIndex        = observation()
+    solar          = observation()
+    capacitorVolts = observation()
+    batteryStatus  = observation()
+
+    # windowPoints and windowSeconds are for avgWindDir(), see windDirAverager below
+    # maxDataAge is a dictionary to override MAX_DATA_AGE for some fields
+    # clock is the function used for timestamps, it can be replaced for testing
+    def __init__(self, stationID, windowPoints=AVG_WIND_DIR_NUM_DATA_POINTS, windowSeconds=None, maxDataAge=None, clock=time.monotonic):
+
+        self.stationID = stationID # Davis ISS station ID
+        self.clock     = clock
+
+        # initialize weather data variables, NaN update time means no data yet
+        self.values  = array('d', [math.nan] * len(weatherStation.FIELDS))
+        self.updated = array('d', [math.nan] * len(weatherStation.FIELDS))
+
+        ages = dict(weatherStation.MAX_DATA_AGE)
+        if maxDataAge is not None:
+            ages.update(maxDataAge)
+        self.maxAge = tuple(ages.get(field, weatherStation.DEFAULT_MAX_DATA_AGE) for field in weatherStation.FIELDS)
+
+        # Ring buffer used by avgWindDir().  windowSeconds=None averages the last windowPoints packets,
+        # otherwise it averages packets from the last windowSeconds and windowPoints is the buffer capacity
+        self.windAverager = windDirAverager(windowPoints, windowSeconds, clock)
+
+
+    # Returns True if field has been set and isn't older than its max age
+    def isFresh(self, field):
+        i = weatherStation.FIELD_INDEX[field]
+        maxAge = self.maxAge[i]
+        if maxAge is None:
+            return (self.updated[i] == self.updated[i]) # False if NaN, ie never set
+        return (self.clock() - self.updated[i] <= maxAge)  # NaN compare is always False
+
+    # Seconds since field was last set, NaN if it has never been set
+    def age(self, field):
+        return (self.clock() - self.updated[weatherStation.FIELD_INDEX[field]])
+
+    # Returns copy of the weather data and update times.  Snapshots don't have the wind direction
+    # buffer so they are small; use for uploads and for keeping a history of readings.
+    def snapshot(self):
+        copy = object.__new__(weatherStation)
+        copy.stationID    = self.stationID
+        copy.clock        = self.clock
+        copy.values       = array('d', self.values)
+        copy.updated      = array('d', self.updated)
+        copy.maxAge       = self.maxAge
+        copy.windAverager = None
+        return (copy)
+
+    # Returns weather data as a dictionary that can be saved with json, see checkpoint_cls.py
+    # Update times are saved as ages because the monotonic clock starts over when the RPi reboots
+    def getState(self):
+        now = self.clock()
+        return ({'values': list(self.values),
+                 'ages':   [now - t for t in self.updated],
+                 'wind':   self.windAverager.getState(now)})
+
+    # Restores data from getState().  elapsed is seconds since the state was saved, it's added to
+    # the ages so data that was getting old before a restart is still treated as old
+    def setState(self, state, elapsed=0.0, restoreWind=True):
+        now = self.clock()
+        for i, field in enumerate(weatherStation.FIELDS):
+            self.values[i]  = state['values'][i]
+            self.updated[i] = now - (state['ages'][i] + elapsed)  # NaN age stays NaN, ie never set
+        if restoreWind:
+            self.windAverager.setState(state['wind'], elapsed, now)
+
+    # got...Data() functions return True if good weather data for that variable has been set recently
     def gotTemperatureData(self):
-        return (self.outsideTemp > weatherStation.NO_DATA_YET)
+        return (self.isFresh('outsideTemp'))
 
     def gotWindChillData(self):
-        return (self.windChill > weatherStation.NO_DATA_YET)
+        return (self.isFresh('windChill'))
         
     def gotHumidityData(self):
-        return (self.humidity > weatherStation.NO_DATA_YET)
+        return (self.isFresh('humidity'))
 
     def gotPressureData(self):
-        return (self.pressure > weatherStation.NO_DATA_YET)
+        return (self.isFresh('pressure'))
 
     def gotWindSpeedData(self):
-        return (self.windSpeed > weatherStation.NO_DATA_YET)
+        return (self.isFresh('windSpeed'))
 
     def gotWindGustData(self):
-        return (self.windGust > weatherStation.NO_DATA_YET)
+        return (self.isFresh('windGust'))
 
     def gotWindDirData(self):
-        return (self.windDir > weatherStation.NO_DATA_YET)
+        return (self.isFresh('windDir'))
 
     def gotRainRateData(self):
-        return (self.rainRate > weatherStation.NO_DATA_YET)
+        return (self.isFresh('rainRate'))
 
     def gotRainTodayData(self):
-        return (self.rainToday >= 0.0)
+        return (self.isFresh('rainToday') and self.rainToday >= 0.0)
 
     def gotDewPointData(self):
-        return ( (self.dewPoint > weatherStation.NO_DATA_YET) and self.gotHumidityData() and self.gotTemperatureData())
+        return ( self.isFresh('dewPoint') and self.gotHumidityData() and self.gotTemperatureData())
 
     def gotUvIndexData(self):
-        return (self.uvIndex > weatherStation.NO_DATA_YET)
+        return (self.isFresh('uvIndex'))
 
     def gotSolarData(self):
-        return (self.solar > weatherStation.NO_DATA_YET)
+        return (self.isFresh('solar'))
 
     def gotCapacitorVoltsData(self):
-        return (self.capacitorVolts > weatherStation.NO_DATA_YET)
+        return (self.isFresh('capacitorVolts'))
 
     def gotBatteryStatusData(self):
-        return (self.batteryStatus > weatherStation.NO_DATA_YET)
+        return (self.isFresh('batteryStatus'))
 
 ##    # Averages numPoints of wind direction data. When numPoints is reached, data is cleared
 ##    # out and waits for numPoints of new data before calculating the average again.
@@ -108,40 +197,26 @@ class weatherStation:
 ##            return (self.windDir)
 ##        return (0)
 
-    # Averages numPoints of wind direction data. When numPoints is reached
-    # Uses a list and shifts data in
+    # Averages wind direction over the averaging window. Returns NO_DATA_YET until the window has filled up
+    # Uses a ring buffer with running sums, see windDirAverager below
     def avgWindDir(self, windDirNow):
-
-        numPoints = weatherStation.AVG_WIND_DIR_NUM_DATA_POINTS
-        
-        # Put first 30 data pionts in lists
-        if self.c < numPoints:
-            self.northSouth[self.c] = math.cos(math.radians(windDirNow))
-            self.eastWest[self.c]   = math.sin(math.radians(windDirNow))
-            self.c += 1
+        avgWindDir = self.windAverager.addDegrees(windDirNow)
+        if avgWindDir == weatherStation.NO_DATA_YET:
             return(weatherStation.NO_DATA_YET)
+        self.windDir = avgWindDir
+        return (self.windDir)
+
+
 
-        # Lists are full, can calculate average now
-        if self.c >= numPoints:
-            # Shift oldest reading out 
-            self.northSouth = list(self.northSouth[1:numPoints]) 
-            self.eastWest   = list(self.eastWest[1:numPoints])
-            # Append new wind direction to end of list
-            self.northSouth.append(math.cos(math.radians(windDirNow)))
-            self.eastWest.append(math.sin(math.radians(windDirNow)))
-            # Sum the 2 lists
-            sumNorthSouth = sum(self.northSouth)
-            sumEastWest   = sum(self.eastWest)
-
-            # Calculate average wind direction
-            avgWindDir = math.degrees(math.atan2(sumEastWest, sumNorthSouth))
-            if avgWindDir < 0:
-                avgWindDir += 360
-            elif avgWindDir > 360:
-                avgWindDir = avgWindDir % 360 # atan2() result can be > 360, so use modulus to just return remainder
-            self.windDir = int(avgWindDir + 0.5)  # Round to nearest integer
-            self.c += 1
-            return (self.windDir)
+    # Same as avgWindDir() but takes the raw wind direction byte from the packet and uses the
+    # lookup tables in WU_decodeWirelessData.py, so there's no trig for each packet
+    def avgWindDirRaw(self, rawWindDir):
+        avgWindDir = self.windAverager.add(WU_decodeWirelessData.WIND_DIR_NORTH_SOUTH[rawWindDir],
+                                           WU_decodeWirelessData.WIND_DIR_EAST_WEST[rawWindDir])
+        if avgWindDir == weatherStation.NO_DATA_YET:
+            return(weatherStation.NO_DATA_YET)
+        self.windDir = avgWindDir
+        return (self.windDir)
 
 
 
@@ -166,6 +241,139 @@ class weatherStation:
             self.windChill = (self.outsideTemp * 0.6215) - (35.75 * self.windSpeed**0.16) + (0.4275 * self.outsideTemp * self.windSpeed**0.16) + 35.74
             return(self.windChill)
         else:
-            suntec.windChill = self.outsideTemp
+            self.windChill = self.outsideTemp
             return (weatherStation.NO_DATA_YET)
 
+
+
+#---------------------------------------------------------------------
+# Circular mean of wind direction using a fixed size ring buffer
+# Keeps running sums of the north-south (cos) and east-west (sin) components, so adding a
+# data point is O(1) no matter how big the window is.  The sums are recalculated from the
+# buffer every RESUM_INTERVAL data points so float rounding errors can't build up.
+#
+# windowSeconds = None: average the last numPoints data points
+# windowSeconds = n:    average data points from the last n seconds, numPoints is the buffer
+#                       capacity.  Set it larger than the number of packets expected in n seconds
+#                       (ISS sends a packet about every 2.5 seconds)
+# clock is the function used for timestamps, it can be replaced for testing
+#---------------------------------------------------------------------
+class windDirAverager:
+
+    RESUM_INTERVAL = 1000
+
+    def __init__(self, numPoints=weatherStation.AVG_WIND_DIR_NUM_DATA_POINTS, windowSeconds=None, clock=time.monotonic):
+        self.numPoints     = numPoints
+        self.windowSeconds = windowSeconds
+        self.clock         = clock
+        self.northSouth    = [0.0] * numPoints
+        self.eastWest      = [0.0] * numPoints
+        self.timeStamp     = [0.0] * numPoints
+        self.head          = 0    # index where next data point goes
+        self.count         = 0    # data points in buffer
+        self.sumNorthSouth = 0.0
+        self.sumEastWest   = 0.0
+        self.firstTime     = None # timestamp of first data point, used to see when time window has filled
+        self.addsSinceResum = 0
+
+    # Add wind direction in degrees, returns average or NO_DATA_YET
+    def addDegrees(self, windDirNow, now=None):
+        radians = math.radians(windDirNow)
+        return(self.add(math.cos(radians), math.sin(radians), now))
+
+    # Add wind direction as a unit vector, returns average or NO_DATA_YET
+    def add(self, northSouth, eastWest, now=None):
+        if now is None:
+            now = self.clock()
+        if self.firstTime is None:
+            self.firstTime = now
+
+        if self.count == self.numPoints:
+            self._dropOldest()
+        if self.windowSeconds is not None:
+            self._expire(now)
+
+        i = self.head
+        self.northSouth[i] = northSouth
+        self.eastWest[i]   = eastWest
+        self.timeStamp[i]  = now
+        self.sumNorthSouth += northSouth
+        self.sumEastWest   += eastWest
+        self.head = (i + 1) % self.numPoints
+        self.count += 1
+
+        self.addsSinceResum += 1
+        if self.addsSinceResum >= windDirAverager.RESUM_INTERVAL:
+            self.resum()
+
+        return(self.average(now))
+
+    # Returns buffer as a dictionary that can be saved with json.  Data points are oldest first, [north-south, east-west, age]
+    def getState(self, now=None):
+        if now is None:
+            now = self.clock()
+        points = []
+        for n in range(self.count):
+            i = (self.head - self.count + n) % self.numPoints
+            points.append([self.northSouth[i], self.eastWest[i], now - self.timeStamp[i]])
+        return({'points': points, 'firstAge': None if self.firstTime is None else now - self.firstTime})
+
+    # Refills buffer from getState().  elapsed is seconds since the state was saved
+    def setState(self, state, elapsed=0.0, now=None):
+        if now is None:
+            now = self.clock()
+        self.head          = 0
+        self.count         = 0
+        self.sumNorthSouth = 0.0
+        self.sumEastWest   = 0.0
+        self.firstTime     = None
+        for northSouth, eastWest, age in state['points']:
+            self.add(northSouth, eastWest, now - (age + elapsed))
+        if state['firstAge'] is not None:
+            self.firstTime = now - (state['firstAge'] + elapsed)
+        self.resum()
+
+    # Drops data points older than windowSeconds
+    def _expire(self, now):
+        oldest = now - self.windowSeconds
+        while self.count > 0 and self.timeStamp[(self.head - self.count) % self.numPoints] < oldest:
+            self._dropOldest()
+
+    def _dropOldest(self):
+        i = (self.head - self.count) % self.numPoints
+        self.sumNorthSouth -= self.northSouth[i]
+        self.sumEastWest   -= self.eastWest[i]
+        self.count -= 1
+
+    # Recalculate the running sums from the data in the buffer
+    def resum(self):
+        sumNorthSouth = 0.0
+        sumEastWest = 0.0
+        for n in range(self.count):
+            i = (self.head - self.count + n) % self.numPoints
+            sumNorthSouth += self.northSouth[i]
+            sumEastWest   += self.eastWest[i]
+        self.sumNorthSouth = sumNorthSouth
+        self.sumEastWest   = sumEastWest
+        self.addsSinceResum = 0
+
+    # True once the buffer covers the whole averaging window
+    def isReady(self, now=None):
+        if self.count == 0:
+            return(False)
+        if self.windowSeconds is None:
+            return(self.count == self.numPoints)
+        if now is None:
+            now = self.clock()
+        return(now - self.firstTime >= self.windowSeconds)
+
+    # Returns average wind direction rounded to nearest degree, or NO_DATA_YET
+    def average(self, now=None):
+        if not self.isReady(now):
+            return(weatherStation.NO_DATA_YET)
+        avgWindDir = math.degrees(math.atan2(self.sumEastWest, self.sumNorthSouth))
+        if avgWindDir < 0:
+            avgWindDir += 360
+        elif avgWindDir > 360:
+            avgWindDir = avgWindDir % 360 # atan2() result can be > 360, so use modulus to just return remainder
+        return(int(avgWindDir + 0.5))  # Round to nearest integer